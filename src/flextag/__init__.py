@@ -3,25 +3,48 @@ FlexTag - Public API
 
 This module provides the main entry points for the FlexTag library:
 - load(...) -> parse FlexTag data into a FlexView with rich querying abilities
+- scan(...) -> iterate over section headers without parsing section bodies
+- bundle.write(...) -> pack many sources into one indexed bundle file
+- Catalog(...) -> persistent section-header catalog for lookups across many files
+- AppendWriter(...) / IndexedFile(...) -> append to and tail files with a
+  sidecar offset index
+- open_indexed(...) -> random access to sections of a large file by ID, tag or path
+- watch(...) -> live FlexView over a directory, reloading only changed files
+- dump(...) / dumps(...) -> write a FlexView back out as FlexTag text
 - to_dict(...) -> convert a FlexView to a simplified Python dict
 - validate(...) -> validate FlexTag content against schema rules
 - filter(...) -> filter sections or containers using query language
+
+Editors can use the language server in flextag.lsp (python -m flextag.lsp).
+Tracing hooks for spans and metrics are in flextag.instrument (set_tracer).
 """
 
-from typing import Optional, Union, Dict, Any, List
+from typing import Optional, Union, Dict, Any, List, Iterator, Callable
 
 from .flextag import (
     FlexTag,
     FlexView,
     FlexTagSettings,
     FlexMap,
+    SectionHeader,
+    Source,
+    Catalog,
+    IndexedFile,
+    AppendWriter,
+    Watcher,
+    PollingBackend,
     FlexTagError,
     FlexTagSyntaxError,
     SchemaValidationError,
     SchemaTypeError,
     SchemaSectionError,
+    Diagnostic,
+    LoadStats,
+    SourceStats,
 )
 from .flextag import logger
+from . import bundle
+from . import instrument
 
 # Version constants
 FLEXTAG_VERSION = "0.3.0"  # The FlexTag specification version
@@ -45,6 +68,18 @@ def load(
     filter_query: Optional[str] = None,
     validate: bool = True,
     settings: Optional[FlexTagSettings] = None,
+    section_query: Optional[str] = None,
+    bundle: Union[str, List[str], None] = None,
+    source: Union[Source, List[Source], None] = None,
+    recursive: bool = False,
+    include: Union[str, List[str], None] = None,
+    exclude: Union[str, List[str], None] = None,
+    workers: int = 1,
+    lazy: bool = False,
+    cache_size: int = 128,
+    catalog: Optional[str] = None,
+    on_error: str = "raise",
+    stats: bool = False,
 ) -> FlexView:
     """
     Parse FlexTag data from files, strings, or directories.
@@ -52,10 +87,40 @@ def load(
     Args:
         path: File path(s) to FlexTag content
         string: Raw FlexTag string content
-        dir: Directory path(s) containing FlexTag files (.flextag or .ft)
+        dir: Directory path(s) containing FlexTag files (.flextag or .ft,
+            optionally compressed as .gz, .bz2 or .xz)
         filter_query: Optional query to filter containers after loading
         validate: Whether to validate against any embedded schema
         settings: Optional settings to control parsing behavior
+        section_query: Optional query evaluated on each section header (with
+            defaults applied) while loading; non-matching sections are skipped
+        bundle: Bundle file(s) written by flextag.bundle.write; their sources
+            are added to the view, with section bodies read on demand
+        source: Explicitly typed source(s): Source.file, Source.text,
+            Source.bytes or Source.stream (file-like objects, pipes, buffers)
+        recursive: Also load files in subdirectories of `dir`
+        include: Glob pattern(s) selecting the files to load from `dir`
+            instead of the .flextag/.ft suffixes; patterns with a "/" match
+            the path relative to `dir`, others the file name
+        exclude: Glob pattern(s) of files and directories to skip in `dir`
+        workers: Processes used to scan the section headers of each large
+            file; the file is split at section boundaries and its parts are
+            scanned in parallel, while reading the file and building the
+            sections still happen serially in this process. Whether this is
+            faster than workers=1 depends on the file and the number of
+            cores, so measure before relying on it
+        lazy: Keep file sources unparsed until their sections are used;
+            queries pick sources from section headers (see LazyContainer)
+        cache_size: With lazy=True, how many parsed files stay in memory
+        catalog: With lazy=True, a Catalog database to take section headers
+            from instead of scanning the files (created or refreshed)
+        on_error: "raise" to stop at the first error, or "collect" to skip
+            sections with syntax errors (resuming at the next "[[" line) and
+            sources that cannot be read or fail validation, recording each
+            error in view.diagnostics as a Diagnostic; lazy sources are
+            still checked only when parsed
+        stats: Record sizes, cache hit rates and per-phase wall and CPU
+            times per source in a LoadStats, available as view.stats
 
     Returns:
         A FlexView object containing the parsed sections and containers
@@ -72,7 +137,144 @@ def load(
         filter_query=filter_query,
         validate=validate,
         settings=settings,
+        section_query=section_query,
+        bundle=bundle,
+        source=source,
+        recursive=recursive,
+        include=include,
+        exclude=exclude,
+        workers=workers,
+        lazy=lazy,
+        cache_size=cache_size,
+        catalog=catalog,
+        on_error=on_error,
+        stats=stats,
+    )
+
+
+def scan(
+    path: Union[str, List[str], None] = None,
+    string: Union[str, List[str], None] = None,
+    dir: Union[str, List[str], None] = None,
+    headers_only: bool = True,
+    settings: Optional[FlexTagSettings] = None,
+    indexed: bool = False,
+    source: Union[Source, List[Source], None] = None,
+    recursive: bool = False,
+    include: Union[str, List[str], None] = None,
+    exclude: Union[str, List[str], None] = None,
+) -> Iterator[SectionHeader]:
+    """
+    Iterate over the user sections of FlexTag files, strings, or directories
+    without building a FlexView.
+
+    Args:
+        path: File path(s) to FlexTag content
+        string: Raw FlexTag string content
+        dir: Directory path(s) containing FlexTag files (.flextag or .ft,
+            optionally compressed as .gz, .bz2 or .xz)
+        headers_only: Yield SectionHeader records (metadata with defaults
+            applied, line range, byte range) without reading section bodies;
+            call to_section() on a header to load its content. If False,
+            full Sections are yielded.
+        settings: Optional settings to control parsing behavior
+        indexed: Read the headers of each file from its `.ftidx` sidecar
+            index, building or updating the sidecar as needed
+        source: Explicitly typed source(s), as for load(); stream sources are
+            parsed while being read and yield full Sections
+        recursive: Also scan files in subdirectories of `dir`
+        include: Glob pattern(s) selecting the files to scan, as for load()
+        exclude: Glob pattern(s) of files and directories to skip in `dir`
+
+    Returns:
+        An iterator of SectionHeader (or Section) objects, in source order
+
+    Raises:
+        FlexTagSyntaxError: If there is a syntax error in the section markup
+    """
+    return FlexTag.scan(
+        path=path,
+        string=string,
+        dir=dir,
+        headers_only=headers_only,
+        settings=settings,
+        indexed=indexed,
+        source=source,
+        recursive=recursive,
+        include=include,
+        exclude=exclude,
+    )
+
+
+def open_indexed(path: str, settings: Optional[FlexTagSettings] = None) -> IndexedFile:
+    """
+    Open a FlexTag file through its `.ftidx` sidecar index for random access
+    to single sections, building the sidecar if it is missing or stale.
+
+    Args:
+        path: Path to the FlexTag file
+        settings: Optional settings to control parsing behavior
+
+    Returns:
+        An IndexedFile; use get(section_id) or find(query) to read sections
+    """
+    return IndexedFile(path, settings=settings)
+
+
+def watch(
+    dir: Union[str, List[str], None] = None,
+    on_change: Optional[Callable[[FlexView, Dict[str, List[str]]], Any]] = None,
+    path: Union[str, List[str], None] = None,
+    interval: float = 1.0,
+    settings: Optional[FlexTagSettings] = None,
+    validate: bool = True,
+    recursive: bool = False,
+    include: Union[str, List[str], None] = None,
+    exclude: Union[str, List[str], None] = None,
+    backend: Optional[PollingBackend] = None,
+    start: bool = True,
+) -> Watcher:
+    """
+    Load FlexTag files and keep the result up to date as they change.
+    Only added or changed files are re-parsed and re-validated; each
+    reload is published as a new `watcher.view` generation, leaving views
+    already handed out unchanged.
+
+    Args:
+        dir: Directory path(s) to watch, listed as for load()
+        on_change: Called as on_change(view, changes) after each reload,
+            including the initial load; `changes` maps "added", "changed"
+            and "removed" to lists of file paths, and "errors" to the files
+            that failed to load (a check where only files failed publishes
+            no reload)
+        path: Individual file path(s) to watch
+        interval: Seconds between polls of the default PollingBackend
+        settings: Optional settings to control parsing behavior
+        validate: Whether to validate reloaded files against their schema
+        recursive: Also watch files in subdirectories of `dir`
+        include: Glob pattern(s) selecting the files to watch, as for load()
+        exclude: Glob pattern(s) of files and directories to skip
+        backend: Change-detection backend; defaults to polling by mtime
+            and size every `interval` seconds
+        start: Start polling in a background thread; if False, call
+            watcher.check() to look for changes
+
+    Returns:
+        A Watcher; read `watcher.view` for the current FlexView and call
+        `watcher.stop()` when done
+    """
+    watcher = Watcher(
+        dir=dir,
+        path=path,
+        on_change=on_change,
+        settings=settings,
+        validate=validate,
+        recursive=recursive,
+        include=include,
+        exclude=exclude,
+        backend=backend if backend is not None else PollingBackend(interval),
     )
+    return watcher.start() if start else watcher
 
 
 def to_dict(view: FlexView) -> Dict[str, Any]:
@@ -88,6 +290,30 @@ def to_dict(view: FlexView) -> Dict[str, Any]:
     return view.to_dict()
 
 
+def dump(view: FlexView, fp) -> None:
+    """
+    Write a FlexView to a text file as FlexTag.
+
+    Args:
+        view: The FlexView to write
+        fp: A text file object opened for writing
+    """
+    view.dump(fp)
+
+
+def dumps(view: FlexView) -> str:
+    """
+    Convert a FlexView to FlexTag text.
+
+    Args:
+        view: The FlexView to convert
+
+    Returns:
+        The FlexTag text of the view's containers
+    """
+    return view.dumps()
+
+
 def to_flexmap(view: FlexView) -> FlexMap:
     """
     Convert a FlexView to a FlexMap with enhanced navigation capabilities.
@@ -122,7 +348,7 @@ def configure_settings(**kwargs) -> FlexTagSettings:
 
     Args:
         **kwargs: Settings to override (allow_directory_traversal,
-                 allow_remote_loading, max_section_size, etc.)
+                 allow_remote_loading, max_section_size, index_backend, etc.)
 
     Returns:
         A configured FlexTagSettings object for use with load()
@@ -137,6 +363,13 @@ def configure_settings(**kwargs) -> FlexTagSettings:
 # Make these available in the public API
 __all__ = [
     "load",
+    "scan",
+    "open_indexed",
+    "watch",
+    "bundle",
+    "instrument",
+    "dump",
+    "dumps",
     "to_dict",
     "to_flexmap",
     "filter",
@@ -144,11 +377,21 @@ __all__ = [
     "FlexView",
     "FlexMap",
     "FlexTagSettings",
+    "SectionHeader",
+    "Source",
+    "Catalog",
+    "IndexedFile",
+    "AppendWriter",
+    "Watcher",
+    "PollingBackend",
     "FlexTagError",
     "FlexTagSyntaxError",
     "SchemaValidationError",
     "SchemaTypeError",
     "SchemaSectionError",
+    "Diagnostic",
+    "LoadStats",
+    "SourceStats",
     "logger",
     "get_flextag_version",
     "get_package_version",
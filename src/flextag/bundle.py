@@ -0,0 +1,550 @@
+"""
+FlexTag bundles - many FlexTag sources packed into one indexed file.
+
+A bundle holds the sections of many sources with an index that can be
+read without touching section bodies:
+
+- write(view_or_paths, out_path) -> pack a FlexView or FlexTag files
+- Bundle(path) -> open a bundle (memory-mapped) for random access by ID
+- flextag.load(bundle=...) -> load a bundle into a FlexView
+
+Layout (little-endian): a fixed header with block offsets, an interned
+string table, per-source records (container metadata and a bloom filter
+of section tags, paths and IDs), fixed-size section records, a metadata
+blob for tags/paths/parameters, a hash table from section ID to section
+records, and the section bodies, optionally zlib-compressed.
+"""
+
+import functools
+import hashlib
+import mmap
+import struct
+import zlib
+from typing import Dict, List, Optional, Union
+
+from .flextag import (
+    Container,
+    FlexTag,
+    FlexTagError,
+    FlexTagSettings,
+    FlexView,
+    QueryNode,
+    Section,
+    _LineWindow,
+    _header_terms,
+    _required_terms,
+)
+
+MAGIC = b"FTBUNDLE"
+VERSION = 1
+
+# magic, version, flags, string/file/section counts, then the offsets of
+# the strings, files, sections, metadata, ID table, blooms and bodies.
+_HEADER = struct.Struct("<8sIIIII7Q")
+# name, container id, first section, section count, metadata offset,
+# bloom offset, bloom bits
+_FILE = struct.Struct("<IIIIQQI")
+# id, type, file, metadata offset, open line, close line, flags,
+# body offset, body length
+_SECTION = struct.Struct("<IIIQIIBQQ")
+# id string + 1 (0 = empty slot), first index in the ID order, count
+_ID_SLOT = struct.Struct("<III")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+_SELF_CLOSING = 1
+_COMPRESSED = 2
+
+_BLOOM_HASHES = 7
+_BLOOM_BITS_PER_TERM = 10
+
+# Parameter value kinds in the metadata blob.
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _BIGINT = range(7)
+
+
+def _bloom_positions(term: str, n_bits: int):
+    digest = hashlib.blake2b(term.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % n_bits for i in range(_BLOOM_HASHES)]
+
+
+def _bloom(terms: set) -> bytearray:
+    n_bits = max(64, len(terms) * _BLOOM_BITS_PER_TERM)
+    n_bits += -n_bits % 8
+    bits = bytearray(n_bits // 8)
+    for term in terms:
+        for pos in _bloom_positions(term, n_bits):
+            bits[pos >> 3] |= 1 << (pos & 7)
+    return bits
+
+
+def _id_hash(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+##############################################################################
+# WRITING
+##############################################################################
+
+
+class _BundleWriter:
+    """Accumulates the blocks of a bundle in memory, then writes them out."""
+
+    def __init__(self, compress: bool):
+        self.compress = compress
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.files = bytearray()
+        self.sections = bytearray()
+        self.meta = bytearray()
+        self.meta_offsets: Dict[bytes, int] = {}
+        self.blooms = bytearray()
+        self.bodies = bytearray()
+        self.section_ids: List[str] = []
+        self.n_files = 0
+
+    def intern(self, text: str) -> int:
+        idx = self.string_ids.get(text)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(text)
+            self.string_ids[text] = idx
+        return idx
+
+    def add_metadata(self, tags, paths, params) -> int:
+        """Encode tags, paths and parameters; identical blobs are stored once."""
+        out = bytearray()
+        for items in (tags, paths):
+            out += _U32.pack(len(items))
+            for item in items:
+                out += _U32.pack(self.intern(item))
+        out += _U32.pack(len(params))
+        for key, value in params.items():
+            out += _U32.pack(self.intern(key))
+            if value is None:
+                out.append(_NONE)
+            elif value is True or value is False:
+                out.append(_TRUE if value else _FALSE)
+            elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+                out.append(_INT)
+                out += struct.pack("<q", value)
+            elif isinstance(value, int):
+                out.append(_BIGINT)
+                out += _U32.pack(self.intern(str(value)))
+            elif isinstance(value, float):
+                out.append(_FLOAT)
+                out += struct.pack("<d", value)
+            else:
+                out.append(_STR)
+                out += _U32.pack(self.intern(str(value)))
+        out = bytes(out)
+        offset = self.meta_offsets.get(out)
+        if offset is None:
+            offset = len(self.meta)
+            self.meta += out
+            self.meta_offsets[out] = offset
+        return offset
+
+    def add_container(self, container: Container):
+        heads = [
+            s
+            for s in (
+                container.container_metadata,
+                container.defaults,
+                container.schema,
+            )
+            if s is not None
+        ]
+        sections = sorted(heads + list(container.sections), key=lambda s: s.open_line)
+        terms = set()
+        for s in container.sections:
+            terms |= _header_terms(s)
+        bloom = _bloom(terms)
+
+        self.files += _FILE.pack(
+            self.intern(container.source_name),
+            self.intern(container.id),
+            len(self.section_ids),
+            len(sections),
+            self.add_metadata(container.tags, container.paths, container.parameters),
+            len(self.blooms),
+            len(bloom) * 8,
+        )
+        self.blooms += bloom
+        for s in sections:
+            self.add_section(s, self.n_files)
+        self.n_files += 1
+
+    def add_section(self, s: Section, file_idx: int):
+        flags = _SELF_CLOSING if s.is_self_closing else 0
+        body = s.raw_content.encode("utf-8")
+        if self.compress and body:
+            packed = zlib.compress(body)
+            if len(packed) < len(body):
+                body = packed
+                flags |= _COMPRESSED
+        self.sections += _SECTION.pack(
+            self.intern(s.raw_id),
+            self.intern(s.raw_type_name),
+            file_idx,
+            self.add_metadata(s.raw_tags, s.raw_paths, s.raw_parameters),
+            s.open_line,
+            s.close_line,
+            flags,
+            len(self.bodies),
+            len(body),
+        )
+        self.bodies += body
+        self.section_ids.append(s.id)
+
+    def id_table(self) -> bytes:
+        order = sorted(range(len(self.section_ids)), key=self.section_ids.__getitem__)
+        groups: Dict[str, List[int]] = {}
+        for pos, sec_idx in enumerate(order):
+            sid = self.section_ids[sec_idx]
+            if sid not in groups:
+                groups[sid] = [pos, 0]
+            groups[sid][1] += 1
+
+        n_slots = 8
+        while n_slots < 2 * len(groups):
+            n_slots *= 2
+        slots = [(0, 0, 0)] * n_slots
+        for sid, (start, count) in groups.items():
+            slot = _id_hash(sid) & (n_slots - 1)
+            while slots[slot][0]:
+                slot = (slot + 1) & (n_slots - 1)
+            slots[slot] = (self.intern(sid) + 1, start, count)
+
+        out = bytearray(_U32.pack(n_slots))
+        for slot in slots:
+            out += _ID_SLOT.pack(*slot)
+        for sec_idx in order:
+            out += _U32.pack(sec_idx)
+        return bytes(out)
+
+    def write(self, out_path: str):
+        id_table = self.id_table()
+        encoded = [s.encode("utf-8") for s in self.strings]
+        strings = bytearray()
+        pos = 0
+        for data in encoded:
+            strings += _U64.pack(pos)
+            pos += len(data)
+        strings += _U64.pack(pos)
+        for data in encoded:
+            strings += data
+
+        blocks = [
+            strings,
+            self.files,
+            self.sections,
+            self.meta,
+            id_table,
+            self.blooms,
+            self.bodies,
+        ]
+        offsets = []
+        pos = _HEADER.size
+        for block in blocks:
+            offsets.append(pos)
+            pos += len(block)
+
+        with open(out_path, "wb") as f:
+            f.write(
+                _HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    0,
+                    len(self.strings),
+                    self.n_files,
+                    len(self.section_ids),
+                    *offsets,
+                )
+            )
+            for block in blocks:
+                f.write(block)
+
+
+def write(
+    view_or_paths: Union[FlexView, str, List[str]],
+    out_path: str,
+    compress: bool = False,
+    settings: Optional[FlexTagSettings] = None,
+) -> None:
+    """
+    Pack the containers of a FlexView, or the FlexTag files at the given
+    path(s), into a bundle at `out_path`. With compress=True, section
+    bodies are zlib-compressed where that makes them smaller.
+    """
+    if isinstance(view_or_paths, FlexView):
+        view = view_or_paths
+    else:
+        view = FlexTag.load(path=view_or_paths, validate=False, settings=settings)
+
+    writer = _BundleWriter(compress)
+    for container in view.containers:
+        writer.add_container(container)
+    writer.write(out_path)
+
+
+##############################################################################
+# READING
+##############################################################################
+
+
+class Bundle:
+    """
+    A memory-mapped bundle. Only the header is read on open; strings,
+    section records and bodies are decoded when used.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self._data
+        if len(data) < _HEADER.size or data[:8] != MAGIC:
+            raise FlexTagError(f"{path} is not a FlexTag bundle")
+        (
+            _magic,
+            version,
+            _flags,
+            self.n_strings,
+            self.n_files,
+            self.n_sections,
+            self._strings_off,
+            self._files_off,
+            self._sections_off,
+            self._meta_off,
+            self._ids_off,
+            self._blooms_off,
+            self._bodies_off,
+        ) = _HEADER.unpack_from(data, 0)
+        if version != VERSION:
+            raise FlexTagError(
+                f"Unsupported bundle version {version} in {path} (expected {VERSION})"
+            )
+        self._strings: List[Optional[str]] = [None] * self.n_strings
+        self._string_data_off = self._strings_off + 8 * (self.n_strings + 1)
+        self._containers: Dict[int, Container] = {}
+        self._meta_cache: Dict[int, tuple] = {}
+
+    def __enter__(self) -> "Bundle":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._data.close()
+
+    def _string(self, idx: int) -> str:
+        text = self._strings[idx]
+        if text is None:
+            start, end = struct.unpack_from(
+                "<QQ", self._data, self._strings_off + 8 * idx
+            )
+            base = self._string_data_off
+            text = self._data[base + start : base + end].decode("utf-8")
+            self._strings[idx] = text
+        return text
+
+    def _metadata(self, offset: int):
+        """
+        Decoded (tags, paths, parameters) at `offset`. Results are cached
+        and shared, so callers must copy before modifying them.
+        """
+        cached = self._meta_cache.get(offset)
+        if cached is not None:
+            return cached
+        data = self._data
+        pos = self._meta_off + offset
+        lists = []
+        for _ in range(2):
+            (n,) = _U32.unpack_from(data, pos)
+            idxs = struct.unpack_from(f"<{n}I", data, pos + 4)
+            lists.append([self._string(i) for i in idxs])
+            pos += 4 + 4 * n
+        (n,) = _U32.unpack_from(data, pos)
+        pos += 4
+        params = {}
+        for _ in range(n):
+            (key,) = _U32.unpack_from(data, pos)
+            kind = data[pos + 4]
+            pos += 5
+            if kind == _NONE:
+                value = None
+            elif kind in (_FALSE, _TRUE):
+                value = kind == _TRUE
+            elif kind == _INT:
+                (value,) = struct.unpack_from("<q", data, pos)
+                pos += 8
+            elif kind == _FLOAT:
+                (value,) = struct.unpack_from("<d", data, pos)
+                pos += 8
+            else:
+                (idx,) = _U32.unpack_from(data, pos)
+                pos += 4
+                value = self._string(idx)
+                if kind == _BIGINT:
+                    value = int(value)
+            params[self._string(key)] = value
+        cached = self._meta_cache[offset] = (lists[0], lists[1], params)
+        return cached
+
+    def _file(self, idx: int):
+        return _FILE.unpack_from(self._data, self._files_off + idx * _FILE.size)
+
+    def source_names(self) -> List[str]:
+        """Names of the sources packed in this bundle, in order."""
+        return [self._string(self._file(i)[0]) for i in range(self.n_files)]
+
+    def _may_contain(self, file_idx: int, terms: set) -> bool:
+        """False if the file's bloom filter rules out any of `terms`."""
+        if not terms:
+            return True
+        *_, bloom_off, n_bits = self._file(file_idx)
+        base = self._blooms_off + bloom_off
+        data = self._data
+        for term in terms:
+            for pos in _bloom_positions(term, n_bits):
+                if not data[base + (pos >> 3)] & (1 << (pos & 7)):
+                    return False
+        return True
+
+    def _container_header(self, file_idx: int) -> Container:
+        """A Container with only this file's container metadata filled in."""
+        name_idx, id_idx, _, _, meta_off, _, _ = self._file(file_idx)
+        c = Container([], self._string(name_idx))
+        c.id = self._string(id_idx)
+        tags, paths, params = self._metadata(meta_off)
+        c.tags, c.paths, c.parameters = list(tags), list(paths), dict(params)
+        return c
+
+    def _sections(self, first: int, count: int, source_name: str) -> List[Section]:
+        start = self._sections_off + first * _SECTION.size
+        records = _SECTION.iter_unpack(
+            self._data[start : start + count * _SECTION.size]
+        )
+        string = self._string
+        out = []
+        for (
+            id_idx,
+            type_idx,
+            _file_idx,
+            meta_off,
+            open_line,
+            close_line,
+            flags,
+            body_off,
+            body_len,
+        ) in records:
+            tags, paths, params = self._metadata(meta_off)
+            loader = None
+            if close_line > open_line + 1:
+                loader = functools.partial(self._body_lines, body_off, body_len, flags)
+            out.append(
+                Section(
+                    section_id=string(id_idx),
+                    tags=tags,
+                    paths=paths,
+                    parameters=params,
+                    type_name=string(type_idx),
+                    open_line=open_line,
+                    close_line=close_line,
+                    is_self_closing=bool(flags & _SELF_CLOSING),
+                    all_lines=_LineWindow(
+                        None if loader else [], open_line + 1, loader=loader
+                    ),
+                    source_name=source_name,
+                )
+            )
+        return out
+
+    def _body_lines(self, body_off: int, body_len: int, flags: int) -> List[str]:
+        start = self._bodies_off + body_off
+        body = self._data[start : start + body_len]
+        if flags & _COMPRESSED:
+            body = zlib.decompress(body)
+        # One "line" holding the whole body: Section joins its lines and
+        # drops the final newline, so this yields the stored body exactly.
+        return [body.decode("utf-8") + "\n"]
+
+    def container(self, file_idx: int) -> Container:
+        """The Container for one packed source; bodies are read lazily."""
+        c = self._containers.get(file_idx)
+        if c is None:
+            name_idx, id_idx, first, count, meta_off, _, _ = self._file(file_idx)
+            name = self._string(name_idx)
+            sections = self._sections(first, count, name)
+            # The container metadata is stored decoded, so the container
+            # section is attached afterwards instead of being re-parsed.
+            head = [s for s in sections if s.raw_type_name.lower() == "container"]
+            c = Container([s for s in sections if s not in head], name)
+            c.raw_sections = sections
+            if head:
+                c.container_metadata = head[0]
+                tags, paths, params = self._metadata(meta_off)
+                c.tags, c.paths, c.parameters = list(tags), list(paths), dict(params)
+                c.id = self._string(id_idx)
+            self._containers[file_idx] = c
+        return c
+
+    def containers(
+        self,
+        container_query: Optional[QueryNode] = None,
+        section_query: Optional[QueryNode] = None,
+    ) -> List[Container]:
+        """
+        Containers for the packed sources, skipping sources whose container
+        metadata fails `container_query`, or whose bloom filter shows they
+        cannot hold a section matching `section_query`. With a
+        section_query, containers keep only their matching sections.
+        """
+        terms = _required_terms(section_query) if section_query else set()
+        out = []
+        for i in range(self.n_files):
+            if container_query is not None and not container_query.matches(
+                self._container_header(i), hierarchical_paths=False
+            ):
+                continue
+            if not self._may_contain(i, terms):
+                continue
+            c = self.container(i)
+            if section_query is not None:
+                keep = [s for s in c.sections if section_query.matches(s)]
+                if not keep:
+                    continue
+                c = c._subset(keep)
+            out.append(c)
+        return out
+
+    def get(self, section_id: str) -> List[Section]:
+        """All sections with the given ID, found through the ID hash table."""
+        data = self._data
+        (n_slots,) = _U32.unpack_from(data, self._ids_off)
+        slot = _id_hash(section_id) & (n_slots - 1)
+        order_off = self._ids_off + 4 + n_slots * _ID_SLOT.size
+        while True:
+            id_plus_one, start, count = _ID_SLOT.unpack_from(
+                data, self._ids_off + 4 + slot * _ID_SLOT.size
+            )
+            if not id_plus_one:
+                return []
+            if self._string(id_plus_one - 1) == section_id:
+                break
+            slot = (slot + 1) & (n_slots - 1)
+
+        out = []
+        for pos in range(start, start + count):
+            (sec_idx,) = _U32.unpack_from(data, order_off + 4 * pos)
+            (file_idx,) = struct.unpack_from(
+                "<I", data, self._sections_off + sec_idx * _SECTION.size + 8
+            )
+            first = self._file(file_idx)[2]
+            container = self.container(file_idx)
+            # Sections of a container keep their order in raw_sections.
+            out.append(container.raw_sections[sec_idx - first])
+        return out
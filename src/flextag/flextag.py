@@ -1,18 +1,42 @@
+import bisect
+import codecs
 import collections
+import copyreg
+import fnmatch
+import functools
+import gzip
+import hashlib
+import io
+import itertools
 import json
 import os
+import pickle
 import re
 import shlex
+import sqlite3
+import struct
+import threading
+import time
+import zlib
 import logging
+import mmap
+from array import array
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
 from typing import (
     List,
     Dict,
     Any,
     Union,
     Optional,
+    Callable,
+    Iterator,
 )
 
+from . import instrument as _instrument
+
 ##############################################################################
 # LOGGING
 ##############################################################################
@@ -68,6 +92,7 @@ class FlexTagSyntaxError(FlexTagError):
             msg += caret_line
 
         super().__init__(msg)
+        self.message = message
         self.line_num = line_num
         self.column_num = column_num
         self.source_name = source_name
@@ -96,6 +121,7 @@ class SchemaValidationError(FlexTagError):
         msg = f"[{loc_str}] {message}" if loc_str else message
 
         super().__init__(msg)
+        self.message = message
         self.source_file = source_file
         self.line_num = line_num
         self.column_num = column_num
@@ -109,6 +135,46 @@ class SchemaSectionError(SchemaValidationError):
     """Missing required section, wrong order, or other structural schema issues."""
 
 
+class Diagnostic:
+    """
+    One error collected by load(on_error="collect"): the source it was found
+    in, its 1-based line and column (-1 when unknown, e.g. for a file that
+    could not be read), its message, and the exception itself.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        line: int,
+        column: int,
+        message: str,
+        error: Optional[Exception] = None,
+    ):
+        self.source = source
+        self.line = line
+        self.column = column
+        self.message = message
+        self.error = error
+
+    @classmethod
+    def from_error(cls, error: Exception, source: str) -> "Diagnostic":
+        return cls(
+            source=getattr(error, "source_name", "")
+            or getattr(error, "source_file", "")
+            or source,
+            line=getattr(error, "line_num", -1),
+            column=getattr(error, "column_num", -1),
+            message=getattr(error, "message", None) or str(error),
+            error=error,
+        )
+
+    def __repr__(self):
+        return (
+            f"<Diagnostic {self.source} L{self.line} C{self.column}: "
+            f"{self.message!r}>"
+        )
+
+
 ##############################################################################
 # SETTINGS
 ##############################################################################
@@ -125,6 +191,7 @@ class FlexTagSettings:
         self._max_section_size = 1024 * 1024  # 1MB
         self._max_nesting_depth = 50
         self._encoding = "utf-8"
+        self._index_backend = "int"
 
     @property
     def allow_directory_traversal(self) -> bool:
@@ -166,6 +233,188 @@ class FlexTagSettings:
     def encoding(self, val: str):
         self._encoding = val
 
+    @property
+    def index_backend(self) -> str:
+        """Bitmap backend for filter indexes: "int" or "numpy"."""
+        return self._index_backend
+
+    @index_backend.setter
+    def index_backend(self, val: str):
+        if val not in BITMAP_BACKENDS:
+            raise FlexTagError(
+                f"Unknown index backend '{val}'; "
+                f"expected one of {', '.join(BITMAP_BACKENDS)}"
+            )
+        self._index_backend = val
+
+
+##############################################################################
+# LOAD STATISTICS
+##############################################################################
+
+# Phases timed by load(stats=True). "tokenize" (header tokenizing) is part
+# of "scan" and is timed by wall clock only; "content" covers section
+# bodies decoded after loading, when first accessed.
+LOAD_PHASES = (
+    "read",
+    "scan",
+    "tokenize",
+    "defaults",
+    "schema",
+    "validate",
+    "content",
+)
+
+
+class SourceStats:
+    """
+    Counters and phase timings of one source in a load(stats=True).
+
+    `wall` and `cpu` map phase names (LOAD_PHASES) to seconds. When a file
+    is parsed with workers > 1, "scan" covers only merging the workers'
+    results. `bytes` is the size of a file on disk or of a byte buffer, and
+    the number of characters read for text and stream sources.
+
+    The cache counters apply to lazy sources: header lists served from a
+    catalog or an earlier scan, and parsed containers served from the LRU.
+    """
+
+    def __init__(self, source_name: str):
+        self.source_name = source_name
+        self.bytes = 0
+        self.lines = 0
+        self.sections = 0
+        self.wall: Dict[str, float] = {}
+        self.cpu: Dict[str, float] = {}
+        self.content_parses: Dict[str, int] = {}
+        self.header_cache_hits = 0
+        self.header_cache_misses = 0
+        self.container_cache_hits = 0
+        self.container_cache_misses = 0
+
+    def __repr__(self):
+        return (
+            f"<SourceStats {self.source_name!r} bytes={self.bytes} "
+            f"lines={self.lines} sections={self.sections}>"
+        )
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the wall and CPU time of the enclosed block to phase `name`."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.wall[name] = self.wall.get(name, 0.0) + time.perf_counter() - wall
+            self.cpu[name] = self.cpu.get(name, 0.0) + time.process_time() - cpu
+
+    def _content_parsed(self, type_name: str):
+        type_name = type_name.lower().strip() or "raw"
+        self.content_parses[type_name] = self.content_parses.get(type_name, 0) + 1
+
+
+class LoadStats:
+    """
+    Statistics of one load(stats=True), available as view.stats: a
+    SourceStats per source in `sources`, their totals, and the wall and
+    CPU time of the whole load call. Content decoded later, on first
+    access, keeps adding to the same objects.
+    """
+
+    def __init__(self):
+        self.sources: List[SourceStats] = []
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __repr__(self):
+        return (
+            f"<LoadStats sources={len(self.sources)} sections={self.sections} "
+            f"wall={self.wall:.6f}s>"
+        )
+
+    def _add_source(self, source_name: str) -> SourceStats:
+        rec = SourceStats(source_name)
+        self.sources.append(rec)
+        return rec
+
+    def _total(self, attr: str) -> int:
+        return sum(getattr(rec, attr) for rec in self.sources)
+
+    @staticmethod
+    def _merge(dicts) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for d in dicts:
+            for key, value in d.items():
+                out[key] = out.get(key, 0) + value
+        return out
+
+    @property
+    def bytes(self) -> int:
+        return self._total("bytes")
+
+    @property
+    def lines(self) -> int:
+        return self._total("lines")
+
+    @property
+    def sections(self) -> int:
+        return self._total("sections")
+
+    @property
+    def phase_wall(self) -> Dict[str, float]:
+        """Wall seconds per phase, summed over sources."""
+        return self._merge(rec.wall for rec in self.sources)
+
+    @property
+    def phase_cpu(self) -> Dict[str, float]:
+        """CPU seconds per phase, summed over sources."""
+        return self._merge(rec.cpu for rec in self.sources)
+
+    @property
+    def content_parses(self) -> Dict[str, int]:
+        """Section bodies decoded so far, per content type."""
+        return self._merge(rec.content_parses for rec in self.sources)
+
+    @staticmethod
+    def _rate(hits: int, misses: int) -> Optional[float]:
+        return hits / (hits + misses) if hits + misses else None
+
+    @property
+    def header_cache_hit_rate(self) -> Optional[float]:
+        """Share of lazy header lookups served without a scan, or None."""
+        return self._rate(
+            self._total("header_cache_hits"), self._total("header_cache_misses")
+        )
+
+    @property
+    def container_cache_hit_rate(self) -> Optional[float]:
+        """Share of lazy container accesses served from the LRU, or None."""
+        return self._rate(
+            self._total("container_cache_hits"),
+            self._total("container_cache_misses"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The totals as plain values, e.g. for logging or metrics."""
+        return {
+            "sources": len(self.sources),
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "sections": self.sections,
+            "phase_wall": self.phase_wall,
+            "phase_cpu": self.phase_cpu,
+            "content_parses": self.content_parses,
+            "header_cache_hit_rate": self.header_cache_hit_rate,
+            "container_cache_hit_rate": self.container_cache_hit_rate,
+        }
+
+
+def _phase(stats: Optional[SourceStats], name: str):
+    """stats.phase(name), or a no-op context when no stats are kept."""
+    return nullcontext() if stats is None else stats.phase(name)
+
 
 ##############################################################################
 # PARSING HELPERS
@@ -173,6 +422,35 @@ class FlexTagSettings:
 
 OP_PATTERN = re.compile(r"^([^=!<>]+)\s*(=|!=|>=|<=|>|<)\s*(.+)$")
 
+# Double-bracket section open and close lines.
+SECTION_OPEN_PATTERN = re.compile(r"^\s*\[\[\s*(.*?)\]\]\s*(?::\s*(.*?))?$")
+SECTION_CLOSE_PATTERN = re.compile(r"^\s*\[\[/\s*(.*?)\]\]\s*$")
+
+# Section types that hold container-level data rather than user content.
+HEAD_SECTION_TYPES = ("container", "defaults", "schema")
+
+# Query keys with this prefix address fields inside a section's parsed body.
+CONTENT_PREFIX = "content."
+
+# Characters that give shlex work to do; headers without them split on whitespace.
+SHLEX_SPECIAL_CHARS = frozenset("\"'\\")
+PLAIN_TOKEN_PATTERN = re.compile(r"[^ \t\r\n]+")
+
+
+def split_header_tokens(text: str) -> List[str]:
+    """
+    Split bracket metadata the way ``shlex.split`` does, skipping the
+    tokenizer for the common case of headers with no quotes or escapes.
+    """
+    if SHLEX_SPECIAL_CHARS.isdisjoint(text):
+        return PLAIN_TOKEN_PATTERN.findall(text)
+    return shlex.split(text)
+
+
+def _decode_text(data: bytes, encoding: str) -> str:
+    """Decode `data` with universal newlines, as text-mode file reads do."""
+    return io.StringIO(data.decode(encoding), newline=None).getvalue()
+
 
 def format_error_location(source_name, line_num, column_num):
     """Create standardized location string for errors."""
@@ -364,17 +642,17 @@ def _interpret_bracket_meta(
     Tracks line and column numbers for detailed error reporting.
     """
     bracket_str = bracket_str.strip()
-    logger.debug(f"Interpreting bracket meta: {bracket_str!r}")
+    logger.debug("Interpreting bracket meta: %r", bracket_str)
 
     is_self_closing = False
     if bracket_str.endswith("/"):
         is_self_closing = True
         bracket_str = bracket_str[:-1].strip()
-        logger.debug(f"Self-closing detected. Stripped bracket: {bracket_str!r}")
+        logger.debug("Self-closing detected. Stripped bracket: %r", bracket_str)
 
     try:
-        tokens = shlex.split(bracket_str)
-        logger.debug(f"Tokens: {tokens!r}")
+        tokens = split_header_tokens(bracket_str)
+        logger.debug("Tokens: %r", tokens)
     except ValueError as e:
         # Extract column information from shlex error
         error_msg = str(e)
@@ -443,8 +721,9 @@ def _interpret_bracket_meta(
         elif t.startswith("."):
             # Deprecated path syntax
             logger.warning(
-                f"Deprecated path syntax '.{t[1:]}' used. "
-                f"Please use '@{t[1:]}' instead."
+                "Deprecated path syntax '.%s' used. Please use '@%s' instead.",
+                t[1:],
+                t[1:],
             )
             # Convert to new syntax internally
             paths.append("@" + t[1:])
@@ -455,9 +734,9 @@ def _interpret_bracket_meta(
             # Bare token => param=True
             params[t] = True
 
-    logger.debug(f"Default tags: {tags}")
-    logger.debug(f"Default paths: {paths}")
-    logger.debug(f"Default params: {params}")
+    logger.debug("Default tags: %s", tags)
+    logger.debug("Default paths: %s", paths)
+    logger.debug("Default params: %s", params)
     return (section_id, tags, paths, params, is_self_closing)
 
 
@@ -647,11 +926,21 @@ except ImportError:
     except ImportError:
         tomllib = None
 
+try:
+    import tomli_w
+except ImportError:
+    tomli_w = None
+
 try:
     import ftml
 except ImportError:
     ftml = None
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 def parse_ftml(content: str) -> Any:
     """
@@ -713,6 +1002,104 @@ def parse_toml(content: str) -> Any:
         raise FlexTagSyntaxError(f"TOML parsing error: {e}")
 
 
+def dump_content(content: Any, type_name: str) -> str:
+    """
+    Encode parsed `content` back into the body text of a section of type
+    `type_name`. Raw and head sections take a string (or, for containers,
+    a list of lines); unknown types are written as text.
+    """
+    tname = type_name.lower().strip()
+    if tname == "json":
+        return json.dumps(content, indent=2, ensure_ascii=False)
+    if tname == "yaml":
+        if not yaml:
+            raise FlexTagError(
+                "YAML library not installed. Install with: pip install pyyaml"
+            )
+        return yaml.safe_dump(
+            content, sort_keys=False, allow_unicode=True, default_flow_style=False
+        ).rstrip("\n")
+    if tname == "toml":
+        if not tomli_w:
+            raise FlexTagError(
+                "TOML writer not installed. Install with: pip install tomli-w"
+            )
+        return tomli_w.dumps(content).rstrip("\n")
+    if tname == "ftml":
+        if not ftml:
+            raise FlexTagError(
+                "FTML library not installed. Install with: pip install ftml"
+            )
+        return ftml.dump(content)
+    if isinstance(content, list):
+        return "\n".join(str(line) for line in content)
+    return "" if content is None else str(content)
+
+
+# Sentinel for "no value at this key path" in content projections.
+_MISSING = object()
+
+
+def _walk_key_path(data: Any, keys: tuple) -> Any:
+    """
+    Follow `keys` through nested dicts/lists. Returns _MISSING if any step
+    is absent. Numeric keys index into lists.
+    """
+    node = data
+    for k in keys:
+        if isinstance(node, dict):
+            if k not in node:
+                return _MISSING
+            node = node[k]
+        elif isinstance(node, list):
+            try:
+                node = node[int(k)]
+            except (ValueError, IndexError):
+                return _MISSING
+        else:
+            return _MISSING
+    return node
+
+
+def project_yaml(content: str, keys: tuple) -> Any:
+    """
+    Extract the value at `keys` from YAML content without constructing the
+    whole document. The document is composed into a node graph and only the
+    node at the requested key path is converted into Python objects.
+    Returns _MISSING if the path does not exist.
+    """
+    if not yaml:
+        raise FlexTagSyntaxError(
+            "YAML library not installed. Install with: pip install pyyaml"
+        )
+
+    loader = yaml.SafeLoader(content)
+    try:
+        node = loader.get_single_node()
+        for k in keys:
+            if isinstance(node, yaml.MappingNode):
+                for key_node, value_node in node.value:
+                    if isinstance(key_node, yaml.ScalarNode) and key_node.value == k:
+                        node = value_node
+                        break
+                else:
+                    return _MISSING
+            elif isinstance(node, yaml.SequenceNode):
+                try:
+                    node = node.value[int(k)]
+                except (ValueError, IndexError):
+                    return _MISSING
+            else:
+                return _MISSING
+        if node is None:
+            return _MISSING
+        return loader.construct_document(node)
+    except yaml.YAMLError as e:
+        raise FlexTagSyntaxError(f"YAML parsing error: {e}")
+    finally:
+        loader.dispose()
+
+
 def validate_ftml(content: str, schema: str) -> List[str]:
     """
     Validate FTML content against the schema using the actual FTML library.
@@ -725,11 +1112,11 @@ def validate_ftml(content: str, schema: str) -> List[str]:
 
     try:
         # Validate the raw FTML content directly against the schema
-        logger.debug(f"Validating FTML content against schema")
+        logger.debug("Validating FTML content against schema")
         ftml.load(content, schema=schema)
         return []
     except Exception as e:
-        logger.debug(f"FTML validation failed: {e}")
+        logger.debug("FTML validation failed: %s", e)
         return [str(e)]
 
 
@@ -782,7 +1169,9 @@ class FlexParser:
     """
 
     def __init__(self):
-        pass
+        # SourceStats of the source being parsed by load(stats=True), which
+        # collects header tokenizing time.
+        self.stats: Optional[SourceStats] = None
 
     def parse_bracket_sections(
         self, lines: List[str], source_name: str
@@ -790,13 +1179,31 @@ class FlexParser:
         """
         Enhanced version that correctly handles 'container' sections and extracts their metadata.
         """
-        open_pat_str = r"^\s*\[\[\s*(.*?)\]\]\s*(?::\s*(.*?))?$"
-        close_pat_str = r"^\s*\[\[/\s*(.*?)\]\]\s*$"
-        open_pat = re.compile(open_pat_str)
-        close_pat = re.compile(close_pat_str)
+        return list(self.iter_bracket_sections(lines, source_name))
 
-        sections = []
-        i = 0
+    def iter_bracket_sections(
+        self,
+        lines: List[str],
+        source_name: str,
+        collect_content: bool = True,
+        start: int = 0,
+        errors: Optional[List[FlexTagSyntaxError]] = None,
+    ):
+        """
+        Generator form of parse_bracket_sections: yields each section dict as
+        soon as its close tag is found, so callers can stop early.
+
+        With collect_content=False, section bodies are only scanned for the
+        close tag and "raw_content" is left empty (except for container
+        sections, whose metadata is read from the body).
+
+        Parsing begins at line `start`, which must lie between sections.
+
+        If an `errors` list is given, syntax errors are appended to it
+        instead of raised: the failing section is skipped and parsing
+        resumes at the next line after its open line that starts with "[[".
+        """
+        i = start
         n = len(lines)
 
         while i < n:
@@ -805,62 +1212,37 @@ class FlexParser:
                 i += 1
                 continue
 
-            m_open = open_pat.match(line)
-            if m_open:
-                bracket_str = m_open.group(1) or ""
-                type_decl = m_open.group(2) or ""
-
-                # Check for multiple type declarations
-                if type_decl and ":" in type_decl:
-                    # Find the position of the second colon directly
-                    first_colon_pos = line.find(":")
-                    second_colon_pos = line.find(":", first_colon_pos + 1)
-
+            open_line = i
+            try:
+                opened = self._open_section(line, i, source_name)
+                if opened is None:
                     raise FlexTagSyntaxError(
-                        "Multiple type declarations",
+                        "Lines between sections must be comments starting with #",
                         line_num=i + 1,
-                        column_num=second_colon_pos + 1,
+                        column_num=1,
                         source_name=source_name,
                         line_content=line,
                     )
 
-                open_line = i
-                bracket_str = m_open.group(1) or ""
-                type_decl = m_open.group(2) or ""
-                is_container = (
-                    type_decl.lower() == "container"
-                )  # Identify container sections
-
-                section_id, tags, paths, params, is_self_closing = (
-                    self._interpret_open_bracket(bracket_str, source_name, i + 1)
-                )
-
+                section_id, tags, paths, params, is_self_closing, type_decl = opened
+                is_container = type_decl.lower() == "container"
                 close_line = open_line
                 raw_content = ""
                 i += 1
 
                 if not is_self_closing:
-                    content_lines = []
                     found_close = False
                     while i < n:
-                        c_line = lines[i].rstrip("\n")
-                        m_close = close_pat.match(c_line)
-                        if m_close:
-                            found_id = m_close.group(1).strip()
-                            if found_id.lower() == section_id.lower():
-                                found_close = True
-                                close_line = i
-                                i += 1
-                                break
-                            else:
-                                raise FlexTagSyntaxError(
-                                    f"Mismatched close ID='{found_id}', expected='{section_id}'",
-                                    line_num=i + 1,
-                                    source_name=source_name,
-                                )
-                        else:
-                            content_lines.append(lines[i])
+                        c_line = lines[i]
+                        # Only lines containing '[[/' can close the section.
+                        if "[[/" in c_line and self._closes_section(
+                            c_line.rstrip("\n"), section_id, i, source_name
+                        ):
+                            found_close = True
+                            close_line = i
                             i += 1
+                            break
+                        i += 1
                     if not found_close:
                         raise FlexTagSyntaxError(
                             f"No matching close for ID='{section_id}'",
@@ -868,46 +1250,274 @@ class FlexParser:
                             source_name=source_name,
                         )
 
-                    raw_content = "".join(content_lines)
-                    if raw_content.endswith("\n"):
-                        raw_content = raw_content[:-1]
-
-                section_data = {
-                    "section_id": section_id,
-                    "tags": tags,
-                    "paths": paths,
-                    "params": params,
-                    "open_line": open_line,
-                    "close_line": close_line,
-                    "is_self_closing": is_self_closing,
-                    "type_decl": type_decl,
-                    "raw_content": raw_content,
-                }
-
-                if is_container:
-                    # If it's a container, parse its content for metadata
-                    section_data["container_metadata"] = self._parse_container_metadata(
-                        raw_content
-                    )
-                else:
-                    section_data["container_metadata"] = (
-                        None  # Ensure it's always present
-                    )
+                    if collect_content or is_container:
+                        raw_content = "".join(lines[open_line + 1 : close_line])
+                        if raw_content.endswith("\n"):
+                            raw_content = raw_content[:-1]
 
-                sections.append(section_data)
-            else:
-                # Check if this is a non-empty line that's not a comment
-                if line.strip() and not line.strip().startswith("#"):
+                record = self._section_record(
+                    opened, open_line, close_line, raw_content
+                )
+            except FlexTagSyntaxError as e:
+                if errors is None:
+                    raise
+                errors.append(e)
+                i = self._resync(lines, open_line + 1)
+                continue
+            yield record
+
+    @staticmethod
+    def _resync(lines: List[str], start: int) -> int:
+        """Index of the first line from `start` on that may open a section."""
+        for i in range(start, len(lines)):
+            text = lines[i].lstrip()
+            if text.startswith("[[") and not text.startswith("[[/"):
+                return i
+        return len(lines)
+
+    def iter_section_headers(
+        self,
+        data: bytes,
+        source_name: str,
+        encoding="utf-8",
+        offset: int = 0,
+        line_no: int = 0,
+        partial: bool = False,
+    ):
+        """
+        Headers-only scan of a whole source held as bytes (or an mmap).
+        Yields the same section dicts as iter_bracket_sections, plus
+        "byte_start" and "byte_end" (the byte range from the open line
+        through the close line).
+
+        Section bodies are skipped with byte searches for the next close
+        tag; only lines that can open or close a section are decoded. The
+        bodies of container and defaults sections are still read, since they
+        hold metadata. `encoding` must be ASCII-compatible.
+
+        Scanning begins at byte `offset`, which must be the start of line
+        `line_no`. With partial=True the data may still be growing: an
+        unterminated last line or an unclosed last section ends the scan
+        quietly instead of raising.
+        """
+        size = len(data)
+        if partial:
+            size = data.rfind(b"\n", offset, size) + 1 or offset
+        pos = offset
+
+        while pos < size:
+            hit = data.find(b"[[", pos, size)
+            if hit < 0:
+                self._check_gap(data[pos:size], line_no, source_name, encoding)
+                return
+            start = data.rfind(b"\n", pos, hit) + 1 or pos
+            self._check_gap(data[pos:start], line_no, source_name, encoding)
+            line_no += data[pos:start].count(b"\n")
+            end = data.find(b"\n", hit, size) + 1 or size
+            line = data[start:end].decode(encoding).rstrip("\r\n")
+            pos = end
+
+            if line.strip().startswith("#"):
+                line_no += 1
+                continue
+            opened = self._open_section(line, line_no, source_name)
+            if opened is None:
+                raise FlexTagSyntaxError(
+                    "Lines between sections must be comments starting with #",
+                    line_num=line_no + 1,
+                    column_num=1,
+                    source_name=source_name,
+                    line_content=line,
+                )
+
+            open_line = line_no
+            line_no += 1
+            if opened[4]:
+                record = self._section_record(opened, open_line, open_line, "")
+                record["byte_start"] = start
+                record["byte_end"] = end
+                yield record
+                continue
+
+            # Skip the body: jump between '[[/' occurrences until one sits on
+            # a line that closes this section.
+            body_start = search = end
+            while True:
+                hit = data.find(b"[[/", search, size)
+                if hit < 0:
+                    if partial:
+                        return
                     raise FlexTagSyntaxError(
-                        "Lines between sections must be comments starting with #",
-                        line_num=i + 1,
-                        column_num=1,
+                        f"No matching close for ID='{opened[0]}'",
+                        line_num=line_no + data[body_start:size].count(b"\n"),
                         source_name=source_name,
-                        line_content=line,
                     )
-                i += 1
+                c_start = data.rfind(b"\n", body_start, hit) + 1 or body_start
+                c_end = data.find(b"\n", hit, size) + 1 or size
+                close_line = line_no + data[body_start:c_start].count(b"\n")
+                c_line = data[c_start:c_end].decode(encoding).rstrip("\r\n")
+                if self._closes_section(c_line, opened[0], close_line, source_name):
+                    break
+                search = c_end
+
+            raw_content = ""
+            if opened[5].strip().lower() in ("container", "defaults"):
+                raw_content = _decode_text(data[body_start:c_start], encoding)
+                if raw_content.endswith("\n"):
+                    raw_content = raw_content[:-1]
+            record = self._section_record(opened, open_line, close_line, raw_content)
+            record["byte_start"] = start
+            record["byte_end"] = c_end
+            yield record
+            line_no = close_line + 1
+            pos = c_end
+
+    def iter_line_sections(self, lines, source_name: str):
+        """
+        Streaming form of iter_bracket_sections over any iterable of lines,
+        such as a text stream. Yields (record, block) pairs, where `block`
+        holds the section's lines from its open line through its close
+        line; no other lines are kept.
+        """
+        opened = None
+        block: List[str] = []
+        open_line = line_no = 0
+        for line_no, line in enumerate(lines):
+            if opened is not None:
+                block.append(line)
+                if "[[/" in line and self._closes_section(
+                    line.rstrip("\n"), opened[0], line_no, source_name
+                ):
+                    raw_content = ""
+                    if opened[5].lower() == "container":
+                        raw_content = "".join(block[1:-1])
+                        if raw_content.endswith("\n"):
+                            raw_content = raw_content[:-1]
+                    yield self._section_record(
+                        opened, open_line, line_no, raw_content
+                    ), block
+                    opened = None
+                continue
+
+            text = line.rstrip("\n")
+            if not text.strip() or text.strip().startswith("#"):
+                continue
+            opened = self._open_section(text, line_no, source_name)
+            if opened is None:
+                raise FlexTagSyntaxError(
+                    "Lines between sections must be comments starting with #",
+                    line_num=line_no + 1,
+                    column_num=1,
+                    source_name=source_name,
+                    line_content=text,
+                )
+            open_line = line_no
+            block = [line]
+            if opened[4]:
+                yield self._section_record(opened, open_line, open_line, ""), block
+                opened = None
+
+        if opened is not None:
+            raise FlexTagSyntaxError(
+                f"No matching close for ID='{opened[0]}'",
+                line_num=line_no + 1,
+                source_name=source_name,
+            )
+
+    @staticmethod
+    def _check_gap(gap: bytes, line_no: int, source_name: str, encoding: str):
+        """Raise unless `gap` (text between sections) is blank or comments."""
+        if not gap.strip():
+            return
+        for offset, line in enumerate(gap.decode(encoding).splitlines()):
+            if line.strip() and not line.strip().startswith("#"):
+                raise FlexTagSyntaxError(
+                    "Lines between sections must be comments starting with #",
+                    line_num=line_no + offset + 1,
+                    column_num=1,
+                    source_name=source_name,
+                    line_content=line,
+                )
+
+    def _open_section(self, line: str, line_index: int, source_name: str):
+        """
+        Interpret `line` as a section open line. Returns (section_id, tags,
+        paths, params, is_self_closing, type_decl), or None if the line does
+        not open a section.
+        """
+        m_open = SECTION_OPEN_PATTERN.match(line)
+        if not m_open:
+            return None
+        bracket_str = m_open.group(1) or ""
+        type_decl = m_open.group(2) or ""
+
+        # Check for multiple type declarations
+        if type_decl and ":" in type_decl:
+            # Find the position of the second colon directly
+            first_colon_pos = line.find(":")
+            second_colon_pos = line.find(":", first_colon_pos + 1)
+
+            raise FlexTagSyntaxError(
+                "Multiple type declarations",
+                line_num=line_index + 1,
+                column_num=second_colon_pos + 1,
+                source_name=source_name,
+                line_content=line,
+            )
+
+        stats = self.stats
+        if stats is not None:
+            started = time.perf_counter()
+        section_id, tags, paths, params, is_self_closing = self._interpret_open_bracket(
+            bracket_str, source_name, line_index + 1
+        )
+        if stats is not None:
+            wall = stats.wall
+            wall["tokenize"] = wall.get("tokenize", 0.0) + time.perf_counter() - started
+        return section_id, tags, paths, params, is_self_closing, type_decl
+
+    @staticmethod
+    def _closes_section(
+        line: str, section_id: str, line_index: int, source_name: str
+    ) -> bool:
+        """
+        True if `line` is the close tag for `section_id`. A close tag for any
+        other ID is an error.
+        """
+        m_close = SECTION_CLOSE_PATTERN.match(line)
+        if not m_close:
+            return False
+        found_id = m_close.group(1).strip()
+        if found_id.lower() != section_id.lower():
+            raise FlexTagSyntaxError(
+                f"Mismatched close ID='{found_id}', expected='{section_id}'",
+                line_num=line_index + 1,
+                source_name=source_name,
+            )
+        return True
 
-        return sections  # Return after processing ALL sections, not just the first one
+    def _section_record(
+        self, opened: tuple, open_line: int, close_line: int, raw_content: str
+    ) -> Dict[str, Any]:
+        section_id, tags, paths, params, is_self_closing, type_decl = opened
+        section_data = {
+            "section_id": section_id,
+            "tags": tags,
+            "paths": paths,
+            "params": params,
+            "open_line": open_line,
+            "close_line": close_line,
+            "is_self_closing": is_self_closing,
+            "type_decl": type_decl,
+            "raw_content": raw_content,
+            "container_metadata": None,
+        }
+        if type_decl.lower() == "container":
+            # If it's a container, parse its content for metadata
+            section_data["container_metadata"] = self._parse_container_metadata(
+                raw_content
+            )
+        return section_data
 
     def _parse_container_metadata(self, raw_content: str) -> Dict[str, Any]:
         """
@@ -943,7 +1553,7 @@ class FlexParser:
 
         # Use shlex to properly split on spaces while respecting quotes
         try:
-            tokens = shlex.split(bracket_str)
+            tokens = split_header_tokens(bracket_str)
         except ValueError as e:
             raise FlexTagSyntaxError(
                 f"Error parsing bracket metadata: {e}",
@@ -1051,7 +1661,7 @@ class FlexParser:
         else:
             # Unknown type, fall back to automatic inference
             logger.warning(
-                f"Unknown type '{type_name}', using automatic type inference"
+                "Unknown type '%s', using automatic type inference", type_name
             )
             return parse_basic_value(value_str)
 
@@ -1059,12 +1669,72 @@ class FlexParser:
 ##############################################################################
 # SECTION
 ##############################################################################
-class Section:
+class _LineWindow:
     """
-    Represents a single bracketed block of content.
-    Type can be 'raw' (default), 'ftml', or any registered parser.
+    The lines of one section, indexed by their line numbers in the whole
+    source so Section can slice them as usual. With a `loader`, the lines
+    are only produced on first access.
+    """
+
+    __slots__ = ("_lines", "base", "_loader")
+
+    def __init__(
+        self,
+        lines: Optional[List[str]],
+        base: int,
+        loader: Optional[Callable[[], List[str]]] = None,
+    ):
+        self._lines = lines
+        self.base = base
+        self._loader = loader
+
+    @property
+    def lines(self) -> List[str]:
+        if self._lines is None:
+            self._lines = self._loader()
+            self._loader = None
+        return self._lines
+
+    def __len__(self):
+        return self.base + len(self.lines)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = (key.start or 0) - self.base
+            stop = None if key.stop is None else max(key.stop - self.base, 0)
+            return self.lines[max(start, 0) : stop]
+        return self.lines[key - self.base]
+
+
+class SectionHeader:
+    """
+    The metadata and position of a section, without its body.
+    Produced by header-only scans and used to evaluate loader predicates;
+    Section extends it with content access.
     """
 
+    __slots__ = (
+        "raw_id",
+        "raw_tags",
+        "raw_paths",
+        "raw_parameters",
+        "raw_type_name",
+        "open_line",
+        "close_line",
+        "is_self_closing",
+        "source_name",
+        "inherited_id",
+        "inherited_tags",
+        "inherited_paths",
+        "inherited_params",
+        "inherited_type",
+        "byte_start",
+        "byte_end",
+        "_all_lines",
+        "_reader",
+        "_section",
+    )
+
     def __init__(
         self,
         section_id: str,
@@ -1075,8 +1745,11 @@ class Section:
         open_line: int,
         close_line: int,
         is_self_closing: bool,
-        all_lines: List[str],
         source_name: str = "",
+        all_lines: Optional[List[str]] = None,
+        byte_start: Optional[int] = None,
+        byte_end: Optional[int] = None,
+        reader: Optional[Callable[[int, int], str]] = None,
     ):
         self.raw_id = section_id
         self.raw_tags = tags[:]
@@ -1088,8 +1761,11 @@ class Section:
         self.open_line = open_line
         self.close_line = close_line
         self.is_self_closing = is_self_closing
+        self.byte_start = byte_start
+        self.byte_end = byte_end
         self._all_lines = all_lines
-        self._parsed_cache = None
+        self._reader = reader
+        self._section: Optional["Section"] = None
 
         self.source_name = source_name
         self.inherited_id: Optional[str] = None
@@ -1099,7 +1775,7 @@ class Section:
         self.inherited_type: Optional[str] = None
 
     def __repr__(self):
-        return f"<Section ID={self.id!r} type={self.type_name!r}>"
+        return f"<SectionHeader ID={self.id!r} type={self.type_name!r}>"
 
     @property
     def id(self) -> str:
@@ -1137,30 +1813,260 @@ class Section:
             return self.inherited_type
         return self.raw_type_name
 
-    @property
-    def raw_content(self) -> str:
-        if self.is_self_closing:
-            return ""
-        if self.close_line <= self.open_line:
-            return ""
-        raw = "".join(self._all_lines[self.open_line + 1 : self.close_line])
-        if raw.endswith("\n"):
-            return raw[:-1]
-        return raw
-
-    @property
-    def content(self) -> Any:
-        if self._parsed_cache is None:
-            self._parsed_cache = self._parse_content()
-        return self._parsed_cache
-
-    def _parse_content(self) -> Any:
+    def inherit_defaults(
+        self, d_id: str, d_tags: List[str], d_paths: List[str], d_params: dict
+    ):
+        """Merge metadata from a defaults block into the inherited fields."""
+        if d_id and not self.inherited_id:
+            self.inherited_id = d_id
+
+        # Add default tags and paths (copies, so shared lists are untouched)
+        self.inherited_tags = self.inherited_tags + [
+            t for t in d_tags if t not in self.inherited_tags
+        ]
+        self.inherited_paths = self.inherited_paths + [
+            p for p in d_paths if p not in self.inherited_paths
+        ]
+
+        # Merge params: defaults first, then existing
+        merged = dict(d_params)
+        merged.update(self.inherited_params)
+        self.inherited_params = merged
+
+    def to_section(self) -> "Section":
         """
-        Parse content based on type_name: 'raw', 'ftml', 'yaml', 'json', 'toml', etc.
-        'container', 'defaults', 'schema' handle separately in Container.
+        Materialize the full Section for this header, carrying over any
+        inherited metadata. Headers from a headers-only scan read their
+        lines from the source on first call.
         """
-        raw = self.raw_content
-        tname = self.type_name.lower().strip()
+        if self._section is None:
+            all_lines = self._all_lines
+            if all_lines is None:
+                all_lines = self._read_lines()
+            section = Section(
+                section_id=self.raw_id,
+                tags=self.raw_tags,
+                paths=self.raw_paths,
+                parameters=self.raw_parameters,
+                type_name=self.raw_type_name,
+                open_line=self.open_line,
+                close_line=self.close_line,
+                is_self_closing=self.is_self_closing,
+                all_lines=all_lines,
+                source_name=self.source_name,
+            )
+            section.inherited_id = self.inherited_id
+            section.inherited_tags = self.inherited_tags
+            section.inherited_paths = self.inherited_paths
+            section.inherited_params = self.inherited_params
+            section.inherited_type = self.inherited_type
+            section.byte_start = self.byte_start
+            section.byte_end = self.byte_end
+            self._section = section
+        return self._section
+
+    def _read_lines(self) -> "_LineWindow":
+        if self._reader is None or self.byte_start is None:
+            raise FlexTagError(f"Section '{self.id}' has no source lines to load from.")
+        text = self._reader(self.byte_start, self.byte_end)
+        return _LineWindow(io.StringIO(text).readlines(), self.open_line)
+
+    def _project(self, keys: tuple) -> Any:
+        return self.to_section()._project(keys)
+
+
+class Section(SectionHeader):
+    """
+    Represents a single bracketed block of content.
+    Type can be 'raw' (default), 'ftml', or any registered parser.
+    """
+
+    def __init__(
+        self,
+        section_id: str,
+        tags: List[str],
+        paths: List[str],
+        parameters: Dict[str, Any],
+        type_name: str,
+        open_line: int,
+        close_line: int,
+        is_self_closing: bool,
+        all_lines: List[str],
+        source_name: str = "",
+    ):
+        super().__init__(
+            section_id,
+            tags,
+            paths,
+            parameters,
+            type_name,
+            open_line,
+            close_line,
+            is_self_closing,
+            source_name=source_name,
+            all_lines=all_lines,
+        )
+        self._parsed_cache = None
+        self._projection_cache: Optional[Dict[tuple, Any]] = None
+        # Supplies already-parsed content (e.g. from a snapshot) on first use.
+        self._content_loader: Optional[Callable[[], Any]] = None
+
+    # SourceStats that counts and times content parsing, with stats=True.
+    _stats: Optional[SourceStats] = None
+
+    # Set by the setters below; the writer copies unchanged sections
+    # from their source text instead of re-rendering them.
+    _header_changed = False
+    _content_changed = False
+
+    def __repr__(self):
+        return f"<Section ID={self.id!r} type={self.type_name!r}>"
+
+    def to_section(self) -> "Section":
+        return self
+
+    # Assigning id, tags, paths, parameters or type_name replaces the
+    # section's own metadata; anything inherited from defaults still applies.
+    @SectionHeader.id.setter
+    def id(self, value: str):
+        self.raw_id = value or ""
+        self._header_changed = True
+
+    @SectionHeader.tags.setter
+    def tags(self, value: List[str]):
+        self.raw_tags = [t for t in value if t not in self.inherited_tags]
+        self._header_changed = True
+
+    @SectionHeader.paths.setter
+    def paths(self, value: List[str]):
+        self.raw_paths = [p for p in value if p not in self.inherited_paths]
+        self._header_changed = True
+
+    @SectionHeader.parameters.setter
+    def parameters(self, value: Dict[str, Any]):
+        inherited = self.inherited_params
+        self.raw_parameters = {
+            k: v for k, v in value.items() if k not in inherited or inherited[k] != v
+        }
+        self._header_changed = True
+
+    @SectionHeader.type_name.setter
+    def type_name(self, value: str):
+        self.raw_type_name = value.strip() if value else "raw"
+        self._header_changed = True
+
+    def to_flextag(self) -> str:
+        """
+        Return this section as FlexTag text. An unchanged section is
+        returned exactly as it appears in its source; otherwise the header
+        is rendered from the section's own metadata and changed content is
+        encoded for the section's type.
+        """
+        out = io.StringIO()
+        writer = _FlexTagWriter(out)
+        writer.write_section(self)
+        writer.flush()
+        return out.getvalue()
+
+    @property
+    def raw_content(self) -> str:
+        if self.is_self_closing:
+            return ""
+        if self.close_line <= self.open_line:
+            return ""
+        raw = "".join(self._all_lines[self.open_line + 1 : self.close_line])
+        if raw.endswith("\n"):
+            return raw[:-1]
+        return raw
+
+    @property
+    def content(self) -> Any:
+        if self._parsed_cache is None:
+            if self._content_loader is not None:
+                self._parsed_cache = self._content_loader()
+                self._content_loader = None
+            else:
+                self._parsed_cache = self._parse_content()
+        return self._parsed_cache
+
+    @content.setter
+    def content(self, value: Any):
+        self._parsed_cache = value
+        self._content_loader = None
+        self._projection_cache = None
+        self._content_changed = True
+
+    def content_value(self, key_path: str, default: Any = None) -> Any:
+        """
+        Return the value at a dotted `key_path` inside the parsed content,
+        e.g. "database.port", or `default` if it does not exist.
+
+        Only the requested key path is extracted where the content type
+        allows it (YAML); other types are parsed in full once and the
+        parsed document is kept as the section's content. Extracted values
+        are cached per section.
+        """
+        value = self._project(tuple(key_path.split(".")) if key_path else ())
+        return default if value is _MISSING else value
+
+    def _project(self, keys: tuple) -> Any:
+        if self._projection_cache is None:
+            self._projection_cache = {}
+        elif keys in self._projection_cache:
+            return self._projection_cache[keys]
+
+        if self._parsed_cache is not None or self._content_loader is not None:
+            value = _walk_key_path(self.content, keys)
+        else:
+            tname = self.type_name.lower().strip()
+            raw = self.raw_content
+            if not raw or tname in ("", "raw", "container"):
+                value = _MISSING
+            elif tname == "yaml":
+                logger.debug("Projecting %r from YAML section ID='%s'.", keys, self.id)
+                try:
+                    with _instrument.span(
+                        "flextag.parse_content", self._span_attributes
+                    ):
+                        if self._stats is None:
+                            value = project_yaml(raw, keys)
+                        else:
+                            self._stats._content_parsed(tname)
+                            with self._stats.phase("content"):
+                                value = project_yaml(raw, keys)
+                except Exception as e:
+                    raise FlexTagSyntaxError(
+                        f"YAML parsing error in section '{self.id}': {e}"
+                    )
+            else:
+                # Decoded in full once; later key paths and .content reuse it.
+                value = _walk_key_path(self.content, keys)
+
+        self._projection_cache[keys] = value
+        return value
+
+    def _parse_content(self) -> Any:
+        with _instrument.span("flextag.parse_content", self._span_attributes):
+            if self._stats is None:
+                return self._decode_content()
+            self._stats._content_parsed(self.type_name)
+            with self._stats.phase("content"):
+                return self._decode_content()
+
+    def _span_attributes(self) -> Dict[str, Any]:
+        return {
+            "flextag.source": self.source_name,
+            "flextag.section_id": self.id,
+            "flextag.content_type": self.type_name.lower().strip() or "raw",
+        }
+
+    def _decode_content(self) -> Any:
+        """
+        Parse content based on type_name: 'raw', 'ftml', 'yaml', 'json', 'toml', etc.
+        'container', 'defaults', 'schema' handle separately in Container.
+        """
+        raw = self.raw_content
+        tname = self.type_name.lower().strip()
 
         # If no content, return empty string
         if not raw:
@@ -1169,13 +2075,13 @@ class Section:
         # Handle different content types
         if tname == "raw" or tname == "":
             # Raw content - return as-is
-            logger.debug(f"Parsing section ID='{self.id}' as raw text.")
+            logger.debug("Parsing section ID='%s' as raw text.", self.id)
             return raw
 
         elif tname == "ftml":
             # Parse with FTML library
             try:
-                logger.debug(f"Parsing section ID='{self.id}' as FTML.")
+                logger.debug("Parsing section ID='%s' as FTML.", self.id)
                 return parse_ftml(raw)
             except Exception as e:
                 raise FlexTagSyntaxError(
@@ -1185,7 +2091,7 @@ class Section:
         elif tname == "yaml":
             # Parse with YAML library
             try:
-                logger.debug(f"Parsing section ID='{self.id}' as YAML.")
+                logger.debug("Parsing section ID='%s' as YAML.", self.id)
                 return parse_yaml(raw)
             except Exception as e:
                 raise FlexTagSyntaxError(
@@ -1195,7 +2101,7 @@ class Section:
         elif tname == "json":
             # Parse with JSON library
             try:
-                logger.debug(f"Parsing section ID='{self.id}' as JSON.")
+                logger.debug("Parsing section ID='%s' as JSON.", self.id)
                 return parse_json(raw)
             except Exception as e:
                 raise FlexTagSyntaxError(
@@ -1205,7 +2111,7 @@ class Section:
         elif tname == "toml":
             # Parse with TOML library
             try:
-                logger.debug(f"Parsing section ID='{self.id}' as TOML.")
+                logger.debug("Parsing section ID='%s' as TOML.", self.id)
                 return parse_toml(raw)
             except Exception as e:
                 raise FlexTagSyntaxError(
@@ -1220,7 +2126,9 @@ class Section:
         # Default: treat unknown types as raw content with a warning
         else:
             logger.warning(
-                f"Unknown content type '{tname}' in section '{self.id}', treating as raw."
+                "Unknown content type '%s' in section '%s', treating as raw.",
+                tname,
+                self.id,
             )
             return raw
 
@@ -1235,7 +2143,12 @@ class Container:
     All other sections: user sections.
     """
 
-    def __init__(self, sections: List[Section], source_name: str):
+    def __init__(
+        self,
+        sections: List[Section],
+        source_name: str,
+        stats: Optional[SourceStats] = None,
+    ):
         self.source_name = source_name
         self.raw_sections = sections[:]
         self.sections: List[Section] = []
@@ -1264,11 +2177,232 @@ class Container:
         if self.container_metadata:
             self._extract_container_metadata()
         if self.defaults:
-            self._apply_defaults()
+            with _phase(stats, "defaults"):
+                self._apply_defaults()
 
         if self.schema:
             # Parse schema
-            self._parse_schema()
+            with _phase(stats, "schema"):
+                self._parse_schema()
+
+    # The source lines shared by the sections, set for containers parsed
+    # from a whole file or string; apply_edit() edits them in place.
+    _lines: Optional[List[str]] = None
+
+    def apply_edit(
+        self,
+        start: tuple,
+        end: tuple,
+        new_text: str,
+        validate: bool = True,
+    ) -> List[Section]:
+        """
+        Replace the text between the (line, column) positions `start` and
+        `end` with `new_text` and update the sections to match. Returns the
+        sections that were (re-)parsed.
+
+        Only the region from the first section touching the edit is
+        re-scanned, up to the first later section whose header is found
+        where it was before; later sections are kept and, if the edit
+        changed the line count, shifted. Parsed content is dropped only for
+        re-parsed sections. Container metadata, defaults and the schema are
+        re-applied, and the container re-validated, only when a head section
+        is among the re-parsed ones.
+
+        If the edited text fails to parse, FlexTagSyntaxError is raised and
+        the container is left unchanged.
+        """
+        lines = self._lines
+        if lines is None:
+            raise FlexTagError(
+                f"{self.source_name} was not parsed from a whole file or string "
+                "and cannot be edited"
+            )
+        (l1, c1), (l2, c2) = start, end
+        if not (0 <= l1 <= l2 <= len(lines)) or (l1 == l2 and c1 > c2):
+            raise FlexTagError(f"Invalid edit range {start}-{end}")
+        if l2 == len(lines) and lines and not lines[-1].endswith(("\n", "\r")):
+            raise FlexTagError(f"Line {l2} is past the end of the text")
+        for line_no, col in (start, end):
+            width = len(lines[line_no].rstrip("\r\n")) if line_no < len(lines) else 0
+            if not 0 <= col <= width:
+                raise FlexTagError(f"Column {col} is outside line {line_no}")
+
+        old_chunk = lines[l1 : l2 + 1]
+        head = old_chunk[0][:c1] if old_chunk else ""
+        tail = old_chunk[-1][c2:] if l2 < len(lines) else ""
+        new_chunk = (head + new_text + tail).splitlines(keepends=True)
+        # Lines the edit leaves as they were (e.g. the line an insertion at
+        # column 0 pushes down) do not count as edited.
+        same = 0
+        while same < min(len(old_chunk), len(new_chunk)) and (
+            old_chunk[-1 - same] == new_chunk[-1 - same]
+        ):
+            same += 1
+        if same:
+            old_chunk, new_chunk = old_chunk[:-same], new_chunk[:-same]
+        same = 0
+        while same < min(len(old_chunk), len(new_chunk)) and (
+            old_chunk[same] == new_chunk[same]
+        ):
+            same += 1
+        old_chunk, new_chunk = old_chunk[same:], new_chunk[same:]
+        l1 += same
+        delta = len(new_chunk) - len(old_chunk)
+        old_end = l1 + len(old_chunk) - 1
+        new_end = l1 + len(new_chunk) - 1
+        lines[l1 : old_end + 1] = new_chunk
+
+        raw = self.raw_sections
+        # The scan restarts in the gap before the first section that ends
+        # at or after the edit.
+        first = self._section_index_at(l1)
+        scan_from = raw[first - 1].close_line + 1 if first else 0
+
+        parser = FlexParser()
+        records = []
+        resume = len(raw)
+        j = first
+        try:
+            for rs in parser.iter_bracket_sections(
+                lines, self.source_name, collect_content=False, start=scan_from
+            ):
+                if rs["open_line"] > new_end:
+                    # Past the edit: stop at a section that is where it was.
+                    while j < len(raw) and raw[j].open_line + delta < rs["open_line"]:
+                        j += 1
+                    if (
+                        j < len(raw)
+                        and raw[j].open_line > old_end
+                        and raw[j].open_line + delta == rs["open_line"]
+                        and raw[j].close_line + delta == rs["close_line"]
+                    ):
+                        resume = j
+                        break
+                records.append(rs)
+        except FlexTagError:
+            lines[l1 : new_end + 1] = old_chunk
+            raise
+
+        new_secs = [
+            FlexTag._make_section(rs, lines, self.source_name) for rs in records
+        ]
+        replaced = raw[first:resume]
+        if delta:
+            for sec in itertools.islice(raw, resume, None):
+                sec.open_line += delta
+                sec.close_line += delta
+
+        if any(
+            sec.type_name.lower() in HEAD_SECTION_TYPES for sec in replaced + new_secs
+        ):
+            try:
+                self._reload_head(raw[:first] + new_secs + raw[resume:], validate)
+            except FlexTagError:
+                if delta:
+                    for sec in itertools.islice(raw, resume, None):
+                        sec.open_line -= delta
+                        sec.close_line -= delta
+                lines[l1 : new_end + 1] = old_chunk
+                self._reload_head(raw, validate=False)
+                raise
+        else:
+            self._replace_user_sections(first, len(replaced), new_secs, scan_from)
+            raw[first:resume] = new_secs
+        return new_secs
+
+    def _index_items(self) -> List[Section]:
+        """The items a view indexes for this container: its user sections."""
+        return self.sections
+
+    def _section_index_at(self, line: int) -> int:
+        """Index of the first raw section ending at or after `line`."""
+        raw = self.raw_sections
+        lo, hi = 0, len(raw)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if raw[mid].close_line < line:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def section_at(self, line: int) -> Optional[Section]:
+        """The section (head sections included) spanning 0-based `line`."""
+        i = self._section_index_at(line)
+        if i < len(self.raw_sections) and self.raw_sections[i].open_line <= line:
+            return self.raw_sections[i]
+        return None
+
+    def _replace_user_sections(
+        self, first: int, count: int, new_secs: List[Section], scan_from: int
+    ):
+        """
+        Splice the user sections `new_secs` in for the `count` user sections
+        at raw_sections[first:] (which the caller then replaces), applying
+        defaults to them. Head sections before `scan_from` are not touched.
+        """
+        heads = [s for s in (self.container_metadata, self.defaults, self.schema) if s]
+        if len(self.raw_sections) - len(self.sections) == len(heads):
+            pos = first - sum(1 for h in heads if h.open_line < scan_from)
+            self.sections[pos : pos + count] = new_secs
+        else:
+            # Repeated head sections; rebuild the list instead.
+            raw = (
+                self.raw_sections[:first]
+                + new_secs
+                + self.raw_sections[first + count :]
+            )
+            self.sections = [
+                s for s in raw if s.type_name.lower() not in HEAD_SECTION_TYPES
+            ]
+        if self.defaults and new_secs:
+            d_meta = self.__dict__.get("_defaults_meta")
+            if d_meta is None:
+                d_meta = self._defaults_meta = _parse_defaults_block(self.defaults)
+            if any(d_meta):
+                for s in new_secs:
+                    s.inherit_defaults(*d_meta)
+
+    def _reload_head(self, raw_sections: List[Section], validate: bool):
+        """
+        Rebuild container metadata, defaults and schema from `raw_sections`
+        after a head section changed. Nothing is replaced unless the new
+        head sections parse (and, with `validate`, the schema holds).
+        """
+        for s in raw_sections:
+            s.inherited_id = None
+            s.inherited_tags = []
+            s.inherited_paths = []
+            s.inherited_params = {}
+            s.inherited_type = None
+            s._parsed_cache = None
+            s._projection_cache = None
+        fresh = Container(raw_sections, self.source_name)
+        if validate:
+            fresh.validate_schema()
+        fresh._lines = self._lines
+        self.__dict__ = fresh.__dict__
+
+    def _subset(self, sections: List[Section]) -> "Container":
+        """
+        Build a container holding only `sections` (user sections of this
+        container), preserving this container's head sections and metadata.
+        """
+        new_c = Container.__new__(Container)
+        new_c.source_name = self.source_name
+        new_c.raw_sections = sections[:]
+        new_c.sections = sections[:]
+        new_c.container_metadata = self.container_metadata
+        new_c.defaults = self.defaults
+        new_c.schema = self.schema
+        new_c.schema_rules = []
+        new_c.ftml_schema = {}
+        new_c.id = self.id
+        new_c.tags = self.tags.copy()
+        new_c.paths = self.paths.copy()
+        new_c.parameters = self.parameters.copy()
+        return new_c
 
     def _extract_container_metadata(self):
         """
@@ -1307,38 +2441,34 @@ class Container:
         logger.debug("Applying bracket-based default metadata.")
 
         d_id, d_tags, d_paths, d_params = _parse_defaults_block(self.defaults)
-        logger.debug(f"Default tags: {d_tags}")
-        logger.debug(f"Default paths: {d_paths}")
+        logger.debug("Default tags: %s", d_tags)
+        logger.debug("Default paths: %s", d_paths)
 
         if not (d_id or d_tags or d_paths or d_params):
             logger.debug("No bracket block found in defaults. Skipping.")
             return
 
         # Merge these defaults into all user sections
+        debug = logger.isEnabledFor(logging.DEBUG)
         for s in self.sections:
-            logger.debug(
-                f"Section before: id={s.id}, tags={s.tags}, inherited_tags={s.inherited_tags}"
-            )
-
-            if d_id and not s.inherited_id:
-                s.inherited_id = d_id
-
-            # Add default tags to inherited_tags
-            s.inherited_tags = list(s.inherited_tags)  # Make a copy
-            s.inherited_tags.extend(d_tags)  # Add all default tags
-
-            # Add default paths to inherited_paths
-            s.inherited_paths = list(s.inherited_paths)  # Make a copy
-            s.inherited_paths.extend(d_paths)  # Add all default paths
-
-            # Merge params: defaults first, then existing
-            merged = dict(d_params)
-            merged.update(s.inherited_params)
-            s.inherited_params = merged
-
-            logger.debug(
-                f"Section after: id={s.id}, tags={s.tags}, inherited_tags={s.inherited_tags}, paths={s.paths}, inherited_paths={s.inherited_paths}"
-            )
+            if debug:
+                logger.debug(
+                    "Section before: id=%s, tags=%s, inherited_tags=%s",
+                    s.id,
+                    s.tags,
+                    s.inherited_tags,
+                )
+            s.inherit_defaults(d_id, d_tags, d_paths, d_params)
+            if debug:
+                logger.debug(
+                    "Section after: id=%s, tags=%s, inherited_tags=%s, "
+                    "paths=%s, inherited_paths=%s",
+                    s.id,
+                    s.tags,
+                    s.inherited_tags,
+                    s.paths,
+                    s.inherited_paths,
+                )
 
     def _parse_schema(self):
         """
@@ -1417,7 +2547,7 @@ class Container:
             match = re.search(r"\[(.*?)\]:\s*ftml", block_content)
             if match:
                 section_id = match.group(1).strip()
-                logger.debug(f"Found FTML schema section with ID: {section_id}")
+                logger.debug("Found FTML schema section with ID: %s", section_id)
 
                 # Extract the FTML schema content
                 content_lines = block_content.splitlines()
@@ -1449,7 +2579,7 @@ class Container:
 
                         break
         except Exception as e:
-            logger.error(f"Error parsing FTML schema block: {str(e)}")
+            logger.error("Error parsing FTML schema block: %s", e)
             # Continue with other schema processing
 
     def _parse_traditional_schema_block(self, block_content: str):
@@ -1466,7 +2596,7 @@ class Container:
             rules = parser.parse_schema_block(lines)
             self.schema_rules.extend(rules)
         except Exception as e:
-            logger.error(f"Error parsing traditional schema block: {str(e)}")
+            logger.error("Error parsing traditional schema block: %s", e)
 
     def _parse_extended_schema(self):
         """
@@ -1482,7 +2612,7 @@ class Container:
         Reuse from old logic: parse line into (id, tags, paths, params).
         Updated to handle @ prefix for paths.
         """
-        tokens = shlex.split(line)
+        tokens = split_header_tokens(line)
         if not tokens:
             return "", [], [], {}
 
@@ -1512,8 +2642,10 @@ class Container:
             elif t.startswith("."):
                 # Deprecated path syntax
                 logger.warning(
-                    f"Deprecated path syntax '.{t[1:]}' used in container metadata. "
-                    f"Please use '@{t[1:]}' instead."
+                    "Deprecated path syntax '.%s' used in container metadata. "
+                    "Please use '@%s' instead.",
+                    t[1:],
+                    t[1:],
                 )
                 # Convert to new syntax internally
                 paths.append("@" + t[1:])
@@ -1528,27 +2660,41 @@ class Container:
 
         return section_id, tags, paths, params
 
-    def validate_schema(self):
+    def validate_schema(
+        self, structure: bool = True, sections: Optional[List[Section]] = None
+    ):
         """
         Apply schema rules to self.sections.
 
         This method handles both traditional schema rules and FTML schema validation.
+        With structure=False, section order/repetition rules are skipped and
+        only per-section FTML content validation runs (used when only some
+        sections were loaded). `sections` limits FTML content validation to
+        the given sections (e.g. the ones an edit re-parsed).
         """
         if not self.schema:
             logger.debug("No schema present. Skipping validation.")
             return
 
-        # Process traditional schema rules first
-        if self.schema_rules:
-            logger.debug(
-                f"Validating with {len(self.schema_rules)} traditional schema rules."
-            )
-            self._validate_traditional_schema()
+        with _instrument.span(
+            "flextag.validate_schema",
+            lambda: {
+                "flextag.source": self.source_name,
+                "flextag.sections": len(self.sections),
+            },
+        ):
+            # Process traditional schema rules first
+            if structure and self.schema_rules:
+                logger.debug(
+                    "Validating with %s traditional schema rules.",
+                    len(self.schema_rules),
+                )
+                self._validate_traditional_schema()
 
-        # Process FTML schema validation
-        if self.ftml_schema:
-            logger.debug(f"Validating with {len(self.ftml_schema)} FTML schemas.")
-            self._validate_ftml_schema()
+            # Process FTML schema validation
+            if self.ftml_schema:
+                logger.debug("Validating with %s FTML schemas.", len(self.ftml_schema))
+                self._validate_ftml_schema(sections)
 
     def _validate_traditional_schema(self):
         """
@@ -1624,26 +2770,30 @@ class Container:
                 f"Unexpected section '{leftover_id}' with no corresponding schema rule."
             )
 
-    def _validate_ftml_schema(self):
+    def _validate_ftml_schema(self, sections: Optional[List[Section]] = None):
         """
         Validate content of FTML sections against their respective schemas.
         """
+        if sections is None:
+            sections = self.sections
         for schema_id, schema_content in self.ftml_schema.items():
             # Find matching sections
             matching_sections = [
-                s for s in self.sections if s.id.lower() == schema_id.lower()
+                s for s in sections if s.id.lower() == schema_id.lower()
             ]
 
             if not matching_sections:
-                logger.debug(f"No sections found matching schema ID: {schema_id}")
+                logger.debug("No sections found matching schema ID: %s", schema_id)
                 continue
 
             # Validate each matching section
             for section in matching_sections:
                 if section.type_name.lower() != "ftml":
                     logger.warning(
-                        f"Section '{section.id}' has type '{section.type_name}' but schema expects 'ftml'. "
-                        f"Skipping validation."
+                        "Section '%s' has type '%s' but schema expects 'ftml'. "
+                        "Skipping validation.",
+                        section.id,
+                        section.type_name,
                     )
                     continue
 
@@ -1659,7 +2809,7 @@ class Container:
                         )
 
                     logger.debug(
-                        f"FTML validation successful for section '{section.id}'"
+                        "FTML validation successful for section '%s'", section.id
                     )
                 except Exception as e:
                     if isinstance(e, SchemaValidationError):
@@ -1711,6 +2861,160 @@ class Container:
                 )
 
 
+##############################################################################
+# LAZY CONTAINERS
+##############################################################################
+
+
+class _ContainerCache:
+    """LRU of the Containers parsed for the lazy sources of one load."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(maxsize, 1)
+        self._items: "collections.OrderedDict[LazyContainer, Container]" = (
+            collections.OrderedDict()
+        )
+
+    def __contains__(self, lazy: "LazyContainer") -> bool:
+        return lazy in self._items
+
+    def get(self, lazy: "LazyContainer") -> Container:
+        container = self._items.get(lazy)
+        stats = lazy._stats
+        if container is not None:
+            self._items.move_to_end(lazy)
+            if stats is not None:
+                stats.container_cache_hits += 1
+            return container
+        if stats is not None:
+            stats.container_cache_misses += 1
+        container = lazy._parse()
+        self._items[lazy] = container
+        while len(self._items) > self.maxsize:
+            evicted, _ = self._items.popitem(last=False)
+            logger.debug("Evicted parsed container %s", evicted.source_name)
+        return container
+
+
+class LazyContainer:
+    """
+    A file source of a view loaded with lazy=True. Only its container
+    metadata (id, tags, paths, parameters) and, once a query needs them,
+    its section headers are kept; any other attribute parses the file into
+    a Container on first access and is forwarded to it.
+
+    Parsed containers are held in an LRU shared by the view (`cache_size`
+    in load()), so only the most recently used stay resident; an evicted
+    source is parsed again when next touched. Schema validation runs on
+    each parse.
+    """
+
+    def __init__(
+        self,
+        source: "Source",
+        flextag: "FlexTag",
+        cache: _ContainerCache,
+        validate: bool = True,
+        headers: Optional[List[SectionHeader]] = None,
+        metadata: Optional[tuple] = None,
+        stats: Optional[SourceStats] = None,
+    ):
+        self.source = source
+        self.source_name = source.name
+        self._flextag = flextag
+        self._cache = cache
+        self._validate = validate
+        # User section headers (from a catalog or a headers-only scan) and
+        # (id, tags, paths, parameters) of the container section.
+        self._headers = headers
+        self._metadata = metadata
+        self._stats = stats
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<LazyContainer {self.source_name!r} ({state})>"
+
+    def __getattr__(self, name: str):
+        # Only reached for attributes this class does not define.
+        if name.startswith("__") or "_cache" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    @property
+    def is_loaded(self) -> bool:
+        """True while the parsed container is held in the LRU."""
+        return self in self._cache
+
+    def load(self) -> Container:
+        """The parsed Container, from the LRU or parsed now."""
+        return self._cache.get(self)
+
+    def _parse(self) -> Container:
+        logger.debug("Parsing lazy source %s", self.source_name)
+        stats = self._stats
+        container = self._flextag._parse_source(
+            self.source, self.source_name, stats=stats
+        )
+        if self._validate:
+            with _phase(stats, "validate"):
+                container.validate_schema()
+        return container
+
+    def _index_items(self) -> List[SectionHeader]:
+        stats = self._stats
+        if self._headers is None:
+            if stats is not None:
+                stats.header_cache_misses += 1
+            with _phase(stats, "scan"):
+                headers = self._flextag._scan_source(self.source)
+            self._headers = [
+                h for h in headers if h.type_name.lower() not in HEAD_SECTION_TYPES
+            ]
+        elif stats is not None:
+            stats.header_cache_hits += 1
+        return self._headers
+
+    def _head(self) -> tuple:
+        if self._metadata is None:
+            flextag = self._flextag
+            line_iter = self.source.iter_lines(flextag.settings.encoding)
+            lines = flextag._read_first_section(line_iter)
+            line_iter.close()
+            first = next(
+                flextag._parser.iter_bracket_sections(lines, self.source_name), None
+            )
+            self._metadata = ("", [], [], {})
+            if first is not None and first["type_decl"].strip().lower() == "container":
+                head = Container(
+                    [flextag._make_section(first, lines, self.source_name)],
+                    self.source_name,
+                )
+                self._metadata = (head.id, head.tags, head.paths, head.parameters)
+        return self._metadata
+
+    @property
+    def id(self) -> str:
+        return self._head()[0]
+
+    @property
+    def tags(self) -> List[str]:
+        return self._head()[1]
+
+    @property
+    def paths(self) -> List[str]:
+        return self._head()[2]
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return self._head()[3]
+
+    def apply_edit(self, *args, **kwargs):
+        raise FlexTagError(
+            f"{self.source_name} is loaded lazily and may be evicted; "
+            "load it without lazy=True to edit it"
+        )
+
+
 ##############################################################################
 # COLLECTION CLASSES
 ##############################################################################
@@ -1820,280 +3124,1377 @@ class FlexMap(dict):
 
 
 ##############################################################################
-# FLEX VIEW
+# QUERY LANGUAGE
 ##############################################################################
 
 
-class FlexView:
+def _unquote(text: str) -> str:
+    """Strip one pair of matching surrounding quotes, if present."""
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    return text
+
+
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+_BYTE_BITS = [tuple(i for i in range(8) if b >> i & 1) for b in range(256)]
+
+
+class IntBitmaps:
     """
-    Top-level container for multiple Container objects.
-    You can filter or convert to a FlexMap, etc.
+    Bitmap backend using Python integers: bit `i` set means item `i`.
+    AND/OR/ANDNOT run in C over machine words and popcount is
+    `int.bit_count`, so no third-party dependency is needed.
     """
 
-    def __init__(self, containers: List[Container]):
-        self._containers = containers
-        self._raw_sections: List[Section] = []
-        self._user_sections: List[Section] = []
+    name = "int"
 
-        for c in containers:
-            self._raw_sections.extend(c.raw_sections)
-            self._user_sections.extend(c.sections)
+    def __init__(self, size: int):
+        self.size = size
 
-    @property
-    def containers(self) -> ContainerCollection:
-        return ContainerCollection(self._containers)
+    def empty(self) -> int:
+        return 0
 
-    @property
-    def sections(self) -> SectionCollection:
-        return SectionCollection(self._user_sections)
+    def full(self) -> int:
+        return (1 << self.size) - 1
 
-    @property
-    def raw_sections(self) -> SectionCollection:
-        return SectionCollection(self._raw_sections)
+    def from_positions(self, positions) -> int:
+        """Build a bitmap from ascending positions."""
+        if not len(positions):
+            return 0
+        buf = bytearray((positions[-1] >> 3) + 1)
+        for p in positions:
+            buf[p >> 3] |= 1 << (p & 7)
+        return int.from_bytes(buf, "little")
 
-    def filter(self, query: str, target: str = "sections") -> "FlexView":
-        """
-        Provide a param/tag-based filter for sections or containers.
-        """
-        logger.debug(f"Filtering with query='{query}', target='{target}'.")
-        or_split = re.compile(r"\s+(?i:OR)\s+")
-        parts = or_split.split(query.strip())
-        ast = []
-        for p in parts:
-            tokens = p.split()
-            if tokens:
-                ast.append(tokens)
-
-        if target.lower() == "sections":
-            matched_secs = []
-            for s in self._raw_sections:
-                if self._match_section(s, ast):
-                    matched_secs.append(s)
-            new_conts = []
-            for c in self._containers:
-                sub_secs = [sec for sec in c.sections if sec in matched_secs]
-                if sub_secs:
-                    new_c = Container(sub_secs, c.source_name)
-                    # preserve container's special sections
-                    new_c.container_metadata = c.container_metadata
-                    new_c.defaults = c.defaults
-                    new_c.schema = c.schema
-                    new_c.id = c.id
-                    new_c.tags = c.tags.copy()
-                    new_c.paths = c.paths.copy()
-                    new_c.parameters = c.parameters.copy()
-                    new_conts.append(new_c)
-            return FlexView(new_conts)
-
-        elif target.lower() == "containers":
-            matched_conts = []
-            for c in self._containers:
-                # For debugging
-                logger.debug(
-                    f"Container ID: {c.id}, Tags: {c.tags}, Params: {c.parameters}"
-                )
+    def from_range(self, start: int, end: int) -> int:
+        return ((1 << (end - start)) - 1) << start
 
-                for subexpr in ast:  # OR
-                    all_tokens_match = True
-                    for tok in subexpr:  # AND
-                        if not self._match_container_token(tok, c):
-                            all_tokens_match = False
-                            break
+    def and_(self, a: int, b: int) -> int:
+        return a & b
 
-                    if all_tokens_match:
-                        matched_conts.append(c)
-                        break
+    def or_(self, a: int, b: int) -> int:
+        return a | b
 
-            return FlexView(matched_conts)
+    def andnot(self, a: int, b: int) -> int:
+        return a & ~b
 
-        else:
-            logger.warning(f"Unknown filter target={target}, ignoring filter")
-            return self
+    def any(self, a: int) -> bool:
+        return a != 0
 
-    def _match_container_token(self, token: str, container) -> bool:
-        """
-        Match a single token against container metadata.
-        Handles tags (#tag), paths (@path), parameter expressions, and ID matching.
-        """
-        neg = False
-        if token.startswith("!"):
-            neg = True
-            token = token[1:].strip()
+    def equal(self, a: int, b: int) -> bool:
+        return a == b
 
-        matched = False
+    def popcount(self, a: int) -> int:
+        return a.bit_count()
 
-        # Handle tag match (#tag)
-        if token.startswith("#"):
-            tag_pattern = token[1:]  # Remove '#'
-            for tag in container.tags:
-                tag_value = tag[1:] if tag.startswith("#") else tag
-                if tag_value == tag_pattern:
-                    matched = True
-                    break
+    def positions(self, a: int):
+        """Yield the set positions of `a`, lowest first."""
+        if not a:
+            return
+        data = a.to_bytes((a.bit_length() + 7) >> 3, "little")
+        # Zero bytes are skipped by the regex engine, so the first hits
+        # are found without walking the whole bitmap in Python.
+        for m in _NONZERO_BYTE.finditer(data):
+            base = m.start() << 3
+            for bit in _BYTE_BITS[data[base >> 3]]:
+                yield base + bit
 
-        # Handle path match (@path or .path)
-        elif token.startswith("@") or token.startswith("."):
-            path_pattern = token[1:]  # Remove @ or .
-            for path in container.paths:
-                path_value = (
-                    path[1:] if path.startswith("@") or path.startswith(".") else path
-                )
-                if path_value == path_pattern:
-                    matched = True
-                    break
 
-        # Handle parameter expression (key=value, key>=value, etc.)
-        elif OP_PATTERN.match(token):
-            m = OP_PATTERN.match(token)
-            key, op, rhs_str = (
-                m.group(1).strip(),
-                m.group(2).strip(),
-                m.group(3).strip(),
-            )
+class NumpyBitmaps:
+    """
+    Bitmap backend using NumPy packed uint64 arrays. Used for very large
+    views, where vectorized AND/OR/ANDNOT and popcount over packed words
+    avoid allocating a new Python integer for every intermediate result.
+    """
 
-            # Debug output
-            logger.debug(
-                f"Parameter expression: key='{key}', op='{op}', rhs_str='{rhs_str}'"
-            )
+    name = "numpy"
 
-            if key in container.parameters:
-                lhs_val = container.parameters[key]
+    def __init__(self, size: int):
+        if np is None:
+            raise FlexTagError("NumPy not installed. Install with: pip install numpy")
+        self.size = size
+        self._words = (size + 63) >> 6
 
-                # Handle quoted strings specially - remove quotes if present
-                if (
-                    rhs_str.startswith('"')
-                    and rhs_str.endswith('"')
-                    and len(rhs_str) >= 2
-                ):
-                    rhs_str = rhs_str[1:-1]  # Remove surrounding quotes
+    def empty(self):
+        return np.zeros(self._words, dtype=np.uint64)
 
-                # Convert to appropriate type
-                rhs_val = parse_basic_value(rhs_str)
+    def full(self):
+        bits = np.zeros(self._words * 64, dtype=bool)
+        bits[: self.size] = True
+        return np.packbits(bits, bitorder="little").view(np.uint64)
 
-                logger.debug(f"Comparing: '{lhs_val}' {op} '{rhs_val}'")
-                matched = compare_op(lhs_val, rhs_val, op)
-                logger.debug(f"Match result: {matched}")
-            else:
-                logger.debug(
-                    f"Parameter '{key}' not found in container with params: {container.parameters}"
-                )
+    def from_positions(self, positions):
+        bits = np.zeros(self._words * 64, dtype=bool)
+        if len(positions):
+            bits[np.asarray(positions, dtype=np.int64)] = True
+        return np.packbits(bits, bitorder="little").view(np.uint64)
 
-        # Handle ID match
-        else:
-            matched = token == container.id
+    def from_range(self, start: int, end: int):
+        bits = np.zeros(self._words * 64, dtype=bool)
+        bits[start:end] = True
+        return np.packbits(bits, bitorder="little").view(np.uint64)
 
-        return (not matched) if neg else matched
+    def and_(self, a, b):
+        return np.bitwise_and(a, b)
 
-    def _match_section(self, sec, ast_list):
-        for subexpr in ast_list:  # OR
-            if all(self._match_token(tok, sec) for tok in subexpr):  # AND
-                return True
-        return False
+    def or_(self, a, b):
+        return np.bitwise_or(a, b)
 
-    def _match_token(self, token: str, sec: Section) -> bool:
-        neg = False
-        if token.startswith("!"):
-            neg = True
-            token = token[1:].strip()
-        matched = self._match_token_core(token, sec)
-        return (not matched) if neg else matched
-
-    def _match_token_core(self, token: str, sec: Section) -> bool:
-        # If token starts with '#', match tag
-        if token.startswith("#"):
-            pat = token[1:]
-            return any((t[1:] if t.startswith("#") else t) == pat for t in sec.tags)
-
-        # If token starts with '@', match path
-        if token.startswith("@"):
-            pat = token[1:]
-            # Check for path matching (exact or hierarchical)
-            for p in sec.paths:
-                if p.startswith("@"):
-                    p_val = p[1:]  # Remove @ prefix
-                    # Match if path equals pattern or starts with pattern followed by .
-                    if p_val == pat or p_val.startswith(pat + "."):
-                        return True
-            return False
+    def andnot(self, a, b):
+        return np.bitwise_and(a, np.invert(b))
 
-        # If token starts with '.', match path (legacy)
-        if token.startswith("."):
-            pat = token[1:]
-            # Check for path matching (exact or hierarchical)
-            for p in sec.paths:
-                if p.startswith("@") or p.startswith("."):
-                    p_val = p[1:]  # Remove prefix
-                    # Match if path equals pattern or starts with pattern followed by .
-                    if p_val == pat or p_val.startswith(pat + "."):
-                        return True
-            return False
+    def any(self, a) -> bool:
+        return bool(a.any())
 
-        # If param expression
-        m = OP_PATTERN.match(token)
-        if m:
-            key, op, rhs_str = (
-                m.group(1).strip(),
-                m.group(2).strip(),
-                m.group(3).strip(),
-            )
-            if key not in sec.parameters:
-                return False
-            lhs_val = sec.parameters[key]
-            rhs_val = parse_basic_value(rhs_str)
-            return compare_op(lhs_val, rhs_val, op)
+    def equal(self, a, b) -> bool:
+        return bool(np.array_equal(a, b))
 
-        # else match by ID
-        return token == sec.id
+    def popcount(self, a) -> int:
+        return int(np.bitwise_count(a).sum())
 
-    def to_dict(self) -> dict:
-        """
-        Returns a Python dictionary representing this FlexView's sections
-        in a simpler two-pass approach, ensuring repeated FTML lists
-        remain separate in a list-of-lists.
+    def positions(self, a):
+        bits = np.unpackbits(a.view(np.uint8), bitorder="little")
+        return iter(np.flatnonzero(bits).tolist())
 
-        Rules:
-          1. Sections with no ID => data[""] is the content directly if there's only one,
-             or a list of contents if there are multiple.
-             (raw => string, ftml => parsed object)
-          2. Sections with an ID => data[id], or nested if using dot notation.
-             If repeated, becomes a list of objects; if single occurrence, just that object.
-             - raw => {"__raw": "..."}
-             - ftml => the parsed FTML (list/dict/scalar)
-        """
 
-        # -----------------------------------------------------------------------
-        # PASS 1: Collect all sections by ID in a dictionary of lists.
-        #         This lets us see if an ID was repeated.
-        # -----------------------------------------------------------------------
-        collected = collections.defaultdict(list)
+BITMAP_BACKENDS = {"int": IntBitmaps, "numpy": NumpyBitmaps}
 
-        for sec in self._raw_sections:
-            stype = sec.type_name.lower()
-            # Skip head sections
-            if stype in ("container", "defaults", "schema"):
-                continue
 
-            # Build the object to store
-            if stype == "raw":
-                if sec.id == "":
-                    # anonymous raw => raw string
-                    item = sec.content
-                else:
-                    # raw with ID => {"__raw": "..."}
-                    item = {"__raw": sec.content}
-            elif stype in ("ftml", "yaml", "json", "toml"):
-                # parsed result can be list/dict/scalar
-                item = sec.content
-            else:
-                # fallback => raw content
-                item = sec.raw_content
+class MetadataIndex:
+    """
+    Bitmap index over the metadata of a list of items (sections or
+    containers). Bit `i` of every bitmap refers to `items[i]`.
 
-            # Append the item to the list for this ID
-            collected[sec.id].append(item)
+    With `hierarchical_paths=True` (sections), a path like "@app.backend"
+    is also indexed under "app", so "@app" matches it.
 
-        # -----------------------------------------------------------------------
-        # PASS 2: Build the final nested structure.
-        #         - If an ID is repeated => store a list of items.
+    Postings are stored compactly: keys set on more than 1/32 of the items
+    are kept as bitmaps, sparser keys as 32-bit position arrays that are
+    turned into bitmaps (and cached) only when a query touches them.
+    """
+
+    def __init__(
+        self,
+        items: List[Any],
+        hierarchical_paths: bool = True,
+        backend: str = "int",
+    ):
+        if backend not in BITMAP_BACKENDS:
+            raise FlexTagError(f"Unknown index backend '{backend}'")
+        self.items = items
+        self.size = len(items)
+        self.bits = BITMAP_BACKENDS[backend](self.size)
+        self.universe = self.bits.full()
+        self.hierarchical_paths = hierarchical_paths
+
+        def postings():
+            return collections.defaultdict(lambda: array("I"))
+
+        tags = postings()
+        paths = postings()
+        ids = postings()
+        params = collections.defaultdict(postings)
+
+        for pos, item in enumerate(items):
+            for t in set(item.tags):
+                tags[t[1:] if t.startswith("#") else t].append(pos)
+            keys = set()
+            for p in item.paths:
+                p_val = p[1:] if p.startswith("@") or p.startswith(".") else p
+                keys.add(p_val)
+                if hierarchical_paths:
+                    while "." in p_val:
+                        p_val = p_val.rsplit(".", 1)[0]
+                        keys.add(p_val)
+            for k in keys:
+                paths[k].append(pos)
+            ids[item.id].append(pos)
+            for k, v in item.parameters.items():
+                params[k][v].append(pos)
+
+        self._postings = {
+            "tag": self._compact(tags),
+            "path": self._compact(paths),
+            "id": self._compact(ids),
+        }
+        self._param_postings = {k: self._compact(v) for k, v in params.items()}
+        self._param_bits: Dict[str, Dict[Any, Any]] = {}
+
+    def _compact(self, postings: Dict[Any, array]) -> Dict[Any, Any]:
+        dense = max(self.size >> 5, 1)
+        return {
+            k: self.bits.from_positions(p) if len(p) > dense else p
+            for k, p in postings.items()
+        }
+
+    def _lookup(self, kind: str, name: str):
+        table = self._postings[kind]
+        entry = table.get(name)
+        if entry is None:
+            return self.bits.empty()
+        if isinstance(entry, array):
+            entry = self.bits.from_positions(entry)
+            table[name] = entry
+        return entry
+
+    def tag(self, name: str):
+        return self._lookup("tag", name)
+
+    def path(self, name: str):
+        return self._lookup("path", name)
+
+    def ident(self, name: str):
+        return self._lookup("id", name)
+
+    def param_values(self, key: str) -> Dict[Any, Any]:
+        values = self._param_bits.get(key)
+        if values is None:
+            values = {
+                v: self.bits.from_positions(p) if isinstance(p, array) else p
+                for v, p in self._param_postings.get(key, {}).items()
+            }
+            self._param_bits[key] = values
+        return values
+
+    def export_postings(self) -> Dict[str, Any]:
+        """
+        Plain-data copy of the index (postings as position-array bytes),
+        for snapshots. Restore with `from_postings`.
+        """
+
+        def plain(entry):
+            if not isinstance(entry, array):
+                entry = array("I", self.bits.positions(entry))
+            return entry.tobytes()
+
+        return {
+            "size": self.size,
+            "hierarchical_paths": self.hierarchical_paths,
+            "postings": {
+                kind: {k: plain(v) for k, v in table.items()}
+                for kind, table in self._postings.items()
+            },
+            "params": {
+                key: {v: plain(p) for v, p in values.items()}
+                for key, values in self._param_postings.items()
+            },
+        }
+
+    @classmethod
+    def from_postings(
+        cls, items: List[Any], data: Dict[str, Any], backend: str = "int"
+    ) -> "MetadataIndex":
+        """Rebuild an index over `items` from `export_postings` output."""
+        if backend not in BITMAP_BACKENDS:
+            raise FlexTagError(f"Unknown index backend '{backend}'")
+        if data["size"] != len(items):
+            raise FlexTagError("Index does not match the number of items")
+
+        def positions(raw):
+            entry = array("I")
+            entry.frombytes(raw)
+            return entry
+
+        index = cls.__new__(cls)
+        index.items = items
+        index.size = len(items)
+        index.bits = BITMAP_BACKENDS[backend](index.size)
+        index.universe = index.bits.full()
+        index.hierarchical_paths = data["hierarchical_paths"]
+        index._postings = {
+            kind: {k: positions(v) for k, v in table.items()}
+            for kind, table in data["postings"].items()
+        }
+        index._param_postings = {
+            key: {v: positions(p) for v, p in values.items()}
+            for key, values in data["params"].items()
+        }
+        index._param_bits = {}
+        return index
+
+    def count(self, mask) -> int:
+        return self.bits.popcount(mask)
+
+    def positions(self, mask):
+        return self.bits.positions(mask)
+
+
+class QueryNode:
+    """
+    Base class for compiled query expressions.
+
+    `evaluate` returns the bitmap of items (within the `within` bitmap)
+    that match, using the MetadataIndex where possible. `matches` tests a
+    single item directly and is used where no index is available.
+    """
+
+    # Relative evaluation cost. AND groups evaluate cheap children first
+    # so expensive ones only see the remaining candidates.
+    cost = 0
+
+    # The query string a tree was compiled from, set on its root node.
+    text = ""
+
+    def evaluate(self, index: MetadataIndex, within: int) -> int:
+        raise NotImplementedError
+
+    def matches(self, item: Any, hierarchical_paths: bool = True) -> bool:
+        raise NotImplementedError
+
+
+class _TagTerm(QueryNode):
+    def __init__(self, name: str):
+        self.name = name
+
+    def evaluate(self, index, within):
+        return index.bits.and_(index.tag(self.name), within)
+
+    def matches(self, item, hierarchical_paths=True):
+        return any((t[1:] if t.startswith("#") else t) == self.name for t in item.tags)
+
+    def __repr__(self):
+        return f"#{self.name}"
+
+
+class _PathTerm(QueryNode):
+    def __init__(self, name: str):
+        self.name = name
+
+    def evaluate(self, index, within):
+        return index.bits.and_(index.path(self.name), within)
+
+    def matches(self, item, hierarchical_paths=True):
+        for p in item.paths:
+            p_val = p[1:] if p.startswith("@") or p.startswith(".") else p
+            if p_val == self.name:
+                return True
+            if hierarchical_paths and p_val.startswith(self.name + "."):
+                return True
+        return False
+
+    def __repr__(self):
+        return f"@{self.name}"
+
+
+class _IdTerm(QueryNode):
+    def __init__(self, name: str):
+        self.name = name
+
+    def evaluate(self, index, within):
+        return index.bits.and_(index.ident(self.name), within)
+
+    def matches(self, item, hierarchical_paths=True):
+        return item.id == self.name
+
+    def __repr__(self):
+        return repr(self.name)
+
+
+class _ParamTerm(QueryNode):
+    cost = 1
+
+    def __init__(self, key: str, op: str, value: Any):
+        self.key = key
+        self.op = op
+        self.value = value
+
+    def evaluate(self, index, within):
+        bm = index.bits
+        values = index.param_values(self.key)
+        if self.op == "=":
+            try:
+                hit = values.get(self.value)
+                return bm.and_(hit, within) if hit is not None else bm.empty()
+            except TypeError:
+                pass
+        mask = bm.empty()
+        for v, bits in values.items():
+            if compare_op(v, self.value, self.op):
+                mask = bm.or_(mask, bits)
+        return bm.and_(mask, within)
+
+    def matches(self, item, hierarchical_paths=True):
+        params = item.parameters
+        if self.key not in params:
+            return False
+        return compare_op(params[self.key], self.value, self.op)
+
+    def __repr__(self):
+        return f"{self.key}{self.op}{self.value!r}"
+
+
+class _ContentTerm(QueryNode):
+    """`content.<key.path><op><value>`: compares a field of the parsed body."""
+
+    cost = 2
+
+    def __init__(self, key_path: str, op: str, value: Any):
+        self.keys = tuple(key_path.split("."))
+        self.op = op
+        self.value = value
+
+    def evaluate(self, index, within):
+        items = index.items
+        hits = array(
+            "I", (p for p in index.positions(within) if self.matches(items[p]))
+        )
+        return index.bits.from_positions(hits)
+
+    def matches(self, item, hierarchical_paths=True):
+        project = getattr(item, "_project", None)
+        if project is None:
+            return False
+        if item.type_name.lower() in ("container", "defaults", "schema"):
+            return False
+        lhs_val = project(self.keys)
+        if lhs_val is _MISSING:
+            return False
+        return compare_op(lhs_val, self.value, self.op)
+
+    def __repr__(self):
+        return f"content.{'.'.join(self.keys)}{self.op}{self.value!r}"
+
+
+class _AndNode(QueryNode):
+    def __init__(self, children: List[QueryNode]):
+        # Stable sort: metadata terms first, content terms last.
+        self.children = sorted(children, key=lambda c: c.cost)
+        self.cost = max(c.cost for c in self.children)
+
+    def evaluate(self, index, within):
+        for child in self.children:
+            within = child.evaluate(index, within)
+            if not index.bits.any(within):
+                break
+        return within
+
+    def matches(self, item, hierarchical_paths=True):
+        return all(c.matches(item, hierarchical_paths) for c in self.children)
+
+    def __repr__(self):
+        return "(" + " AND ".join(map(repr, self.children)) + ")"
+
+
+class _OrNode(QueryNode):
+    def __init__(self, children: List[QueryNode]):
+        self.children = children
+        self.cost = max(c.cost for c in children)
+
+    def evaluate(self, index, within):
+        bm = index.bits
+        result = bm.empty()
+        for child in self.children:
+            # Items already matched need not be tested again.
+            remaining = bm.andnot(within, result)
+            result = bm.or_(result, child.evaluate(index, remaining))
+            if bm.equal(result, within):
+                break
+        return result
+
+    def matches(self, item, hierarchical_paths=True):
+        return any(c.matches(item, hierarchical_paths) for c in self.children)
+
+    def __repr__(self):
+        return "(" + " OR ".join(map(repr, self.children)) + ")"
+
+
+class _NotNode(QueryNode):
+    def __init__(self, child: QueryNode):
+        self.child = child
+        self.cost = child.cost
+
+    def evaluate(self, index, within):
+        return index.bits.andnot(within, self.child.evaluate(index, within))
+
+    def matches(self, item, hierarchical_paths=True):
+        return not self.child.matches(item, hierarchical_paths)
+
+    def __repr__(self):
+        return f"NOT {self.child!r}"
+
+
+class _MatchAll(QueryNode):
+    """The empty query: matches every item."""
+
+    def evaluate(self, index, within):
+        return within
+
+    def matches(self, item, hierarchical_paths=True):
+        return True
+
+    def __repr__(self):
+        return "*"
+
+
+_QUERY_KEYWORDS = ("AND", "OR", "NOT")
+
+
+def _tokenize_query(query: str) -> List[tuple]:
+    """
+    Split a query into (kind, text, column) tokens. Kinds are "(", ")",
+    "AND", "OR", "NOT" and "TERM". Quoted strings may contain spaces and
+    parentheses; a leading '!' negates the following term or group.
+    """
+    tokens = []
+    i = 0
+    n = len(query)
+    while i < n:
+        ch = query[i]
+        if ch.isspace():
+            i += 1
+            continue
+        if ch in "()":
+            tokens.append((ch, ch, i + 1))
+            i += 1
+            continue
+        if ch == "!":
+            tokens.append(("NOT", ch, i + 1))
+            i += 1
+            continue
+
+        start = i
+        quote = ""
+        while i < n:
+            ch = query[i]
+            if quote:
+                if ch == quote:
+                    quote = ""
+            elif ch in "\"'":
+                quote = ch
+            elif ch.isspace() or ch in "()":
+                break
+            i += 1
+        if quote:
+            raise FlexTagSyntaxError(
+                "No closing quotation in query",
+                column_num=start + 1,
+                source_name="<query>",
+                line_content=query,
+            )
+        text = query[start:i]
+        kind = text.upper() if text.upper() in _QUERY_KEYWORDS else "TERM"
+        tokens.append((kind, text, start + 1))
+    return tokens
+
+
+def _make_term(text: str) -> QueryNode:
+    if text.startswith("#"):
+        return _TagTerm(text[1:])
+    if text.startswith("@") or text.startswith("."):
+        return _PathTerm(text[1:])
+    m = OP_PATTERN.match(text)
+    if m:
+        key, op, rhs_str = (
+            m.group(1).strip(),
+            m.group(2).strip(),
+            m.group(3).strip(),
+        )
+        value = parse_basic_value(_unquote(rhs_str))
+        if key.startswith(CONTENT_PREFIX):
+            return _ContentTerm(key[len(CONTENT_PREFIX) :], op, value)
+        return _ParamTerm(key, op, value)
+    return _IdTerm(_unquote(text))
+
+
+class _QueryParser:
+    """
+    Recursive-descent parser for the filter grammar:
+
+        expr    := and_expr (OR and_expr)*
+        and_expr:= unary ([AND] unary)*
+        unary   := (NOT | '!') unary | '(' expr ')' | term
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.tokens = _tokenize_query(query)
+        self.pos = 0
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def _error(self, message: str, column: int):
+        raise FlexTagSyntaxError(
+            message,
+            column_num=column,
+            source_name="<query>",
+            line_content=self.query,
+        )
+
+    def parse(self) -> QueryNode:
+        if not self.tokens:
+            return _MatchAll()
+        node = self._parse_or()
+        tok = self._peek()
+        if tok is not None:
+            self._error(f"Unexpected '{tok[1]}' in query", tok[2])
+        return node
+
+    def _parse_or(self) -> QueryNode:
+        children = [self._parse_and()]
+        while self._peek() is not None and self._peek()[0] == "OR":
+            self.pos += 1
+            children.append(self._parse_and())
+        return children[0] if len(children) == 1 else _OrNode(children)
+
+    def _parse_and(self) -> QueryNode:
+        children = [self._parse_unary()]
+        while True:
+            tok = self._peek()
+            if tok is None or tok[0] in ("OR", ")"):
+                break
+            if tok[0] == "AND":
+                self.pos += 1
+            children.append(self._parse_unary())
+        return children[0] if len(children) == 1 else _AndNode(children)
+
+    def _parse_unary(self) -> QueryNode:
+        tok = self._peek()
+        if tok is None:
+            self._error("Unexpected end of query", len(self.query) + 1)
+        kind, text, col = tok
+        self.pos += 1
+        if kind == "NOT":
+            return _NotNode(self._parse_unary())
+        if kind == "(":
+            node = self._parse_or()
+            close = self._peek()
+            if close is None or close[0] != ")":
+                self._error("Missing closing ')' in query", col)
+            self.pos += 1
+            return node
+        if kind == "TERM":
+            return _make_term(text)
+        self._error(f"Unexpected '{text}' in query", col)
+
+
+def compile_query(query: str) -> QueryNode:
+    """
+    Compile a filter query string into a QueryNode tree.
+
+    Terms are #tag, @path, key<op>value, content.<key.path><op>value or a
+    bare section ID. Terms next to each other are ANDed; groups can be
+    combined with AND, OR, NOT (or a leading '!') and parentheses, and
+    values may be quoted to include spaces.
+    """
+    node = _QueryParser(query).parse()
+    node.text = query
+    return node
+
+
+##############################################################################
+# WRITER
+##############################################################################
+
+# Header tokens containing any of these are written double-quoted.
+_QUOTE_CHARS = SHLEX_SPECIAL_CHARS | frozenset(" \t")
+PARAM_KEY_PATTERN = re.compile(r"[^\s=:\"'\\#@\[\]][^\s=:\"'\\\[\]]*")
+SECTION_ID_PATTERN = re.compile(
+    r"[^\s=\"'\\#@\[\]/]([^\s=\"'\\\[\]]*[^\s=\"'\\\[\]/])?"
+)
+
+# Characters of output gathered before each write to the target file.
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def _quote_token(text: str) -> str:
+    """Quote `text` so `split_header_tokens` reads it back as one token."""
+    if text and _QUOTE_CHARS.isdisjoint(text):
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def format_param(key: str, value: Any) -> str:
+    """
+    Render one header parameter so that it parses back to the same value
+    and type. Strings that would otherwise be read as a number, boolean or
+    null get an explicit `:str` annotation.
+    """
+    if not PARAM_KEY_PATTERN.fullmatch(key):
+        raise FlexTagError(f"Cannot write parameter name {key!r} in a header")
+    if value is None:
+        return f"{key}=null"
+    if isinstance(value, bool):
+        return f"{key}={'true' if value else 'false'}"
+    if isinstance(value, int):
+        return f"{key}={value}"
+    if isinstance(value, float):
+        return f"{key}={value!r}"
+    if isinstance(value, str):
+        if "\n" in value or "\r" in value:
+            raise FlexTagError(f"Parameter {key!r} contains a line break")
+        if isinstance(parse_basic_value(value), str):
+            return f"{key}={_quote_token(value)}"
+        if value != value.strip():
+            raise FlexTagError(
+                f"Parameter {key!r} has surrounding spaces that would be lost"
+            )
+        return f"{key}:str={_quote_token(value)}"
+    raise FlexTagError(
+        f"Parameter {key!r} of type {type(value).__name__} "
+        f"cannot be written in a section header"
+    )
+
+
+def format_section_header(section: SectionHeader, self_closing: bool) -> str:
+    """
+    Render the open line of `section` (without newline) from its own
+    metadata. Inherited defaults are left to the defaults section.
+    """
+    tokens = []
+    if section.raw_id:
+        if not SECTION_ID_PATTERN.fullmatch(section.raw_id):
+            raise FlexTagError(f"Cannot write section ID {section.raw_id!r}")
+        tokens.append(section.raw_id)
+    for prefix, values in (("#", section.raw_tags), ("@", section.raw_paths)):
+        for v in values:
+            if not v.startswith(prefix) or len(v) == 1:
+                raise FlexTagError(f"Invalid {prefix} value {v!r} in section header")
+            tokens.append(_quote_token(v))
+    for k, v in section.raw_parameters.items():
+        tokens.append(format_param(k, v))
+    if self_closing:
+        # A leading space keeps "[[ /]]" from reading as a close tag.
+        tokens.append("/" if tokens else " /")
+    header = f"[[{' '.join(tokens)}]]"
+    type_name = section.raw_type_name
+    if type_name and type_name.lower() != "raw":
+        header += f": {type_name}"
+    return header
+
+
+def _is_filler(lines: List[str]) -> bool:
+    """True if `lines` holds only blank lines and comments."""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#"):
+            return False
+    return True
+
+
+class _FlexTagWriter:
+    """
+    Streams containers and sections to a text file as FlexTag.
+
+    Output is gathered in a list and handed to the file in large chunks.
+    Unchanged sections, and the comment lines between consecutive ones,
+    are copied from their source lines as they are; only sections whose
+    metadata or content was assigned are rendered and re-encoded.
+    """
+
+    def __init__(self, fp, buffer_size: int = WRITE_BUFFER_SIZE):
+        self._fp = fp
+        self._buffer: List[str] = []
+        self._size = 0
+        self._limit = buffer_size
+        self._prev: Optional[Section] = None
+
+    def _emit(self, text: str):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self._limit:
+            self.flush()
+
+    def _emit_lines(self, lines: List[str]):
+        if not lines:
+            return
+        self._buffer.extend(lines)
+        self._size += sum(map(len, lines))
+        if not lines[-1].endswith("\n"):
+            self._buffer.append("\n")
+        if self._size >= self._limit:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._fp.write("".join(self._buffer))
+            self._buffer = []
+            self._size = 0
+
+    def write_container(self, container: Container):
+        """Write one container: its head sections, then its sections."""
+        heads = [
+            h
+            for h in (
+                container.container_metadata,
+                container.defaults,
+                container.schema,
+            )
+            if h is not None and h not in container.raw_sections
+        ]
+        self._prev = None
+        for sec in heads + container.raw_sections:
+            self._write_gap(sec)
+            self.write_section(sec)
+        last = self._prev
+        if last is not None and type(last._all_lines) is list:
+            tail = last._all_lines[last.close_line + 1 :]
+            if _is_filler(tail):
+                self._emit_lines(tail)
+        self._prev = None
+
+    def write_section(self, sec: Section):
+        """Write one section, from its open tag through its close tag."""
+        lines = sec._all_lines
+        changed = sec._content_changed
+        if not (changed or sec._header_changed) and self._has_block(sec):
+            self._emit_lines(lines[sec.open_line : sec.close_line + 1])
+            self._prev = sec
+            return
+
+        self_closing = sec.is_self_closing and not changed
+        self._emit(format_section_header(sec, self_closing) + "\n")
+        if not self_closing:
+            if changed:
+                body = dump_content(sec._parsed_cache, sec.type_name)
+                self._check_body(body, sec)
+                if body:
+                    self._emit(body + "\n")
+            elif sec.close_line > sec.open_line + 1:
+                self._emit_lines(lines[sec.open_line + 1 : sec.close_line])
+            self._emit(f"[[/{sec.raw_id}]]\n")
+        self._prev = sec
+
+    @staticmethod
+    def _has_block(sec: Section) -> bool:
+        """True if the section's open and close lines are in its lines."""
+        lines = sec._all_lines
+        if type(lines) is list:
+            return sec.close_line < len(lines)
+        return isinstance(lines, _LineWindow) and lines.base <= sec.open_line
+
+    def _write_gap(self, sec: Section):
+        """
+        Copy the blank and comment lines between the previous section and
+        `sec` when both come from the same source lines; otherwise separate
+        them with a blank line.
+        """
+        prev, lines = self._prev, sec._all_lines
+        if type(lines) is list and (prev is None or prev._all_lines is lines):
+            start = 0 if prev is None else prev.close_line + 1
+            gap = lines[start : sec.open_line]
+            if start <= sec.open_line and _is_filler(gap):
+                self._emit_lines(gap)
+                return
+        if prev is not None:
+            self._emit("\n")
+
+    @staticmethod
+    def _check_body(body: str, sec: Section):
+        if "[[/" not in body:
+            return
+        for line in body.splitlines():
+            if SECTION_CLOSE_PATTERN.match(line):
+                raise FlexTagError(
+                    f"Content of section '{sec.id}' contains a close tag: {line!r}"
+                )
+
+
+##############################################################################
+# FLEX VIEW
+##############################################################################
+
+
+class FlexView:
+    """
+    Top-level container for multiple Container objects.
+    You can filter or convert to a FlexMap, etc.
+    """
+
+    def __init__(
+        self,
+        containers: List[Container],
+        settings: Optional[FlexTagSettings] = None,
+    ):
+        # The containers this view was derived from. Filters are recorded
+        # against this list and only evaluated when the view is accessed.
+        self._source = containers
+        self._index_backend = settings.index_backend if settings else "int"
+        self._section_queries: List[QueryNode] = []
+        self._container_queries: List[QueryNode] = []
+        # A view filtered with limit/offset keeps that window; filters
+        # applied after it are evaluated within the parent's result.
+        self._parent: Optional["FlexView"] = None
+        self._window: Optional[tuple] = None  # (offset, limit, target)
+        self._state_cache: Optional[tuple] = None
+        self._resolved: Optional[List[Container]] = None
+        self._resolved_raw: Optional[List[Section]] = None
+        self._resolved_user: Optional[List[Section]] = None
+        # Indexes over `_source`, shared by every view derived from it.
+        self._shared: Dict[str, Any] = {}
+        # Errors skipped by load(on_error="collect") and the LoadStats of
+        # load(stats=True), kept by derived views.
+        self.diagnostics: List[Diagnostic] = []
+        self.stats: Optional[LoadStats] = None
+
+    @property
+    def _containers(self) -> List[Container]:
+        if self._resolved is None:
+            self._resolved = self._resolve()
+        return self._resolved
+
+    @property
+    def _raw_sections(self) -> List[Section]:
+        if self._resolved_raw is None:
+            out = []
+            for c in self._containers:
+                out.extend(c.raw_sections)
+            self._resolved_raw = out
+        return self._resolved_raw
+
+    @property
+    def _user_sections(self) -> List[Section]:
+        if self._resolved_user is None:
+            out = []
+            for c in self._containers:
+                out.extend(c.sections)
+            self._resolved_user = out
+        return self._resolved_user
+
+    @property
+    def containers(self) -> ContainerCollection:
+        return ContainerCollection(self._containers)
+
+    @property
+    def sections(self) -> SectionCollection:
+        return SectionCollection(self._user_sections)
+
+    @property
+    def raw_sections(self) -> SectionCollection:
+        return SectionCollection(self._raw_sections)
+
+    def dump(self, fp) -> None:
+        """
+        Write the containers of this view to the text file `fp` as FlexTag,
+        streaming through a buffer. Unchanged sections are copied from their
+        source text; see Section.to_flextag().
+        """
+        writer = _FlexTagWriter(fp)
+        for c in self._containers:
+            writer.write_container(c)
+        writer.flush()
+
+    def dumps(self) -> str:
+        """Return the containers of this view as FlexTag text."""
+        out = io.StringIO()
+        self.dump(out)
+        return out.getvalue()
+
+    def apply_edit(
+        self,
+        source: Union[str, Container],
+        start: tuple,
+        end: tuple,
+        new_text: str,
+        validate: bool = True,
+    ) -> List[Section]:
+        """
+        Apply a text edit to one source of this view and re-parse only the
+        sections it touches (see Container.apply_edit). `source` is a source
+        name or one of the view's containers; `start` and `end` are
+        (line, column) positions, 0-based, as editors report them.
+
+        The edit updates the containers in place and drops this view's
+        filter indexes, which are rebuilt on the next query. Views filtered
+        from this one are re-evaluated only if they had not been read yet.
+        """
+        if self._parent is not None or self._section_queries or self._container_queries:
+            raise FlexTagError("apply_edit() needs an unfiltered view")
+        if isinstance(source, Container):
+            container = source
+        else:
+            container = next((c for c in self._source if c.source_name == source), None)
+            if container is None:
+                raise FlexTagError(f"No source named {source!r} in this view")
+        new_secs = container.apply_edit(start, end, new_text, validate=validate)
+        self._shared.clear()
+        self._state_cache = None
+        self._resolved = None
+        self._resolved_raw = None
+        self._resolved_user = None
+        return new_secs
+
+    def save_snapshot(self, path: str, include_content: bool = False) -> None:
+        """
+        Write this view to a binary snapshot at `path`: section metadata
+        and inheritance state, raw bodies, container metadata, compiled
+        schema rules and filter indexes. With include_content=True, parsed
+        section content is stored too (where it is plain data), so it is
+        not re-parsed after loading.
+        """
+        _save_snapshot(self, path, include_content)
+
+    @classmethod
+    def load_snapshot(
+        cls, path: str, settings: Optional[FlexTagSettings] = None
+    ) -> "FlexView":
+        """
+        Restore a view written by `save_snapshot`. Nothing is re-parsed or
+        re-validated; section bodies and stored content are read from the
+        memory-mapped file when first accessed.
+        """
+        return _load_snapshot(path, settings)
+
+    def filter(
+        self,
+        query: str,
+        target: str = "sections",
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> "FlexView":
+        """
+        Provide a param/tag-based filter for sections or containers.
+
+        The query is compiled with `compile_query`, so it may use AND, OR,
+        NOT, parentheses and quoted values. `offset` and `limit` keep only
+        a window of the matches, in document order; scanning stops once
+        the window is full.
+
+        Filtering is lazy: the returned view only records the query and
+        is evaluated the first time its sections or containers are
+        accessed. Chained filters are fused, so
+        ``view.filter(a).filter(b)`` runs as a single pass over the
+        original containers without building an intermediate view.
+        """
+        logger.debug("Filtering with query='%s', target='%s'.", query, target)
+        tgt = target.lower()
+        if tgt not in ("sections", "containers"):
+            logger.warning("Unknown filter target=%s, ignoring filter", target)
+            return self
+        if limit is not None and limit < 0:
+            raise FlexTagError(f"filter() limit must be >= 0, got {limit}")
+        if offset < 0:
+            raise FlexTagError(f"filter() offset must be >= 0, got {offset}")
+
+        node = compile_query(query)
+        view = FlexView(self._source)
+        view._index_backend = self._index_backend
+        view._shared = self._shared
+        view.diagnostics = self.diagnostics
+        view.stats = self.stats
+        if self._window is not None:
+            view._parent = self
+        else:
+            view._parent = self._parent
+            view._section_queries = list(self._section_queries)
+            view._container_queries = list(self._container_queries)
+        if tgt == "sections":
+            view._section_queries.append(node)
+        else:
+            view._container_queries.append(node)
+        if limit is not None or offset:
+            view._window = (offset, limit, tgt)
+        return view
+
+    def _section_index(self) -> MetadataIndex:
+        """
+        Bitmap index over the user sections of the source containers,
+        built on first use and shared by all derived views. The sections
+        of container `i` occupy positions `spans[i][0]:spans[i][1]`.
+        """
+        index = self._shared.get("sections")
+        if index is None:
+            items = []
+            spans = []
+            for c in self._source:
+                start = len(items)
+                # Lazily loaded sources contribute headers, not sections
+                items.extend(c._index_items())
+                spans.append((start, len(items)))
+            index = MetadataIndex(
+                items, hierarchical_paths=True, backend=self._index_backend
+            )
+            index.spans = spans
+            self._shared["sections"] = index
+        return index
+
+    @staticmethod
+    def _combined(queries: List[QueryNode]) -> QueryNode:
+        return queries[0] if len(queries) == 1 else _AndNode(queries)
+
+    @staticmethod
+    def _keep_mask(index: MetadataIndex, keep: List[bool]):
+        bm = index.bits
+        mask = bm.empty()
+        for kept, (start, end) in zip(keep, index.spans):
+            if kept and end > start:
+                mask = bm.or_(mask, bm.from_range(start, end))
+        return mask
+
+    @staticmethod
+    def _scan(index: MetadataIndex, within, queries: List[Optional[QueryNode]]):
+        """
+        Yield matching positions in document order. Index-backed terms are
+        applied as bitmaps up front; content terms are checked lazily per
+        candidate, so a consumer that stops early stops the parsing too.
+        """
+        conjuncts = []
+        stack = [q for q in reversed(queries) if q is not None]
+        while stack:
+            q = stack.pop()
+            if isinstance(q, _AndNode):
+                stack.extend(reversed(q.children))
+            elif not isinstance(q, _MatchAll):
+                conjuncts.append(q)
+
+        residual = []
+        for q in conjuncts:
+            if q.cost >= _ContentTerm.cost:
+                residual.append(q)
+            else:
+                within = q.evaluate(index, within)
+        positions = index.positions(within)
+        if not residual:
+            return positions
+        items = index.items
+        return (p for p in positions if all(r.matches(items[p]) for r in residual))
+
+    def _base(self, index: MetadataIndex) -> tuple:
+        """
+        (keep, within) before this view's own section queries: which source
+        containers are kept (None = all) and the candidate section bitmap.
+        """
+        if self._parent is not None:
+            keep, within, _ = self._parent._state()
+        else:
+            keep, within = None, index.universe
+        if self._container_queries:
+            matched = self._container_matches()
+            keep = [(keep is None or keep[i]) and m for i, m in enumerate(matched)]
+            within = index.bits.and_(within, self._keep_mask(index, keep))
+        return keep, within
+
+    def _container_index(self) -> MetadataIndex:
+        """
+        Bitmap index over the metadata of the source containers (tags,
+        exact paths, ids, parameter values), shared by all derived views.
+        """
+        index = self._shared.get("containers")
+        if index is None:
+            index = MetadataIndex(
+                self._source, hierarchical_paths=False, backend=self._index_backend
+            )
+            self._shared["containers"] = index
+        return index
+
+    def _container_matches(self) -> List[bool]:
+        """Per source container: does it match this view's container queries."""
+        index = self._container_index()
+        mask = self._combined(self._container_queries).evaluate(index, index.universe)
+        matched = [False] * len(self._source)
+        for pos in index.positions(mask):
+            matched[pos] = True
+        return matched
+
+    def _has_section_filter(self) -> bool:
+        view = self
+        while view is not None:
+            if view._section_queries:
+                return True
+            view = view._parent
+        return False
+
+    def _state(self) -> tuple:
+        """
+        (keep, mask, sectioned): the kept source containers (None = all),
+        the bitmap of selected sections, and whether sections were filtered
+        (in which case containers are narrowed to their matching sections).
+        """
+        if self._state_cache is not None:
+            return self._state_cache
+
+        index = self._section_index()
+        bm = index.bits
+        keep, mask = self._base(index)
+        sectioned = self._has_section_filter()
+
+        if self._window is not None and self._window[2] == "sections":
+            offset, limit, _ = self._window
+            stop = offset + limit if limit is not None else None
+            hits = itertools.islice(
+                self._scan(index, mask, self._section_queries), offset, stop
+            )
+            mask = bm.from_positions(array("I", hits))
+        else:
+            if self._section_queries:
+                mask = self._combined(self._section_queries).evaluate(index, mask)
+            if self._window is not None:
+                offset, limit, _ = self._window
+                stop = offset + limit if limit is not None else None
+                matched = [
+                    i
+                    for i, (start, end) in enumerate(index.spans)
+                    if (keep is None or keep[i])
+                    and (
+                        not sectioned
+                        or bm.any(bm.and_(mask, bm.from_range(start, end)))
+                    )
+                ]
+                keep = [False] * len(self._source)
+                for i in matched[offset:stop]:
+                    keep[i] = True
+                mask = bm.and_(mask, self._keep_mask(index, keep))
+
+        self._state_cache = (keep, mask, sectioned)
+        return self._state_cache
+
+    def _resolve(self) -> List[Container]:
+        """
+        Evaluate all recorded queries as one plan over the source containers.
+        """
+        if self._parent is None and self._window is None:
+            if not self._section_queries and not self._container_queries:
+                return self._source
+        with self._filter_span("resolve") as span:
+            containers = self._resolve_filtered()
+            span.set("flextag.containers", len(containers))
+        return containers
+
+    def _resolve_filtered(self) -> List[Container]:
+        if self._parent is None and self._window is None:
+            if not self._section_queries and not self._container_queries:
+                return self._source
+            if not self._section_queries:
+                index = self._container_index()
+                cq = self._combined(self._container_queries)
+                mask = cq.evaluate(index, index.universe)
+                return [self._source[pos] for pos in index.positions(mask)]
+
+        keep, mask, sectioned = self._state()
+        if not sectioned:
+            return [c for i, c in enumerate(self._source) if keep is None or keep[i]]
+
+        index = self._section_index()
+        out = []
+        positions = index.positions(mask)
+        pos = next(positions, None)
+        for c, (start, end) in zip(self._source, index.spans):
+            sub_secs = []
+            while pos is not None and pos < end:
+                sub_secs.append(c.sections[pos - start])
+                pos = next(positions, None)
+            if sub_secs:
+                out.append(c._subset(sub_secs))
+        return out
+
+    def _filter_span(self, operation: str, query: Optional[str] = None):
+        """Tracing span for evaluating this view's queries (and `query`)."""
+
+        def attributes():
+            texts = [q.text for q in self._container_queries + self._section_queries]
+            if query is not None:
+                texts.append(query)
+            return {
+                "flextag.query": " AND ".join(f"({t})" for t in texts),
+                "flextag.operation": operation,
+            }
+
+        return _instrument.span("flextag.filter", attributes)
+
+    def _positions(self, query: Optional[str]):
+        """Lazily yield positions of this view's sections matching `query`."""
+        node = compile_query(query) if query is not None else None
+        index = self._section_index()
+        if self._window is None:
+            _, within = self._base(index)
+            return self._scan(index, within, self._section_queries + [node])
+        _, mask, _ = self._state()
+        return self._scan(index, mask, [node])
+
+    def count(self, query: Optional[str] = None) -> int:
+        """
+        Count the user sections in this view, optionally only those matching
+        `query`. Computed as a popcount over the section index, without
+        building containers or a filtered view.
+        """
+        if query is None and self._parent is None and self._window is None:
+            if not self._section_queries and not self._container_queries:
+                return sum(len(c._index_items()) for c in self._source)
+        with self._filter_span("count", query) as span:
+            index = self._section_index()
+            _, mask, _ = self._state()
+            if query is not None:
+                mask = compile_query(query).evaluate(index, mask)
+            matches = index.count(mask)
+            span.set("flextag.matches", matches)
+        return matches
+
+    def first(self, query: Optional[str] = None) -> Optional[Section]:
+        """
+        Return the first user section (in document order) matching `query`,
+        or None. Scanning stops at the first match.
+        """
+        with self._filter_span("first", query) as span:
+            pos = next(self._positions(query), None)
+            span.set("flextag.matches", int(pos is not None))
+        if pos is None:
+            return None
+        spans = self._section_index().spans
+        i = bisect.bisect_right(spans, (pos, float("inf"))) - 1
+        start = spans[i][0]
+        return self._source[i].sections[pos - start]
+
+    def exists(self, query: Optional[str] = None) -> bool:
+        """
+        Return True if any user section matches `query`. Stops at the first
+        match and never builds containers.
+        """
+        with self._filter_span("exists", query) as span:
+            found = next(self._positions(query), None) is not None
+            span.set("flextag.matches", int(found))
+        return found
+
+    def to_dict(self) -> dict:
+        """
+        Returns a Python dictionary representing this FlexView's sections
+        in a simpler two-pass approach, ensuring repeated FTML lists
+        remain separate in a list-of-lists.
+
+        Rules:
+          1. Sections with no ID => data[""] is the content directly if there's only one,
+             or a list of contents if there are multiple.
+             (raw => string, ftml => parsed object)
+          2. Sections with an ID => data[id], or nested if using dot notation.
+             If repeated, becomes a list of objects; if single occurrence, just that object.
+             - raw => {"__raw": "..."}
+             - ftml => the parsed FTML (list/dict/scalar)
+        """
+
+        # -----------------------------------------------------------------------
+        # PASS 1: Collect all sections by ID in a dictionary of lists.
+        #         This lets us see if an ID was repeated.
+        # -----------------------------------------------------------------------
+        collected = collections.defaultdict(list)
+
+        for sec in self._raw_sections:
+            stype = sec.type_name.lower()
+            # Skip head sections
+            if stype in ("container", "defaults", "schema"):
+                continue
+
+            # Build the object to store
+            if stype == "raw":
+                if sec.id == "":
+                    # anonymous raw => raw string
+                    item = sec.content
+                else:
+                    # raw with ID => {"__raw": "..."}
+                    item = {"__raw": sec.content}
+            elif stype in ("ftml", "yaml", "json", "toml"):
+                # parsed result can be list/dict/scalar
+                item = sec.content
+            else:
+                # fallback => raw content
+                item = sec.raw_content
+
+            # Append the item to the list for this ID
+            collected[sec.id].append(item)
+
+        # -----------------------------------------------------------------------
+        # PASS 2: Build the final nested structure.
+        #         - If an ID is repeated => store a list of items.
         #         - If single occurrence => store that single item.
         #         - Dot-splitting for nested IDs.
         #         - Anonymous ID => handle like other IDs (single -> direct, multiple -> list)
@@ -2105,200 +4506,2406 @@ class FlexView:
                 # by handling them directly outside of insert_nested
                 return
 
-            node = root
-            for s in segs[:-1]:
-                if s not in node or not isinstance(node[s], dict):
-                    node[s] = {}
-                node = node[s]
-            last = segs[-1]
-            if last not in node:
-                node[last] = final_obj
-            else:
-                # If last is already used, convert to list or append
-                existing = node[last]
-                if isinstance(existing, list):
-                    existing.append(final_obj)
-                else:
-                    node[last] = [existing, final_obj]
+            node = root
+            for s in segs[:-1]:
+                if s not in node or not isinstance(node[s], dict):
+                    node[s] = {}
+                node = node[s]
+            last = segs[-1]
+            if last not in node:
+                node[last] = final_obj
+            else:
+                # If last is already used, convert to list or append
+                existing = node[last]
+                if isinstance(existing, list):
+                    existing.append(final_obj)
+                else:
+                    node[last] = [existing, final_obj]
+
+        result = {}
+
+        for id_val, items in collected.items():
+            if id_val == "":
+                # Handle anonymous sections directly
+                if len(items) == 1:
+                    result[""] = items[0]  # Store single item directly
+                else:
+                    result[""] = items  # Store multiple items as a list
+            else:
+                # Handle sections with IDs with the original approach
+                if len(items) == 1:
+                    final_obj = items[0]  # single item
+                else:
+                    final_obj = items  # repeated => entire list
+                segs = id_val.split(".")
+                insert_nested(result, segs, final_obj)
+
+        return result
+
+    def to_flexmap(self) -> "FlexMap":
+        """
+        Convert all raw_sections into a nested FlexMap.
+        If an ID is 'my_id' with no dots, we store the section
+        directly in fm["my_id"]. If an ID is 'my.nested.id', we nest
+        children accordingly.
+        """
+        logger.debug("Converting view to FlexMap.")
+        fm = FlexMap()
+
+        for sec in self._raw_sections:
+            # Skip head sections
+            s_type = sec.type_name.lower()
+            if s_type in ("container", "defaults", "schema"):
+                continue
+
+            # If section has no ID, skip or store in anonymous
+            if not sec.id:
+                continue
+
+            # Split on dot
+            segs = sec.id.split(".")
+            top_key = segs[0]
+
+            # Ensure a top-level FlexPoint for that top_key
+            if top_key not in fm:
+                fm[top_key] = FlexPoint(parent_map=fm, full_path=f'["{top_key}"]')
+
+            node = fm[top_key]
+            prefix = f'["{top_key}"]'
+
+            # If the ID has multiple segments (e.g. 'a.b.c'),
+            # descend into node.children for segs[1:-1].
+            for sub in segs[1:-1]:
+                if sub not in node.children:
+                    child_path = prefix + f'["{sub}"]'
+                    node.children[sub] = FlexPoint(parent_map=fm, full_path=child_path)
+                node = node.children[sub]
+                prefix += f'["{sub}"]'
+
+            # Now handle the last segment. If there's only 1 segment,
+            # we add the Section directly to the top-level node.
+            if len(segs) == 1:
+                node.add_section(sec)
+            else:
+                last_seg = segs[-1]
+                if last_seg not in node.children:
+                    child_path = prefix + f'["{last_seg}"]'
+                    node.children[last_seg] = FlexPoint(
+                        parent_map=fm, full_path=child_path
+                    )
+                node.children[last_seg].add_section(sec)
+
+        fm.load_all_rows()
+        return fm
+
+
+##############################################################################
+# SOURCES
+##############################################################################
+
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# Bytes read per step when decoding byte buffers and binary streams.
+DECODE_CHUNK_SIZE = 1 << 16
+
+# Compressed inputs: suffix -> (format, magic bytes). A file is taken as
+# compressed by its suffix, or else by its leading bytes.
+COMPRESSION_SUFFIXES = {
+    ".gz": ("gzip", b"\x1f\x8b"),
+    ".bz2": ("bz2", b"BZh"),
+    ".xz": ("xz", b"\xfd7zXZ\x00"),
+    ".lzma": ("xz", b"\x5d\x00\x00"),
+}
+
+# File suffixes picked up when loading a directory, with or without a
+# compression suffix after them.
+SOURCE_SUFFIXES = (".flextag", ".ft")
+
+
+def _glob_matcher(
+    patterns: Union[str, List[str], None]
+) -> Optional[Callable[[str, str], bool]]:
+    """
+    Compile glob patterns into one test of (relative path, name): patterns
+    with a "/" match the relative path, the rest match the name.
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    patterns = [p.replace(os.sep, "/") for p in patterns]
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+
+    def compile_globs(globs):
+        if not globs:
+            return None
+        return re.compile("|".join(fnmatch.translate(g) for g in globs), flags)
+
+    by_path = compile_globs([p for p in patterns if "/" in p])
+    by_name = compile_globs([p for p in patterns if "/" not in p])
+
+    def matches(rel: str, name: str) -> bool:
+        return bool(
+            (by_name is not None and by_name.match(name))
+            or (by_path is not None and by_path.match(rel))
+        )
+
+    return matches
+
+
+def _strip_compression_suffix(name: str) -> str:
+    lower = name.lower()
+    for suffix in COMPRESSION_SUFFIXES:
+        if lower.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def is_source_file_name(name: str) -> bool:
+    """Whether `name` is a FlexTag file name, compressed or not."""
+    return _strip_compression_suffix(name).endswith(SOURCE_SUFFIXES)
+
+
+def detect_compression(name: str, head: bytes = b"") -> Optional[str]:
+    """
+    The compression format of an input ("gzip", "bz2" or "xz") from its
+    name's suffix or, failing that, from its first bytes; None if plain.
+    """
+    lower = name.lower()
+    for suffix, (fmt, _magic) in COMPRESSION_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return fmt
+    for fmt, magic in COMPRESSION_SUFFIXES.values():
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def _file_compression(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        return detect_compression(path, f.read(8))
+
+
+def _decompressor(fmt: str):
+    if fmt == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    module = bz2 if fmt == "bz2" else lzma
+    if module is None:
+        raise FlexTagError(f"{fmt} support is not available in this Python build")
+    return module.BZ2Decompressor() if fmt == "bz2" else module.LZMADecompressor()
+
+
+def _open_compressed(path: str, fmt: str):
+    """A binary, seekable file object reading the decompressed `path`."""
+    if fmt == "gzip":
+        return gzip.open(path, "rb")
+    _decompressor(fmt)  # raises if the module is missing
+    return bz2.open(path, "rb") if fmt == "bz2" else lzma.open(path, "rb")
+
+
+_DECOMPRESS_ERRORS = (OSError, EOFError, zlib.error) + (
+    (lzma.LZMAError,) if lzma is not None else ()
+)
+
+
+def _iter_chunks(read: Callable[[int], bytes]) -> Iterator[bytes]:
+    while True:
+        chunk = read(DECODE_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_decompressed(chunks: Iterator[bytes], fmt: str, name: str) -> Iterator[bytes]:
+    """
+    Decompress a stream of byte chunks as they arrive. Concatenated
+    members (as written by `cat a.gz b.gz` or parallel compressors) are
+    decompressed one after another.
+    """
+    decomp = _decompressor(fmt)
+    started = False
+    try:
+        for data in chunks:
+            while data:
+                out = decomp.decompress(data)
+                started = True
+                if out:
+                    yield out
+                if not decomp.eof:
+                    break
+                data = decomp.unused_data
+                if data.strip(b"\x00"):
+                    decomp = _decompressor(fmt)
+                    started = False
+                else:
+                    data = b""
+    except _DECOMPRESS_ERRORS as e:
+        raise FlexTagError(f"Cannot decompress {name}: {e}") from e
+    if started and not decomp.eof:
+        raise FlexTagError(f"Cannot decompress {name}: compressed data is truncated")
+
+
+def _iter_decoded_lines(chunks: Iterator[bytes], encoding: str) -> Iterator[str]:
+    """
+    Decode a stream of byte chunks into lines, with universal newlines as
+    in text-mode files. Only one chunk is held at a time.
+    """
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(encoding)(), translate=True
+    )
+    pending = ""
+    for chunk in itertools.chain(chunks, [b""]):
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            lines = (pending + text).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+    if pending:
+        yield pending
+
+
+class Source:
+    """
+    One FlexTag input with an explicit kind, so loading never has to guess
+    whether a string is a path or content. Create with Source.file(),
+    Source.text(), Source.bytes() or Source.stream().
+
+    Byte buffers and binary streams are decoded in chunks; text streams
+    are read line by line. Streams are read once and are not closed.
+    """
+
+    __slots__ = ("kind", "value", "name", "encoding")
+
+    def __init__(
+        self, kind: str, value: Any, name: str, encoding: Optional[str] = None
+    ):
+        self.kind = kind
+        self.value = value
+        self.name = name
+        self.encoding = encoding
+
+    def __repr__(self):
+        return f"<Source {self.kind} {self.name!r}>"
+
+    @classmethod
+    def file(cls, path: str, encoding: Optional[str] = None) -> "Source":
+        """A FlexTag file on disk."""
+        return cls("file", path, path, encoding)
+
+    @classmethod
+    def text(cls, text: str, name: str = "<string>") -> "Source":
+        """FlexTag content held in a string."""
+        return cls("text", text, name)
+
+    @classmethod
+    def stream(
+        cls, fp, name: Optional[str] = None, encoding: Optional[str] = None
+    ) -> "Source":
+        """
+        A readable file-like object, text or binary: an open file, a pipe,
+        a socket file, io.StringIO or io.BytesIO.
+        """
+        if name is None:
+            name = getattr(fp, "name", None)
+            name = name if isinstance(name, str) else "<stream>"
+        return cls("stream", fp, name, encoding)
+
+    @classmethod
+    def bytes(
+        cls, data, name: str = "<bytes>", encoding: Optional[str] = None
+    ) -> "Source":
+        """FlexTag content held in a bytes-like object."""
+        return cls("bytes", data, name, encoding)
+
+    def iter_lines(self, encoding: str) -> Iterator[str]:
+        """
+        Yield the source's lines (with line endings). `encoding` applies
+        unless the source was given its own. Compressed files, buffers and
+        binary streams are decompressed as they are read.
+        """
+        encoding = self.encoding or encoding
+        if self.kind == "text":
+            yield from self.value.splitlines(keepends=True)
+        elif self.kind == "file":
+            with open(self.value, "rb") as f:
+                fmt = detect_compression(self.value, f.peek(8)[:8])
+                if fmt is None:
+                    with io.TextIOWrapper(f, encoding=encoding) as text:
+                        yield from text
+                else:
+                    chunks = _iter_decompressed(_iter_chunks(f.read), fmt, self.name)
+                    yield from _iter_decoded_lines(chunks, encoding)
+        elif self.kind == "bytes" or not (
+            isinstance(self.value, io.TextIOBase) or isinstance(self.value.read(0), str)
+        ):
+            yield from _iter_decoded_lines(self.iter_bytes(), encoding)
+        else:
+            yield from self.value
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """
+        Yield the decompressed bytes of a bytes or binary stream source in
+        chunks. Compression is recognised by the source name's suffix or by
+        the magic bytes at the start of the data.
+        """
+        if self.kind == "bytes":
+            data = memoryview(self.value).cast("B")
+            chunks = (
+                bytes(data[i : i + DECODE_CHUNK_SIZE])
+                for i in range(0, len(data), DECODE_CHUNK_SIZE)
+            )
+        else:
+            chunks = _iter_chunks(self.value.read)
+        first = b""
+        for chunk in chunks:
+            first += chunk
+            if len(first) >= 8:
+                break
+        chunks = itertools.chain([first], chunks)
+        fmt = detect_compression(self.name, first)
+        if fmt is None:
+            return chunks
+        return _iter_decompressed(chunks, fmt, self.name)
+
+
+##############################################################################
+# PARALLEL PARSING
+##############################################################################
+
+# Smallest byte range handed to a worker when one file is parsed in parts.
+PARALLEL_MIN_CHUNK = 4 << 20
+
+
+def _section_split_points(path: str, parts: int) -> List[int]:
+    """
+    Byte offsets splitting the file at `path` into up to `parts` ranges,
+    each starting right after a close tag line. Sections do not nest, so
+    in a well-formed file every close tag ends a top-level section and no
+    range starts inside one. Returns [0, ..., size].
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [0, 0]
+        points = [0]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for k in range(1, parts):
+                pos = data.find(b"[[/", max(size * k // parts, points[-1]))
+                while pos >= 0:
+                    start = data.rfind(b"\n", 0, pos) + 1
+                    end = data.find(b"\n", pos) + 1
+                    if not end:
+                        break
+                    if not data[start:pos].strip() and SECTION_CLOSE_PATTERN.match(
+                        data[start:end].decode("latin-1").rstrip("\r\n")
+                    ):
+                        if end < size:
+                            points.append(end)
+                        break
+                    pos = data.find(b"[[/", end)
+                if pos < 0 or points[-1] >= size:
+                    break
+    points.append(size)
+    return points
+
+
+def _scan_chunk(
+    path: str, start: int, end: int, encoding: str, source_name: str
+) -> tuple:
+    """
+    Worker side of a parallel parse: scan the section headers in bytes
+    [start, end) of `path`. Returns the number of lines in the range and
+    one (section_id, tags, paths, params, is_self_closing, type_decl,
+    open_line, close_line) tuple per section, lines counted from `start`.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding=encoding).readlines()
+    records = [
+        (
+            rs["section_id"],
+            rs["tags"],
+            rs["paths"],
+            rs["params"],
+            rs["is_self_closing"],
+            rs["type_decl"],
+            rs["open_line"],
+            rs["close_line"],
+        )
+        for rs in FlexParser().iter_bracket_sections(
+            lines, source_name, collect_content=False
+        )
+    ]
+    return len(lines), records
+
+
+##############################################################################
+# FLEXTAG
+##############################################################################
+
+
+class FlexTag:
+    """
+    Main entry point for loading .flextag or .ft files or raw strings.
+    """
+
+    def __init__(self, settings: Optional[FlexTagSettings] = None):
+        self._parser = FlexParser()
+        self.settings = settings if settings else FlexTagSettings()
+
+    @classmethod
+    def load(
+        cls,
+        path: Union[str, List[str], None] = None,
+        string: Union[str, List[str], None] = None,
+        dir: Union[str, List[str], None] = None,
+        filter_query: Optional[str] = None,
+        validate: bool = True,
+        settings: Optional[FlexTagSettings] = None,
+        section_query: Optional[str] = None,
+        bundle: Union[str, List[str], None] = None,
+        source: Union[Source, List[Source], None] = None,
+        recursive: bool = False,
+        include: Union[str, List[str], None] = None,
+        exclude: Union[str, List[str], None] = None,
+        workers: int = 1,
+        lazy: bool = False,
+        cache_size: int = 128,
+        catalog: Optional[str] = None,
+        on_error: str = "raise",
+        stats: bool = False,
+    ) -> FlexView:
+        load_stats = LoadStats() if stats else None
+        if load_stats is not None:
+            started = time.perf_counter(), time.process_time()
+        if on_error not in ("raise", "collect"):
+            raise FlexTagError(
+                f"on_error must be 'raise' or 'collect', not {on_error!r}"
+            )
+        collect = on_error == "collect"
+        diagnostics: List[Diagnostic] = []
+        inst = cls(settings=settings)
+        sources = inst._gather_sources(
+            path, string, dir, source, recursive, include, exclude
+        )
+        # Sources whose leading container header fails the filter are
+        # dropped before their bodies or schema are parsed.
+        container_query = compile_query(filter_query) if filter_query else None
+        sec_query = compile_query(section_query) if section_query else None
+        containers = []
+        if lazy:
+            cache = _ContainerCache(cache_size)
+            entries = {}
+            if catalog:
+                files = [os.path.abspath(s.value) for s in sources if s.kind == "file"]
+                with Catalog(catalog, path=files, settings=inst.settings) as cat:
+                    entries = cat._file_entries()
+        source_stats = {}  # id(container) -> SourceStats
+        for src in sources:
+            rec = load_stats._add_source(src.name) if load_stats else None
+            if lazy and src.kind == "file":
+                # Filters are applied to the view below, from headers
+                metadata, headers = entries.get(
+                    os.path.abspath(src.value), (None, None)
+                )
+                containers.append(
+                    LazyContainer(src, inst, cache, validate, headers, metadata, rec)
+                )
+                continue
+            errors = [] if collect else None
+            try:
+                c = inst._parse_source(
+                    src,
+                    src.name,
+                    container_query=container_query,
+                    section_query=sec_query,
+                    workers=workers,
+                    errors=errors,
+                    stats=rec,
+                )
+            except (FlexTagError, OSError, UnicodeError) as e:
+                if not collect:
+                    raise
+                # The source as a whole is unusable, e.g. unreadable or
+                # with a broken head section; skip it.
+                errors.append(e)
+                c = None
+            if errors:
+                diagnostics.extend(Diagnostic.from_error(e, src.name) for e in errors)
+            if c is None:
+                continue
+            if sec_query is not None and not c.sections:
+                continue
+            source_stats[id(c)] = rec
+            containers.append(c)
+        if bundle:
+            from .bundle import Bundle
+
+            for b in [bundle] if isinstance(bundle, str) else bundle:
+                try:
+                    containers.extend(Bundle(b).containers(container_query, sec_query))
+                except (FlexTagError, OSError) as e:
+                    if not collect:
+                        raise
+                    diagnostics.append(Diagnostic.from_error(e, b))
+        if validate:
+            valid = []
+            for c in containers:
+                if isinstance(c, LazyContainer):
+                    valid.append(c)
+                    continue  # validated when parsed
+                try:
+                    # Structural rules need every section; with a section
+                    # query only per-section content checks can apply.
+                    with _phase(source_stats.get(id(c)), "validate"):
+                        c.validate_schema(structure=sec_query is None)
+                except FlexTagError as e:
+                    if not collect:
+                        raise
+                    diagnostics.append(Diagnostic.from_error(e, c.source_name))
+                    continue
+                valid.append(c)
+            containers = valid
+        view = FlexView(containers, settings=inst.settings)
+        view.diagnostics = diagnostics
+        view.stats = load_stats
+        if lazy and section_query:
+            view = view.filter(section_query)
+        if filter_query:
+            view = view.filter(filter_query, target="containers")
+        if load_stats is not None:
+            load_stats.wall = time.perf_counter() - started[0]
+            load_stats.cpu = time.process_time() - started[1]
+        return view
+
+    @classmethod
+    def scan(
+        cls,
+        path: Union[str, List[str], None] = None,
+        string: Union[str, List[str], None] = None,
+        dir: Union[str, List[str], None] = None,
+        headers_only: bool = True,
+        settings: Optional[FlexTagSettings] = None,
+        indexed: bool = False,
+        source: Union[Source, List[Source], None] = None,
+        recursive: bool = False,
+        include: Union[str, List[str], None] = None,
+        exclude: Union[str, List[str], None] = None,
+    ) -> Iterator[SectionHeader]:
+        """
+        Yield the user sections of each source in order, without building
+        a FlexView. With headers_only=True (the default) each item is a
+        SectionHeader carrying the section's metadata (defaults applied),
+        its line range and its byte range; bodies are not decoded, and
+        `to_section()` reads one from the source on demand. Otherwise full
+        Sections are yielded.
+
+        With indexed=True, files are read through their sidecar index
+        (see IndexedFile), which is built or updated as needed. Compressed
+        files have no index and are scanned in full.
+
+        Stream sources cannot be re-read, so they are parsed as they are
+        read and yield full Sections, each holding only its own lines.
+        Defaults apply to the sections after the defaults block.
+        """
+        inst = cls(settings=settings)
+        sources = inst._gather_sources(
+            path, string, dir, source, recursive, include, exclude
+        )
+        for src in sources:
+            if indexed and src.kind == "file" and _file_compression(src.value) is None:
+                headers = IndexedFile(src.value, settings=inst.settings).headers
+                if headers_only:
+                    yield from headers
+                else:
+                    yield from (h.to_section() for h in headers)
+            elif src.kind == "stream":
+                yield from inst._stream_sections(src)
+            elif headers_only:
+                for header in inst._scan_source(src):
+                    if header.type_name.lower() not in HEAD_SECTION_TYPES:
+                        yield header
+            else:
+                yield from inst._parse_source(src, src.name).sections
+
+    def _stream_sections(self, src: Source) -> Iterator[Section]:
+        """Parse the user sections of `src` while reading it."""
+        defaults = None
+        lines = src.iter_lines(self.settings.encoding)
+        for rs, block in self._parser.iter_line_sections(lines, src.name):
+            sec = self._make_section(rs, _LineWindow(block, rs["open_line"]), src.name)
+            stype = sec.type_name.lower()
+            if stype == "defaults" and defaults is None:
+                defaults = _parse_defaults_block(sec)
+            elif stype not in HEAD_SECTION_TYPES:
+                if defaults is not None:
+                    sec.inherit_defaults(*defaults)
+                yield sec
+
+    def _scan_source(self, src: Union[str, Source]) -> List[SectionHeader]:
+        """
+        Headers-only scan of one file, string or byte buffer (a plain str
+        is taken as a path if such a file exists). Returns a header for
+        every section, head sections included, with the source's defaults
+        applied to the user sections.
+        """
+        if isinstance(src, str):
+            src = self._guess_source(src)
+        with _instrument.span(
+            "flextag.scan",
+            lambda: {"flextag.source": src.name, "flextag.headers_only": True},
+        ) as span:
+            headers = self._scan_headers(src)
+            span.set("flextag.sections", len(headers))
+        return headers
+
+    def _scan_headers(self, src: Source) -> List[SectionHeader]:
+        """_scan_source() for a Source."""
+        encoding = src.encoding or self.settings.encoding
+        source_name = src.name
+        fmt = _file_compression(src.value) if src.kind == "file" else None
+        if src.kind == "file" and fmt is None:
+            reader = functools.partial(self._read_file_span, src.value, encoding)
+            with open(src.value, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    records = list(
+                        self._parser.iter_section_headers(data, source_name, encoding)
+                    )
+        else:
+            if src.kind == "text":
+                data = src.value.encode(encoding)
+            elif src.kind == "file":
+                # Compressed files cannot be mapped; the decompressed bytes
+                # are kept so bodies read from memory, not by re-inflating.
+                with open(src.value, "rb") as f:
+                    data = b"".join(
+                        _iter_decompressed(_iter_chunks(f.read), fmt, source_name)
+                    )
+            elif src.kind == "bytes":
+                data = b"".join(src.iter_bytes())
+            else:
+                data = "".join(src.iter_lines(encoding)).encode(encoding)
+            reader = functools.partial(self._read_bytes_span, data, encoding)
+            records = list(
+                self._parser.iter_section_headers(data, source_name, encoding)
+            )
+
+        headers = [
+            SectionHeader(
+                section_id=rs["section_id"],
+                tags=rs["tags"],
+                paths=rs["paths"],
+                parameters=rs["params"],
+                type_name=rs["type_decl"],
+                open_line=rs["open_line"],
+                close_line=rs["close_line"],
+                is_self_closing=rs["is_self_closing"],
+                source_name=source_name,
+                byte_start=rs["byte_start"],
+                byte_end=rs["byte_end"],
+                reader=reader,
+            )
+            for rs in records
+        ]
+
+        defaults = next((h for h in headers if h.type_name.lower() == "defaults"), None)
+        if defaults is not None:
+            d_meta = _parse_defaults_block(defaults.to_section())
+            if any(d_meta):
+                for h in headers:
+                    if h.type_name.lower() not in HEAD_SECTION_TYPES:
+                        h.inherit_defaults(*d_meta)
+        return headers
+
+    @staticmethod
+    def _read_file_span(path: str, encoding: str, start: int, end: int) -> str:
+        # Offsets into a compressed file refer to its decompressed bytes.
+        with open(path, "rb") as f:
+            fmt = detect_compression(path, f.peek(8)[:8])
+            if fmt is None:
+                f.seek(start)
+                return _decode_text(f.read(end - start), encoding)
+        with _open_compressed(path, fmt) as f:
+            f.seek(start)
+            return _decode_text(f.read(end - start), encoding)
+
+    @staticmethod
+    def _read_bytes_span(data: bytes, encoding: str, start: int, end: int) -> str:
+        return _decode_text(data[start:end], encoding)
+
+    def _gather_sources(
+        self,
+        path: Union[str, List[str], None],
+        string: Union[str, List[str], None],
+        dir: Union[str, List[str], None],
+        source: Union[Source, List[Source], None] = None,
+        recursive: bool = False,
+        include: Union[str, List[str], None] = None,
+        exclude: Union[str, List[str], None] = None,
+    ) -> List[Source]:
+        out = []
+        if path:
+            if isinstance(path, str):
+                out.append(Source.file(path))
+            else:
+                out.extend(Source.file(p) for p in path)
+        if string:
+            if isinstance(string, str):
+                out.append(Source.text(string))
+            else:
+                out.extend(Source.text(s) for s in string)
+        if dir:
+            for d in [dir] if isinstance(dir, str) else dir:
+                files = self._dir_files(d, recursive, include, exclude)
+                out.extend(Source.file(p) for p in files)
+        if source:
+            out.extend([source] if isinstance(source, Source) else source)
+        return out
+
+    @staticmethod
+    def _guess_source(src: str) -> Source:
+        """The pre-Source convention: a path if such a file exists, else text."""
+        if os.path.isfile(src):
+            return Source.file(src)
+        return Source.text(src)
+
+    def _dir_files(
+        self,
+        directory: str,
+        recursive: bool = False,
+        include: Union[str, List[str], None] = None,
+        exclude: Union[str, List[str], None] = None,
+    ) -> List[str]:
+        """
+        The FlexTag files in `directory` (or with `include`, the files
+        matching it), in name order, optionally descending into
+        subdirectories. Each directory is read with one os.scandir call and
+        file types come from its cached entries, so no extra stat is done
+        per file.
+
+        Glob patterns containing "/" match the path relative to
+        `directory`, others match the entry name; excluded directories are
+        not entered. Symbolic links are followed only to files inside
+        `directory`, unless allow_directory_traversal is set, which also
+        follows linked directories (each real directory is read once).
+        """
+        included = _glob_matcher(include)
+        excluded = _glob_matcher(exclude)
+        follow = self.settings.allow_directory_traversal
+        root_real = []  # resolved lazily, only if a symlink turns up
+        visited = set()
+        res = []
+
+        def inside_root(path: str) -> bool:
+            if not root_real:
+                root_real.append(os.path.realpath(directory))
+            real = os.path.realpath(path)
+            return os.path.commonpath([root_real[0], real]) == root_real[0]
+
+        def walk(path: str, rel: str):
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except (FileNotFoundError, NotADirectoryError):
+                return
+            for entry in entries:
+                name = entry.name
+                rel_name = rel + name
+                if excluded is not None and excluded(rel_name, name):
+                    continue
+                link = entry.is_symlink()
+                if link and not follow and not inside_root(entry.path):
+                    logger.debug("Skipping symlink outside %s: %s", directory, rel_name)
+                    continue
+                if recursive and entry.is_dir():
+                    if link and not follow:
+                        continue
+                    if follow:
+                        st = entry.stat()
+                        if (st.st_dev, st.st_ino) in visited:
+                            continue
+                        visited.add((st.st_dev, st.st_ino))
+                    walk(entry.path, rel_name + "/")
+                elif (
+                    included(rel_name, name)
+                    if included is not None
+                    else is_source_file_name(name)
+                ) and entry.is_file():
+                    res.append(entry.path)
+
+        if follow and recursive:
+            try:
+                st = os.stat(directory)
+                visited.add((st.st_dev, st.st_ino))
+            except OSError:
+                return res
+        walk(directory, "")
+        return res
+
+    def _parse_source(
+        self,
+        src: Union[str, Source],
+        source_name: str,
+        container_query: Optional[QueryNode] = None,
+        section_query: Optional[QueryNode] = None,
+        workers: int = 1,
+        errors: Optional[List[FlexTagSyntaxError]] = None,
+        stats: Optional[SourceStats] = None,
+    ) -> Optional[Container]:
+        """
+        Parse one source into a Container (a plain str is taken as a path
+        if such a file exists, else as content). If `container_query` is
+        given and the source starts with a container section whose metadata
+        does not match it, returns None without parsing the rest.
+        If `section_query` is given, only user sections matching it are
+        built; the others are skipped at the header.
+        With workers > 1, a large uncompressed file is split at section
+        boundaries and the headers of its parts are scanned in that many
+        processes.
+        If an `errors` list is given, sections with syntax errors are
+        skipped and their errors appended to it.
+        If `stats` is given, sizes and phase timings are recorded in it.
+        """
+        if isinstance(src, str):
+            src = self._guess_source(src)
+        with _instrument.span(
+            "flextag.load_source",
+            lambda: {"flextag.source": source_name, "flextag.source.kind": src.kind},
+        ) as span:
+            if stats is None:
+                container = self._parse_lines(
+                    src, source_name, container_query, section_query, workers, errors
+                )
+            else:
+                if src.kind == "file":
+                    stats.bytes = os.path.getsize(src.value)
+                elif src.kind == "bytes":
+                    stats.bytes = memoryview(src.value).nbytes
+                elif src.kind == "text":
+                    stats.bytes = len(src.value)
+                self._parser.stats = stats
+                try:
+                    container = self._parse_lines(
+                        src,
+                        source_name,
+                        container_query,
+                        section_query,
+                        workers,
+                        errors,
+                        stats,
+                    )
+                finally:
+                    self._parser.stats = None
+            if container is not None:
+                span.set("flextag.sections", len(container.sections))
+            return container
+
+    def _parse_lines(
+        self,
+        src: Source,
+        source_name: str,
+        container_query: Optional[QueryNode],
+        section_query: Optional[QueryNode],
+        workers: int,
+        errors: Optional[List[FlexTagSyntaxError]],
+        stats: Optional[SourceStats] = None,
+    ) -> Optional[Container]:
+        """_parse_source() for a Source, once the parser is set up."""
+        if workers > 1 and src.kind == "file" and _file_compression(src.value) is None:
+            if container_query is not None:
+                line_iter = src.iter_lines(self.settings.encoding)
+                head = self._read_first_section(line_iter)
+                line_iter.close()
+                if self._rejects_head(head, source_name, container_query):
+                    logger.debug("Skipping %s: container filter rejected.", src.name)
+                    return None
+                container_query = None
+            container = self._parse_parallel(
+                src, source_name, workers, section_query, stats
+            )
+            if container is not None:
+                return container
+        if src.kind == "text":
+            logger.debug("Parsing raw string input.")
+            with _phase(stats, "read"):
+                lines = src.value.splitlines(keepends=True)
+        else:
+            logger.debug("Parsing %s: %s", src.kind, src.name)
+            line_iter = src.iter_lines(self.settings.encoding)
+            lines = []
+            if container_query is not None:
+                # Read just the first section before committing to the
+                # whole source.
+                with _phase(stats, "read"):
+                    lines = self._read_first_section(line_iter)
+                if self._rejects_head(lines, source_name, container_query):
+                    logger.debug("Skipping %s: container filter rejected.", src.name)
+                    line_iter.close()
+                    return None
+                container_query = None
+            with _phase(stats, "read"):
+                lines.extend(line_iter)
+            if stats is not None and src.kind == "stream":
+                stats.bytes = sum(map(len, lines))
+
+        if container_query is not None and self._rejects_head(
+            lines, source_name, container_query
+        ):
+            logger.debug("Skipping string source: container filter rejected.")
+            return None
+
+        raw_secs = self._parser.iter_bracket_sections(
+            lines, source_name, collect_content=False, errors=errors
+        )
+        return self._build_container(raw_secs, lines, source_name, section_query, stats)
+
+    def _build_container(
+        self,
+        raw_secs: Iterator[Dict[str, Any]],
+        lines: List[str],
+        source_name: str,
+        section_query: Optional[QueryNode],
+        stats: Optional[SourceStats] = None,
+    ) -> Container:
+        with _phase(stats, "scan"), _instrument.span(
+            "flextag.scan",
+            lambda: {"flextag.source": source_name, "flextag.headers_only": False},
+        ) as span:
+            if section_query is None:
+                sections = [
+                    self._make_section(rs, lines, source_name) for rs in raw_secs
+                ]
+            else:
+                sections = self._select_sections(
+                    list(raw_secs), lines, source_name, section_query
+                )
+            span.set("flextag.sections", len(sections))
+        with _instrument.span(
+            "flextag.build_container",
+            lambda: {"flextag.source": source_name, "flextag.sections": len(sections)},
+        ):
+            container = Container(sections, source_name, stats)
+        if section_query is None:
+            container._lines = lines
+        if stats is not None:
+            stats.lines = len(lines)
+            stats.sections = len(container.sections)
+            for sec in container.sections:
+                sec._stats = stats
+        return container
+
+    def _parse_parallel(
+        self,
+        src: Source,
+        source_name: str,
+        workers: int,
+        section_query: Optional[QueryNode],
+        stats: Optional[SourceStats] = None,
+    ) -> Optional[Container]:
+        """
+        Parse a file by scanning its section headers in up to `workers`
+        processes, one byte range each, while this process reads the file's
+        lines; the records are merged in file order and the Sections are
+        built here, serially, into one Container.
+        Returns None if the file is too small to split, a range fails to
+        parse or the worker pool breaks; the caller then parses serially,
+        so errors are reported with their exact location.
+        """
+        path = src.value
+        encoding = src.encoding or self.settings.encoding
+        parts = min(workers, os.path.getsize(path) // PARALLEL_MIN_CHUNK)
+        if parts < 2:
+            return None
+        points = _section_split_points(path, parts)
+        if len(points) < 3:
+            return None
+        logger.debug("Scanning %s in %s parts", src.name, len(points) - 1)
+        try:
+            with ProcessPoolExecutor(max_workers=len(points) - 1) as pool:
+                futures = [
+                    pool.submit(_scan_chunk, path, start, end, encoding, source_name)
+                    for start, end in zip(points, points[1:])
+                ]
+                with open(path, encoding=encoding) as f:
+                    lines = f.readlines()
+                results = [future.result() for future in futures]
+        except (FlexTagError, BrokenProcessPool):
+            # A syntax error, or no usable worker processes (e.g. the spawn
+            # start method without an importable __main__)
+            logger.debug("Parallel scan of %s failed; parsing serially", src.name)
+            return None
+
+        def records():
+            base = 0
+            for line_count, chunk in results:
+                for sid, tags, paths, params, closing, tdecl, o, c in chunk:
+                    yield {
+                        "section_id": sid,
+                        "tags": tags,
+                        "paths": paths,
+                        "params": params,
+                        "open_line": o + base,
+                        "close_line": c + base,
+                        "is_self_closing": closing,
+                        "type_decl": tdecl,
+                    }
+                base += line_count
+
+        return self._build_container(
+            records(), lines, source_name, section_query, stats
+        )
+
+    def _select_sections(
+        self,
+        raw_secs: List[Dict[str, Any]],
+        lines: List[str],
+        source_name: str,
+        query: QueryNode,
+    ) -> List[Section]:
+        """
+        Build Sections only for head sections and for user sections whose
+        header metadata, with defaults applied, matches `query`.
+        """
+        defaults = ("", [], [], {})
+        for rs in raw_secs:
+            if rs["type_decl"].strip().lower() == "defaults":
+                defaults = _parse_defaults_block(
+                    self._make_section(rs, lines, source_name)
+                )
+
+        sections = []
+        for rs in raw_secs:
+            if rs["type_decl"].strip().lower() in HEAD_SECTION_TYPES:
+                sections.append(self._make_section(rs, lines, source_name))
+                continue
+            header = SectionHeader(
+                section_id=rs["section_id"],
+                tags=rs["tags"],
+                paths=rs["paths"],
+                parameters=rs["params"],
+                type_name=rs["type_decl"],
+                open_line=rs["open_line"],
+                close_line=rs["close_line"],
+                is_self_closing=rs["is_self_closing"],
+                source_name=source_name,
+                all_lines=lines,
+            )
+            header.inherit_defaults(*defaults)
+            if query.matches(header):
+                sections.append(header.to_section())
+        return sections
+
+    @staticmethod
+    def _make_section(rs: Dict[str, Any], lines: List[str], source_name: str):
+        return Section(
+            section_id=rs["section_id"],
+            tags=rs["tags"],
+            paths=rs["paths"],
+            parameters=rs["params"],
+            type_name=rs["type_decl"],
+            open_line=rs["open_line"],
+            close_line=rs["close_line"],
+            is_self_closing=rs["is_self_closing"],
+            all_lines=lines,
+            source_name=source_name,
+        )
+
+    @staticmethod
+    def _read_first_section(f) -> List[str]:
+        """
+        Read lines from `f` up to and including the close of the first
+        section (or a self-closing first section).
+        """
+        lines = []
+        opened = False
+        for line in f:
+            lines.append(line)
+            if SECTION_CLOSE_PATTERN.match(line):
+                break
+            if not opened:
+                m_open = SECTION_OPEN_PATTERN.match(line)
+                if m_open:
+                    opened = True
+                    if (m_open.group(1) or "").strip().endswith("/"):
+                        break
+        return lines
+
+    def _rejects_head(
+        self, lines: List[str], source_name: str, query: QueryNode
+    ) -> bool:
+        """
+        True if the source's first section is a container section whose
+        metadata does not match `query`. Sources that do not start with a
+        container section are never rejected here.
+        """
+        first = next(self._parser.iter_bracket_sections(lines, source_name), None)
+        if first is None or first["type_decl"].strip().lower() != "container":
+            return False
+        head = Container([self._make_section(first, lines, source_name)], source_name)
+        return not query.matches(head, hierarchical_paths=False)
+
+
+##############################################################################
+# CATALOG
+##############################################################################
+
+
+def _header_terms(item: Any, hierarchical_paths: bool = True) -> set:
+    """
+    Lookup keys for an item's tags ("#name"), paths ("@name", plus parent
+    paths when hierarchical) and ID ("=id"), as stored by Catalog.
+    """
+    terms = {"=" + item.id}
+    for t in item.tags:
+        terms.add("#" + (t[1:] if t.startswith("#") else t))
+    for p in item.paths:
+        p_val = p[1:] if p.startswith("@") or p.startswith(".") else p
+        terms.add("@" + p_val)
+        while hierarchical_paths and "." in p_val:
+            p_val = p_val.rsplit(".", 1)[0]
+            terms.add("@" + p_val)
+    return terms
+
+
+def _required_terms(node: QueryNode) -> set:
+    """
+    Lookup keys that every item matching `node` must have. Used to narrow
+    catalog lookups before the full query is evaluated.
+    """
+    if isinstance(node, _TagTerm):
+        return {"#" + node.name}
+    if isinstance(node, _PathTerm):
+        return {"@" + node.name}
+    if isinstance(node, _IdTerm):
+        return {"=" + node.name}
+    if isinstance(node, _AndNode):
+        out = set()
+        for child in node.children:
+            out |= _required_terms(child)
+        return out
+    return set()
+
+
+class Catalog:
+    """
+    Persistent SQLite catalog of the section headers in a set of FlexTag
+    files, for lookups across many files without loading them.
+
+    For each file the catalog records its size and modification time, its
+    container metadata, and the header (metadata with defaults applied,
+    line range and byte range) of each user section. `refresh()` re-scans
+    only files that were added or changed since the last refresh. `find()`
+    answers queries from the catalog and reads just the matching sections'
+    bodies from their files.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(
+        self,
+        db_path: str,
+        dir: Union[str, List[str], None] = None,
+        path: Union[str, List[str], None] = None,
+        settings: Optional[FlexTagSettings] = None,
+        refresh: bool = True,
+    ):
+        self.db_path = db_path
+        self._flextag = FlexTag(settings=settings)
+        self._dirs = [dir] if isinstance(dir, str) else list(dir or [])
+        self._paths = [path] if isinstance(path, str) else list(path or [])
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._create_tables()
+        if refresh:
+            self.refresh()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def _create_tables(self):
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, self.SCHEMA_VERSION):
+            # Written by another version; rebuild from the files.
+            self._db.executescript(
+                "DROP TABLE IF EXISTS terms;"
+                "DROP TABLE IF EXISTS sections;"
+                "DROP TABLE IF EXISTS files;"
+            )
+        self._db.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                container TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sections (
+                id INTEGER PRIMARY KEY,
+                file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+                ordinal INTEGER NOT NULL,
+                header TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT NOT NULL,
+                section_id INTEGER NOT NULL
+                    REFERENCES sections(id) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS sections_file ON sections(file_id);
+            CREATE INDEX IF NOT EXISTS terms_term ON terms(term, section_id);
+            CREATE INDEX IF NOT EXISTS terms_section ON terms(section_id);
+            PRAGMA user_version = {self.SCHEMA_VERSION};
+            """
+        )
+
+    def _source_files(self) -> List[str]:
+        files = [os.path.abspath(p) for p in self._paths]
+        for d in self._dirs:
+            files.extend(os.path.abspath(p) for p in self._flextag._dir_files(d))
+        return sorted(set(files))
+
+    def refresh(self) -> int:
+        """
+        Bring the catalog up to date with the files on disk: index new
+        files, re-index files whose size or mtime changed, and drop files
+        that no longer exist. Returns the number of files (re-)indexed.
+        """
+        known = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self._db.execute(
+                "SELECT path, mtime_ns, size FROM files"
+            )
+        }
+        current = self._source_files()
+        changed = []
+        for path in current:
+            st = os.stat(path)
+            if known.get(path) != (st.st_mtime_ns, st.st_size):
+                changed.append(path)
+        removed = set(known) - set(current)
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM files WHERE path = ?", [(p,) for p in removed]
+            )
+            for path in changed:
+                self._index_file(path)
+        logger.debug(
+            "Catalog refresh: %s indexed, %s removed.", len(changed), len(removed)
+        )
+        return len(changed)
+
+    def _index_file(self, path: str):
+        """(Re-)index one file. Must run inside a transaction."""
+        st = os.stat(path)
+        headers = self._flextag._scan_source(path)
+        container = {"id": "", "tags": [], "paths": [], "parameters": {}}
+        head = [h for h in headers if h.type_name.lower() == "container"]
+        if head:
+            c = Container([head[0].to_section()], path)
+            container = {
+                "id": c.id,
+                "tags": c.tags,
+                "paths": c.paths,
+                "parameters": c.parameters,
+            }
+
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        file_id = self._db.execute(
+            "INSERT INTO files (path, mtime_ns, size, container) VALUES (?, ?, ?, ?)",
+            (path, st.st_mtime_ns, st.st_size, json.dumps(container)),
+        ).lastrowid
+        ordinal = 0
+        for h in headers:
+            if h.type_name.lower() in HEAD_SECTION_TYPES:
+                continue
+            record = [
+                h.id,
+                h.tags,
+                h.paths,
+                h.parameters,
+                h.type_name,
+                h.open_line,
+                h.close_line,
+                h.is_self_closing,
+                h.byte_start,
+                h.byte_end,
+            ]
+            section_id = self._db.execute(
+                "INSERT INTO sections (file_id, ordinal, header) VALUES (?, ?, ?)",
+                (file_id, ordinal, json.dumps(record)),
+            ).lastrowid
+            self._db.executemany(
+                "INSERT INTO terms (term, section_id) VALUES (?, ?)",
+                [(t, section_id) for t in _header_terms(h)],
+            )
+            ordinal += 1
+
+    def find(
+        self,
+        query: Optional[str] = None,
+        filter_query: Optional[str] = None,
+        headers_only: bool = False,
+    ) -> List[SectionHeader]:
+        """
+        Return the cataloged sections matching `query`, in file and source
+        order. `filter_query` restricts the search to files whose container
+        metadata matches it, as with load(filter_query=...).
+
+        Sections are read and decoded from their files only if they match;
+        with headers_only=True, SectionHeaders are returned and nothing is
+        read. Matched files that changed since the last refresh are
+        re-indexed first.
+        """
+        sec_query = compile_query(query) if query else _MatchAll()
+        file_query = compile_query(filter_query) if filter_query else None
+
+        while True:
+            hits = self._lookup(sec_query, file_query)
+            stale = [p for p in {h.source_name for h in hits} if self._is_stale(p)]
+            if not stale:
+                break
+            with self._db:
+                for path in stale:
+                    if os.path.isfile(path):
+                        self._index_file(path)
+                    else:
+                        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+        if headers_only:
+            return hits
+        return [h.to_section() for h in hits]
+
+    def _lookup(
+        self, sec_query: QueryNode, file_query: Optional[QueryNode]
+    ) -> List[SectionHeader]:
+        terms = sorted(_required_terms(sec_query))
+        sql = (
+            "SELECT f.path, f.container, s.header FROM sections s"
+            " JOIN files f ON f.id = s.file_id"
+        )
+        if terms:
+            subquery = " INTERSECT ".join(
+                ["SELECT section_id FROM terms WHERE term = ?"] * len(terms)
+            )
+            sql += f" WHERE s.id IN ({subquery})"
+        sql += " ORDER BY f.path, s.ordinal"
+
+        encoding = self._flextag.settings.encoding
+        file_ok: Dict[str, bool] = {}
+        hits = []
+        for path, container, header in self._db.execute(sql, terms):
+            if file_query is not None:
+                if path not in file_ok:
+                    c = json.loads(container)
+                    head = SectionHeader(
+                        section_id=c["id"],
+                        tags=c["tags"],
+                        paths=c["paths"],
+                        parameters=c["parameters"],
+                        type_name="container",
+                        open_line=0,
+                        close_line=0,
+                        is_self_closing=False,
+                        source_name=path,
+                    )
+                    file_ok[path] = file_query.matches(head, hierarchical_paths=False)
+                if not file_ok[path]:
+                    continue
+            (
+                section_id,
+                tags,
+                paths,
+                params,
+                type_name,
+                open_line,
+                close_line,
+                is_self_closing,
+                byte_start,
+                byte_end,
+            ) = json.loads(header)
+            h = SectionHeader(
+                section_id=section_id,
+                tags=tags,
+                paths=paths,
+                parameters=params,
+                type_name=type_name,
+                open_line=open_line,
+                close_line=close_line,
+                is_self_closing=is_self_closing,
+                source_name=path,
+                byte_start=byte_start,
+                byte_end=byte_end,
+                reader=functools.partial(FlexTag._read_file_span, path, encoding),
+            )
+            if sec_query.matches(h):
+                hits.append(h)
+        return hits
+
+    def _file_entries(self) -> Dict[str, tuple]:
+        """
+        Per cataloged file: ((id, tags, paths, parameters) of its container
+        section, [its user section headers]).
+        """
+        out = {}
+        for path, container in self._db.execute("SELECT path, container FROM files"):
+            c = json.loads(container)
+            out[path] = ((c["id"], c["tags"], c["paths"], c["parameters"]), [])
+        for h in self._lookup(_MatchAll(), None):
+            out[h.source_name][1].append(h)
+        return out
 
-        result = {}
+    def _is_stale(self, path: str) -> bool:
+        row = self._db.execute(
+            "SELECT mtime_ns, size FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        return row is None or (st.st_mtime_ns, st.st_size) != tuple(row)
 
-        for id_val, items in collected.items():
-            if id_val == "":
-                # Handle anonymous sections directly
-                if len(items) == 1:
-                    result[""] = items[0]  # Store single item directly
-                else:
-                    result[""] = items  # Store multiple items as a list
-            else:
-                # Handle sections with IDs with the original approach
-                if len(items) == 1:
-                    final_obj = items[0]  # single item
-                else:
-                    final_obj = items  # repeated => entire list
-                segs = id_val.split(".")
-                insert_nested(result, segs, final_obj)
 
-        return result
+##############################################################################
+# INDEXED FILES
+##############################################################################
 
-    def to_flexmap(self) -> "FlexMap":
+INDEX_SUFFIX = ".ftidx"
+INDEX_VERSION = 1
+# Bytes hashed from each end of the indexed range to detect rewrites.
+INDEX_SAMPLE_SIZE = 4096
+
+
+def _sample_digest(f, end: int) -> str:
+    """Digest of the first and last INDEX_SAMPLE_SIZE bytes before `end`."""
+    digest = hashlib.blake2b(str(end).encode(), digest_size=16)
+    f.seek(0)
+    digest.update(f.read(min(end, INDEX_SAMPLE_SIZE)))
+    if end > INDEX_SAMPLE_SIZE:
+        f.seek(max(end - INDEX_SAMPLE_SIZE, INDEX_SAMPLE_SIZE))
+        digest.update(f.read(end - f.tell()))
+    return digest.hexdigest()
+
+
+def _header_record(h: SectionHeader) -> list:
+    return [
+        h.raw_id,
+        h.raw_tags,
+        h.raw_paths,
+        h.raw_parameters,
+        h.raw_type_name,
+        h.open_line,
+        h.close_line,
+        h.is_self_closing,
+        h.byte_start,
+        h.byte_end,
+    ]
+
+
+class IndexedFile:
+    """
+    A FlexTag file with a sidecar offset index (`<path>.ftidx`), for
+    querying and tailing large or growing files without re-parsing them.
+
+    The sidecar is a JSON-lines file holding a format line, one record per
+    section (its own metadata, line range and byte range) and checkpoints.
+    A checkpoint records how far the file was indexed, and the file's size,
+    mtime and a digest sampled from the indexed bytes. Records after the
+    last checkpoint are ignored, so an interrupted update is harmless.
+
+    `refresh()` compares the file with the last checkpoint: an unchanged
+    file is left alone, a file that only grew is scanned from the
+    checkpoint on, and anything else is re-indexed from the start.
+
+    Records are kept as loaded; SectionHeaders and the in-memory lookup
+    by ID, tag and path (as Catalog uses) are built when first needed, so
+    `get()` and `find()` seek to and decode only the sections they return.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        settings: Optional[FlexTagSettings] = None,
+        save: bool = True,
+    ):
+        if _file_compression(path) is not None:
+            raise FlexTagError(f"{path} is compressed and cannot be indexed")
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.settings = settings if settings else FlexTagSettings()
+        self._save = save
+        self._parser = FlexParser()
+        self._reader = functools.partial(
+            FlexTag._read_file_span, path, self.settings.encoding
+        )
+        self._checkpoint: Optional[Dict[str, Any]] = None
+        self._reset()
+
+        records, checkpoint = self._read_sidecar()
+        if checkpoint is not None and self._is_current(checkpoint):
+            self._checkpoint = checkpoint
+            self._add(records)
+        self._update()
+
+    def _reset(self):
+        self._records: List[list] = []  # every section, head sections included
+        self._user: List[int] = []  # positions of user sections in _records
+        self._headers: Dict[int, SectionHeader] = {}
+        self._defaults: Optional[tuple] = None
+        # "#tag", "@path" and "=id" lookup keys -> positions in `_user`,
+        # covering the first `_terms_upto` user sections.
+        self._terms: Dict[str, array] = {}
+        self._terms_upto = 0
+        # Section ID -> positions in `_user`, for get(); built from records.
+        self._ids: Dict[str, List[int]] = {}
+        self._ids_upto = 0
+
+    @property
+    def headers(self) -> List[SectionHeader]:
+        """Headers of the indexed user sections, with defaults applied."""
+        return [self._header(i) for i in range(len(self._user))]
+
+    def refresh(self) -> List[SectionHeader]:
         """
-        Convert all raw_sections into a nested FlexMap.
-        If an ID is 'my_id' with no dots, we store the section
-        directly in fm["my_id"]. If an ID is 'my.nested.id', we nest
-        children accordingly.
+        Bring the index up to date with the file and return the headers of
+        the user sections found since the last refresh. A section still
+        being written at the end of the file is picked up once complete.
         """
-        logger.debug("Converting view to FlexMap.")
-        fm = FlexMap()
+        return [self._header(i) for i in self._update()]
 
-        for sec in self._raw_sections:
-            # Skip head sections
-            s_type = sec.type_name.lower()
-            if s_type in ("container", "defaults", "schema"):
-                continue
+    def get(self, section_id: str) -> List[Section]:
+        """
+        Return the sections with ID `section_id`, reading only those
+        sections from the file.
+        """
+        self._update()
+        ids, records, user = self._ids, self._records, self._user
+        default_id = self._defaults[0] if self._defaults else ""
+        for i in range(self._ids_upto, len(user)):
+            ids.setdefault(records[user[i]][0] or default_id, []).append(i)
+        self._ids_upto = len(user)
+        return [self._header(i).to_section() for i in ids.get(section_id, ())]
+
+    def find(
+        self, query: Optional[str] = None, headers_only: bool = False
+    ) -> List[SectionHeader]:
+        """
+        Return the user sections matching `query`, in file order, after
+        picking up anything appended to the file. Tags, paths and IDs the
+        query requires narrow the candidates through the lookup index.
+        Only matching sections are read from the file; with
+        headers_only=True nothing is read.
+        """
+        self._update()
+        node = compile_query(query) if query else _MatchAll()
+        terms = _required_terms(node)
+        if terms:
+            positions = self._lookup_terms(terms)
+        else:
+            positions = range(len(self._user))
+        hits = [h for h in map(self._header, positions) if node.matches(h)]
+        if headers_only:
+            return hits
+        return [h.to_section() for h in hits]
 
-            # If section has no ID, skip or store in anonymous
-            if not sec.id:
+    def _update(self) -> range:
+        """
+        Index whatever the file gained since the last checkpoint (or all of
+        it, if the checkpoint no longer matches). Returns the positions of
+        the new user sections.
+        """
+        st = os.stat(self.path)
+        cp = self._checkpoint
+        if cp is not None and (cp["size"], cp["mtime_ns"]) == (
+            st.st_size,
+            st.st_mtime_ns,
+        ):
+            return range(0)
+        if cp is not None and not self._is_current(cp):
+            logger.debug("Index of %s is stale; rebuilding.", self.path)
+            cp = None
+        if cp is None:
+            self._reset()
+            offset, line_no = 0, 0
+        else:
+            offset, line_no = cp["offset"], cp["line"]
+
+        records = []
+        if st.st_size > offset:
+            with open(self.path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    records = [
+                        [
+                            rs["section_id"],
+                            rs["tags"],
+                            rs["paths"],
+                            rs["params"],
+                            rs["type_decl"],
+                            rs["open_line"],
+                            rs["close_line"],
+                            rs["is_self_closing"],
+                            rs["byte_start"],
+                            rs["byte_end"],
+                        ]
+                        for rs in self._parser.iter_section_headers(
+                            data,
+                            self.path,
+                            self.settings.encoding,
+                            offset=offset,
+                            line_no=line_no,
+                            partial=True,
+                        )
+                    ]
+        if records:
+            offset, line_no = records[-1][9], records[-1][6] + 1
+        return self._commit(records, offset, line_no, rewrite=cp is None)
+
+    def _commit(
+        self, records: List[list], offset: int, line_no: int, rewrite: bool
+    ) -> range:
+        """
+        Add section `records` (which end at byte `offset`, line `line_no`)
+        to the index, checkpoint it and persist both to the sidecar.
+        """
+        new = self._add(records)
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._checkpoint = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "offset": offset,
+                "line": line_no,
+                "digest": _sample_digest(f, offset),
+            }
+        if self._save:
+            self._write_sidecar(self._records if rewrite else records, rewrite)
+        return new
+
+    def _add(self, records: List[list]) -> range:
+        first = len(self._user)
+        for record in records:
+            pos = len(self._records)
+            self._records.append(record)
+            stype = record[4].strip().lower()
+            if stype not in HEAD_SECTION_TYPES:
+                self._user.append(pos)
+            elif stype == "defaults" and self._defaults is None:
+                self._defaults = _parse_defaults_block(
+                    self._from_record(record).to_section()
+                )
+                # Earlier sections inherit these defaults too.
+                self._headers = {}
+                self._terms, self._terms_upto = {}, 0
+                self._ids, self._ids_upto = {}, 0
+        return range(first, len(self._user))
+
+    def _header(self, i: int) -> SectionHeader:
+        """The header of the i-th user section, with defaults applied."""
+        h = self._headers.get(i)
+        if h is None:
+            h = self._headers[i] = self._from_record(self._records[self._user[i]])
+            if self._defaults is not None:
+                h.inherit_defaults(*self._defaults)
+        return h
+
+    def _lookup_terms(self, terms: set) -> List[int]:
+        """Positions of the user sections having every key in `terms`."""
+        index = self._terms
+        for i in range(self._terms_upto, len(self._user)):
+            for t in _header_terms(self._header(i)):
+                postings = index.get(t)
+                if postings is None:
+                    postings = index[t] = array("I")
+                postings.append(i)
+        self._terms_upto = len(self._user)
+        postings = sorted((index.get(t, ()) for t in terms), key=len)
+        return sorted(set(postings[0]).intersection(*postings[1:]))
+
+    def _from_record(self, record: list) -> SectionHeader:
+        (
+            section_id,
+            tags,
+            paths,
+            params,
+            type_name,
+            open_line,
+            close_line,
+            is_self_closing,
+            byte_start,
+            byte_end,
+        ) = record
+        return SectionHeader(
+            section_id=section_id,
+            tags=tags,
+            paths=paths,
+            parameters=params,
+            type_name=type_name,
+            open_line=open_line,
+            close_line=close_line,
+            is_self_closing=is_self_closing,
+            source_name=self.path,
+            byte_start=byte_start,
+            byte_end=byte_end,
+            reader=self._reader,
+        )
+
+    def _is_current(self, cp: Dict[str, Any]) -> bool:
+        """True if the bytes indexed at checkpoint `cp` are unchanged."""
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < cp["offset"]:
+                    return False
+                return _sample_digest(f, cp["offset"]) == cp["digest"]
+        except OSError:
+            return False
+
+    def _read_sidecar(self) -> tuple:
+        """Return the committed section records and the last checkpoint."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except OSError:
+            return [], None
+        try:
+            head = json.loads(lines[0])
+        except ValueError:
+            return [], None
+        if head != {"format": "flextag-index", "version": INDEX_VERSION}:
+            return [], None
+
+        # The last element is empty unless the final write was torn.
+        records, pending, checkpoint = [], [], None
+        for line in itertools.islice(lines, 1, len(lines) - 1):
+            if line.startswith("["):
+                pending.append(line)
                 continue
+            try:
+                checkpoint = json.loads(line)["checkpoint"]
+                batch = json.loads("[" + ",".join(pending) + "]")
+            except (ValueError, KeyError):
+                break
+            end = records[-1][9] if records else 0
+            for r in batch:
+                # Skip records a concurrent update already committed.
+                if r[8] >= end and r[9] <= checkpoint["offset"]:
+                    records.append(r)
+                    end = r[9]
+            pending = []
+        return records, checkpoint
+
+    def _write_sidecar(self, records: List[list], rewrite: bool):
+        lines = [json.dumps(r) for r in records]
+        lines.append(json.dumps({"checkpoint": self._checkpoint}))
+        text = "\n".join(lines) + "\n"
+        try:
+            if rewrite:
+                tmp_path = self.index_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(
+                        json.dumps(
+                            {"format": "flextag-index", "version": INDEX_VERSION}
+                        )
+                    )
+                    f.write("\n" + text)
+                os.replace(tmp_path, self.index_path)
+            else:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(text)
+        except OSError as e:
+            logger.warning("Could not write index %s: %s", self.index_path, e)
 
-            # Split on dot
-            segs = sec.id.split(".")
-            top_key = segs[0]
 
-            # Ensure a top-level FlexPoint for that top_key
-            if top_key not in fm:
-                fm[top_key] = FlexPoint(parent_map=fm, full_path=f'["{top_key}"]')
+class AppendWriter:
+    """
+    Appends well-formed sections to a FlexTag file (e.g. a log) and keeps
+    its sidecar index (see IndexedFile) up to date, so readers resume from
+    the last indexed offset instead of re-scanning the file.
 
-            node = fm[top_key]
-            prefix = f'["{top_key}"]'
+    Appended data is flushed and fsync'ed every `sync_every` sections, on
+    `sync()` and on `close()`; the index is checkpointed only after the
+    data it covers is on disk. Use one writer per file.
 
-            # If the ID has multiple segments (e.g. 'a.b.c'),
-            # descend into node.children for segs[1:-1].
-            for sub in segs[1:-1]:
-                if sub not in node.children:
-                    child_path = prefix + f'["{sub}"]'
-                    node.children[sub] = FlexPoint(parent_map=fm, full_path=child_path)
-                node = node.children[sub]
-                prefix += f'["{sub}"]'
+    A file that ends in an incomplete section (e.g. after a crash) is
+    refused unless `repair=True`, which truncates it to the end of its last
+    complete section.
+    """
 
-            # Now handle the last segment. If there's only 1 segment,
-            # we add the Section directly to the top-level node.
-            if len(segs) == 1:
-                node.add_section(sec)
-            else:
-                last_seg = segs[-1]
-                if last_seg not in node.children:
-                    child_path = prefix + f'["{last_seg}"]'
-                    node.children[last_seg] = FlexPoint(
-                        parent_map=fm, full_path=child_path
-                    )
-                node.children[last_seg].add_section(sec)
+    def __init__(
+        self,
+        path: str,
+        sync_every: int = 64,
+        settings: Optional[FlexTagSettings] = None,
+        repair: bool = False,
+    ):
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        if not os.path.exists(path):
+            open(path, "ab").close()
+        self.index = IndexedFile(path, settings=settings)
+        self._encoding = self.index.settings.encoding
+        self._pending: List[SectionHeader] = []
+
+        cp = self.index._checkpoint
+        with open(path, "rb") as f:
+            f.seek(cp["offset"])
+            tail = f.read()
+        if not _is_filler(tail.decode(self._encoding, "replace").splitlines()):
+            if not repair:
+                raise FlexTagError(
+                    f"{path} ends with an incomplete section after byte "
+                    f"{cp['offset']}; open with repair=True to truncate it"
+                )
+            logger.warning("Truncating incomplete section at the end of %s", path)
+            os.truncate(path, cp["offset"])
+            tail = b""
 
-        fm.load_all_rows()
-        return fm
+        self._file = open(path, "ab")
+        self._size = cp["offset"] + len(tail)
+        self._line = cp["line"] + tail.count(b"\n")
+        if tail and not tail.endswith(b"\n"):
+            self._file.write(b"\n")
+            self._size += 1
+            self._line += 1
+
+    def __enter__(self) -> "AppendWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def append(self, section: Section) -> SectionHeader:
+        """
+        Append `section` (rendered as by Section.to_flextag()) and return
+        its header, positioned in this file.
+        """
+        text = section.to_flextag()
+        data = text.encode(self._encoding)
+        lines = text.splitlines(keepends=True)
+        # Offsets span the section's block, from its open tag to its close
+        # tag, whatever surrounds it in the rendered text.
+        open_at = next(
+            i for i, ln in enumerate(lines) if SECTION_OPEN_PATTERN.match(ln)
+        )
+        is_self_closing = (
+            SECTION_OPEN_PATTERN.match(lines[open_at]).group(1).strip().endswith("/")
+        )
+        close_at = open_at
+        if not is_self_closing:
+            close_at = max(
+                i for i, ln in enumerate(lines) if SECTION_CLOSE_PATTERN.match(ln)
+            )
+        encoding = self._encoding
+        byte_start = self._size + len("".join(lines[:open_at]).encode(encoding))
+        byte_end = byte_start + len(
+            "".join(lines[open_at : close_at + 1]).encode(encoding)
+        )
+        header = SectionHeader(
+            section_id=section.raw_id,
+            tags=section.raw_tags,
+            paths=section.raw_paths,
+            parameters=section.raw_parameters,
+            type_name=section.raw_type_name,
+            open_line=self._line + open_at,
+            close_line=self._line + close_at,
+            is_self_closing=is_self_closing,
+            source_name=self.path,
+            byte_start=byte_start,
+            byte_end=byte_end,
+            reader=self.index._reader,
+        )
+        self._file.write(data)
+        self._size += len(data)
+        self._line += len(lines)
+        self._pending.append(header)
+        if len(self._pending) >= self.sync_every:
+            self.sync()
+        return header
+
+    def add(
+        self,
+        section_id: str = "",
+        content: Any = None,
+        type_name: str = "raw",
+        tags: Optional[List[str]] = None,
+        paths: Optional[List[str]] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> SectionHeader:
+        """
+        Append a new section built from the given metadata and content;
+        with no content it is written self-closing.
+        """
+        section = Section(
+            section_id=section_id,
+            tags=tags or [],
+            paths=paths or [],
+            parameters=parameters or {},
+            type_name=type_name,
+            open_line=0,
+            close_line=0,
+            is_self_closing=content is None,
+            all_lines=[],
+        )
+        if content is not None:
+            section.content = content
+        return self.append(section)
+
+    def sync(self):
+        """Flush and fsync appended sections, then checkpoint the index."""
+        if not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.index._commit(
+            [_header_record(h) for h in self._pending],
+            self._size,
+            self._line,
+            rewrite=False,
+        )
+        self._pending = []
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
 
 
 ##############################################################################
-# FLEXTAG
+# WATCHING
 ##############################################################################
 
 
-class FlexTag:
+class PollingBackend:
     """
-    Main entry point for loading .flextag or .ft files or raw strings.
+    Change detection for Watcher by polling: every `interval` seconds each
+    watched file is stat'ed and compared by mtime and size. With
+    `hash=True` a file whose stat changed is also hashed and counts as
+    changed only if its content differs, so touching or rewriting a file
+    with the same content does not reload it.
+
+    Other backends (e.g. one waiting on inotify events) provide the same
+    two methods: `wait(stop)` blocks until a check is due and returns False
+    once `stop` is set; `fingerprint(path, previous)` returns a
+    (stat, key) pair, and the file is re-parsed when the key changes.
     """
 
-    def __init__(self, settings: Optional[FlexTagSettings] = None):
-        self._parser = FlexParser()
-        self.settings = settings if settings else FlexTagSettings()
+    def __init__(self, interval: float = 1.0, hash: bool = False):
+        self.interval = interval
+        self.hash = hash
 
-    @classmethod
-    def load(
-        cls,
-        path: Union[str, List[str], None] = None,
-        string: Union[str, List[str], None] = None,
+    def wait(self, stop: threading.Event) -> bool:
+        return not stop.wait(self.interval)
+
+    def fingerprint(self, path: str, previous: Optional[tuple] = None) -> tuple:
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+        if not self.hash:
+            return stat, stat
+        if previous is not None and previous[0] == stat:
+            return previous
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in _iter_chunks(f.read):
+                digest.update(chunk)
+        return stat, digest.hexdigest()
+
+
+class Watcher:
+    """
+    Keeps a live FlexView over a set of files, reloading only what changed.
+
+    Each `check()` lists the watched files and asks the backend for their
+    fingerprints; added and changed files are re-parsed and re-validated,
+    removed ones are dropped, and the other containers are reused as they
+    are. The result is published as a new FlexView generation by a single
+    assignment: readers holding an earlier `view` keep a consistent
+    snapshot, and containers are never modified in place.
+
+    A file that fails to parse or validate keeps its previous container
+    (if any) and is listed in `errors` until it is fixed; a check in which
+    no container changed publishes no generation.
+    `on_change(view, changes)` is called after each new generation (the
+    initial load included), with `changes` mapping "added", "changed" and
+    "removed" to the paths whose containers were added, replaced or
+    dropped, and "errors" to the paths that failed in this check.
+
+    `start()` runs the checks in a daemon thread; `stop()` ends it.
+    """
+
+    def __init__(
+        self,
         dir: Union[str, List[str], None] = None,
-        filter_query: Optional[str] = None,
-        validate: bool = True,
+        path: Union[str, List[str], None] = None,
+        on_change: Optional[Callable[[FlexView, Dict[str, List[str]]], Any]] = None,
         settings: Optional[FlexTagSettings] = None,
-    ) -> FlexView:
-        inst = cls(settings=settings)
-        sources = inst._gather_sources(path, string, dir)
-        containers = []
-        for src in sources:
-            src_path = src if os.path.isfile(src) else "<string>"
-            c = inst._parse_source(src, src_path)
-            if validate:
-                c.validate_schema()
-            containers.append(c)
-        view = FlexView(containers)
-        if filter_query:
-            return view.filter(filter_query, target="containers")
-        return view
+        validate: bool = True,
+        recursive: bool = False,
+        include: Union[str, List[str], None] = None,
+        exclude: Union[str, List[str], None] = None,
+        backend: Optional[PollingBackend] = None,
+    ):
+        self._flextag = FlexTag(settings=settings)
+        self._dirs = [dir] if isinstance(dir, str) else list(dir or [])
+        self._paths = [path] if isinstance(path, str) else list(path or [])
+        self._listing = (recursive, include, exclude)
+        self.on_change = on_change
+        self.validate = validate
+        self.backend = backend if backend is not None else PollingBackend()
+        self.generation = 0
+        self.errors: Dict[str, Exception] = {}
+        self._containers: Dict[str, Container] = {}
+        self._stamps: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._view = FlexView([], settings=self._flextag.settings)
+        self.check()
 
-    def _gather_sources(
-        self,
-        path: Union[str, List[str], None],
-        string: Union[str, List[str], None],
-        dir: Union[str, List[str], None],
-    ) -> List[str]:
-        out = []
-        if path:
-            if isinstance(path, str):
-                out.append(path)
-            else:
-                out.extend(path)
-        if string:
-            if isinstance(string, str):
-                out.append(string)
-            else:
-                out.extend(string)
-        if dir:
-            if isinstance(dir, str):
-                out.extend(self._dir_files(dir))
-            else:
-                for d in dir:
-                    out.extend(self._dir_files(d))
-        return out
+    @property
+    def view(self) -> FlexView:
+        """The current generation."""
+        return self._view
 
-    def _dir_files(self, directory: str) -> List[str]:
-        res = []
-        if not os.path.isdir(directory):
-            return res
-        for fn in os.listdir(directory):
-            if fn.endswith(".flextag") or fn.endswith(".ft"):
-                full_path = os.path.join(directory, fn)
-                res.append(full_path)
-        return res
+    def __enter__(self) -> "Watcher":
+        return self
 
-    def _parse_source(self, src: str, source_name: str) -> Container:
-        if os.path.exists(src) and os.path.isfile(src):
-            logger.debug(f"Parsing file: {src}")
-            with open(src, "r", encoding=self.settings.encoding) as f:
-                lines = f.readlines()
-        else:
-            logger.debug("Parsing raw string input.")
-            lines = src.splitlines(keepends=True)
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
 
-        raw_secs = self._parser.parse_bracket_sections(lines, source_name)
-        sections = []
-        for rs in raw_secs:
-            s_obj = Section(
-                section_id=rs["section_id"],
-                tags=rs["tags"],
-                paths=rs["paths"],
-                parameters=rs["params"],
-                type_name=rs["type_decl"],
-                open_line=rs["open_line"],
-                close_line=rs["close_line"],
-                is_self_closing=rs["is_self_closing"],
-                all_lines=lines,
-                source_name=source_name,
+    def _watched_files(self) -> List[str]:
+        files = list(self._paths)
+        for d in self._dirs:
+            files.extend(self._flextag._dir_files(d, *self._listing))
+        return list(dict.fromkeys(files))
+
+    def check(self) -> bool:
+        """
+        Look for changes once and publish a new generation if any
+        container changed. Returns whether a new generation was published.
+        """
+        with self._lock:
+            files = self._watched_files()
+            touched = []
+            stamps = {}
+            for path in files:
+                old = self._stamps.get(path)
+                try:
+                    stamp = self.backend.fingerprint(path, old)
+                except FileNotFoundError:
+                    continue
+                stamps[path] = stamp
+                if old is None or stamp[1] != old[1]:
+                    touched.append(path)
+            gone = [p for p in self._stamps if p not in stamps]
+            self._stamps = stamps
+            if not (touched or gone):
+                return False
+
+            changes: Dict[str, List[str]] = {
+                "added": [],
+                "changed": [],
+                "removed": [],
+                "errors": [],
+            }
+            containers = dict(self._containers)
+            for path in gone:
+                self.errors.pop(path, None)
+                if containers.pop(path, None) is not None:
+                    changes["removed"].append(path)
+            for path in touched:
+                try:
+                    c = self._flextag._parse_source(Source.file(path), path)
+                    if self.validate:
+                        c.validate_schema()
+                except (FlexTagError, OSError, UnicodeDecodeError) as e:
+                    logger.warning("Keeping previous version of %s: %s", path, e)
+                    self.errors[path] = e
+                    changes["errors"].append(path)
+                    continue
+                self.errors.pop(path, None)
+                changes["changed" if path in containers else "added"].append(path)
+                containers[path] = c
+            if not (changes["added"] or changes["changed"] or changes["removed"]):
+                return False  # nothing the view shows has changed
+
+            self._containers = {p: containers[p] for p in stamps if p in containers}
+            self._view = FlexView(
+                list(self._containers.values()), settings=self._flextag.settings
+            )
+            self.generation += 1
+            logger.debug(
+                "Watcher generation %s: %s added, %s changed, %s removed.",
+                self.generation,
+                len(changes["added"]),
+                len(changes["changed"]),
+                len(changes["removed"]),
             )
-            sections.append(s_obj)
+            view = self._view
+        if self.on_change is not None:
+            self.on_change(view, changes)
+        return True
 
-        container = Container(sections, source_name)
-        return container
+    def start(self) -> "Watcher":
+        """Run checks in a background thread, as paced by the backend."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="flextag-watch", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread and wait for it to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while self.backend.wait(self._stop):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Watcher check failed")
+
+
+##############################################################################
+# SNAPSHOTS
+##############################################################################
+
+SNAPSHOT_MAGIC = b"FTSNAPSH"
+SNAPSHOT_VERSION = 1
+# magic, version, header length, parsed-content blob length
+_SNAPSHOT_HEADER = struct.Struct("<8sIQQ")
+
+
+class _SnapshotBlobs:
+    """
+    The memory-mapped parsed-content and body blobs of a snapshot. In the
+    pickled header it is a persistent reference, bound to the open file
+    on load.
+    """
+
+    def __init__(self, data: Optional[mmap.mmap], parsed_off: int, bodies_off: int):
+        self.data = data
+        self.parsed_off = parsed_off
+        self.bodies_off = bodies_off
+
+
+class _SnapshotLines(_LineWindow):
+    """A section's lines, read from the snapshot's body blob on first use."""
+
+    __slots__ = ("blobs", "off", "length")
+
+    def __init__(self, blobs: _SnapshotBlobs, base: int, off: int, length: int):
+        super().__init__(None, base)
+        self.blobs = blobs
+        self.off = off
+        self.length = length
+
+    @property
+    def lines(self) -> List[str]:
+        if self._lines is None:
+            start = self.blobs.bodies_off + self.off
+            text = self.blobs.data[start : start + self.length].decode("utf-8")
+            # A single "line": Section joins its lines and drops the final
+            # newline, giving back the stored body exactly.
+            self._lines = [text + "\n"]
+        return self._lines
+
+
+class _SnapshotContent:
+    """Loader for one section's stored parsed content."""
+
+    __slots__ = ("blobs", "off", "length")
+
+    def __init__(self, blobs: _SnapshotBlobs, off: int, length: int):
+        self.blobs = blobs
+        self.off = off
+        self.length = length
+
+    def __call__(self) -> Any:
+        start = self.blobs.parsed_off + self.off
+        return _plain_loads(self.blobs.data[start : start + self.length])
+
+
+# The only classes a snapshot may rebuild: FlexTag's own data classes and
+# the date/time types that parsed YAML or TOML content can hold.
+_SNAPSHOT_CLASSES = {
+    (__name__, "Section"),
+    (__name__, "Container"),
+    (__name__, "SchemaRule"),
+    (__name__, "_LineWindow"),
+    (__name__, "_SnapshotLines"),
+    (__name__, "_SnapshotContent"),
+    ("datetime", "date"),
+    ("datetime", "datetime"),
+    ("datetime", "time"),
+    ("datetime", "timedelta"),
+    ("datetime", "timezone"),
+    ("collections", "OrderedDict"),
+}
+_PLAIN_CLASSES = {c for c in _SNAPSHOT_CLASSES if c[0] != __name__}
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """Unpickler that refuses every class outside an allow-list."""
+
+    def __init__(self, file, allowed=_SNAPSHOT_CLASSES, blobs=None):
+        super().__init__(file)
+        self.allowed = allowed
+        self.blobs = blobs
+
+    def find_class(self, module, name):
+        if (module, name) in self.allowed:
+            return super().find_class(module, name)
+        raise FlexTagError(f"Snapshot contains disallowed type {module}.{name}")
+
+    def persistent_load(self, pid):
+        if pid == "blobs" and self.blobs is not None:
+            return self.blobs
+        raise FlexTagError(f"Unknown snapshot reference {pid!r}")
+
+
+def _plain_loads(data: bytes) -> Any:
+    return _SnapshotUnpickler(io.BytesIO(data), allowed=_PLAIN_CLASSES).load()
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickles containers and sections for a snapshot. Sections are stored
+    without their source lines or caches; their bodies (and optionally
+    their parsed content) go to separate blobs and are referenced through
+    lazy loaders instead.
+    """
+
+    def __init__(self, file, include_content: bool):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.include_content = include_content
+        self.blobs = _SnapshotBlobs(None, 0, 0)
+        self.bodies = bytearray()
+        self.parsed = bytearray()
+
+    def persistent_id(self, obj):
+        return "blobs" if obj is self.blobs else None
+
+    def reducer_override(self, obj):
+        if type(obj) is Container and "_lines" in obj.__dict__:
+            state = dict(obj.__dict__)
+            del state["_lines"]
+            return copyreg.__newobj__, (Container,), state
+        if type(obj) is not Section:
+            return NotImplemented
+        body = obj.raw_content.encode("utf-8")
+        lines = _LineWindow([], obj.open_line + 1)
+        if obj.close_line > obj.open_line + 1:
+            lines = _SnapshotLines(
+                self.blobs, obj.open_line + 1, len(self.bodies), len(body)
+            )
+            self.bodies.extend(body)
+
+        state = dict(obj.__dict__)
+        state.pop("_stats", None)  # load statistics stay with the loading view
+        state["_parsed_cache"] = None
+        state["_projection_cache"] = None
+        state["_content_loader"] = self._content_loader(obj)
+        slots = {name: getattr(obj, name) for name in SectionHeader.__slots__}
+        slots.update(_all_lines=lines, _reader=None, _section=None)
+        return copyreg.__newobj__, (Section,), (state, slots)
+
+    def _content_loader(self, sec: Section) -> Optional[_SnapshotContent]:
+        if not self.include_content or sec.type_name.lower() in ("", "raw"):
+            return None
+        try:
+            blob = pickle.dumps(sec.content, protocol=pickle.HIGHEST_PROTOCOL)
+            _plain_loads(blob)
+        except Exception as e:
+            logger.debug("Not storing parsed content of '%s': %s", sec.id, e)
+            return None
+        loader = _SnapshotContent(self.blobs, len(self.parsed), len(blob))
+        self.parsed.extend(blob)
+        return loader
+
+
+def _save_snapshot(view: "FlexView", path: str, include_content: bool):
+    containers = [
+        c.load() if isinstance(c, LazyContainer) else c for c in view.containers
+    ]
+    indexed = FlexView(containers)
+    buf = io.BytesIO()
+    pickler = _SnapshotPickler(buf, include_content)
+    pickler.dump(
+        {
+            "containers": containers,
+            "indexes": {
+                "sections": indexed._section_index().export_postings(),
+                "containers": indexed._container_index().export_postings(),
+            },
+        }
+    )
+    header = buf.getvalue()
+    with open(path, "wb") as f:
+        f.write(
+            _SNAPSHOT_HEADER.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header), len(pickler.parsed)
+            )
+        )
+        f.write(header)
+        f.write(pickler.parsed)
+        f.write(pickler.bodies)
+
+
+def _load_snapshot(path: str, settings: Optional[FlexTagSettings]) -> "FlexView":
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < _SNAPSHOT_HEADER.size or data[:8] != SNAPSHOT_MAGIC:
+        raise FlexTagError(f"{path} is not a FlexTag snapshot")
+    _, version, header_len, parsed_len = _SNAPSHOT_HEADER.unpack_from(data, 0)
+    if version != SNAPSHOT_VERSION:
+        raise FlexTagError(
+            f"Unsupported snapshot version {version} in {path} "
+            f"(expected {SNAPSHOT_VERSION})"
+        )
+    start = _SNAPSHOT_HEADER.size
+    blobs = _SnapshotBlobs(data, start + header_len, start + header_len + parsed_len)
+
+    header = _SnapshotUnpickler(
+        io.BytesIO(data[start : start + header_len]), blobs=blobs
+    ).load()
+    containers = header["containers"]
+    view = FlexView(containers, settings=settings)
+    items = []
+    spans = []
+    for c in containers:
+        spans.append((len(items), len(items) + len(c.sections)))
+        items.extend(c.sections)
+    index = MetadataIndex.from_postings(
+        items, header["indexes"]["sections"], backend=view._index_backend
+    )
+    index.spans = spans
+    view._shared["sections"] = index
+    view._shared["containers"] = MetadataIndex.from_postings(
+        containers, header["indexes"]["containers"], backend=view._index_backend
+    )
+    return view
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+FlexTag instrumentation - tracing hooks around the library's work.
+
+A tracer is any object with two methods:
+
+- begin(name, attributes) -> token: called when an operation starts
+- end(token, attributes, error): called when it finishes, with the same
+  attributes dict (results such as section counts added) and the
+  exception it raised, or None
+
+Operations (span names) and their attributes:
+
+- flextag.load_source: flextag.source, flextag.source.kind; flextag.sections
+- flextag.scan: flextag.source, flextag.headers_only; flextag.sections
+- flextag.build_container: flextag.source, flextag.sections
+- flextag.validate_schema: flextag.source, flextag.sections
+- flextag.filter: flextag.query, flextag.operation ("resolve", "count",
+  "first" or "exists"); flextag.matches, or flextag.containers for resolve
+- flextag.parse_content: flextag.source, flextag.section_id,
+  flextag.content_type
+
+set_tracer(OpenTelemetryTracer(trace.get_tracer("flextag"))) reports these
+as OpenTelemetry spans. With no tracer installed, each hook returns a
+shared no-op context: no attributes are built and nothing is formatted.
+"""
+
+from typing import Any, Callable, Dict, Optional
+
+_tracer: Any = None
+
+
+def set_tracer(tracer: Any) -> None:
+    """Install `tracer` for all FlexTag operations; None removes it."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Any:
+    """The installed tracer, or None."""
+    return _tracer
+
+
+class _Span:
+    """An operation reported to the tracer when the block exits."""
+
+    __slots__ = ("_tracer", "_name", "_token", "attributes")
+
+    def __init__(self, tracer: Any, name: str, attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._token = None
+        self.attributes = attributes
+
+    def __enter__(self) -> "_Span":
+        self._token = self._tracer.begin(self._name, self.attributes)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._tracer.end(self._token, self.attributes, exc)
+        return False
+
+    def set(self, key: str, value: Any) -> None:
+        """Add a result attribute, reported at the end."""
+        self.attributes[key] = value
+
+
+class _NullSpan:
+    """Stands in for _Span while no tracer is installed."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, attributes: Callable[[], Dict[str, Any]]):
+    """
+    Context manager reporting operation `name` to the installed tracer.
+    `attributes` is called for the attributes dict only if a tracer is
+    installed.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, attributes())
+
+
+class OpenTelemetryTracer:
+    """
+    Tracer reporting FlexTag operations as OpenTelemetry spans, nested
+    under the current span. `otel_tracer` is an opentelemetry.trace.Tracer;
+    the opentelemetry-api package is only needed when this class is used.
+    """
+
+    def __init__(self, otel_tracer: Any):
+        self._otel_tracer = otel_tracer
+
+    def begin(self, name: str, attributes: Dict[str, Any]) -> tuple:
+        from opentelemetry import context, trace
+
+        otel_span = self._otel_tracer.start_span(name, attributes=attributes)
+        token = context.attach(trace.set_span_in_context(otel_span))
+        return otel_span, token
+
+    def end(
+        self, token: tuple, attributes: Dict[str, Any], error: Optional[BaseException]
+    ) -> None:
+        from opentelemetry import context, trace
+
+        otel_span, context_token = token
+        context.detach(context_token)
+        otel_span.set_attributes(attributes)
+        if error is not None:
+            otel_span.record_exception(error)
+            otel_span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+        otel_span.end()
@@ -0,0 +1,569 @@
+"""
+FlexTag language server - editor support over the Language Server Protocol.
+
+Run with ``python -m flextag.lsp``; the server speaks JSON-RPC on stdin and
+stdout and provides:
+
+- diagnostics for syntax errors, schema violations and section bodies that
+  fail to parse, with line and column
+- document symbols for sections (ID or type, with tags and paths)
+- go-to-definition from a section ID to the sections declaring it
+
+Documents are synchronised incrementally. Each change goes through
+Container.apply_edit, which re-scans only the sections the change touches,
+so the cost of a keystroke does not grow with the document. While the text
+does not parse (mid-typing), the server keeps it alongside the last good
+parse and the span of lines where the two differ; the next change retries
+just that span.
+"""
+
+import json
+import logging
+import re
+import sys
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from .flextag import (
+    HEAD_SECTION_TYPES,
+    Container,
+    FlexTag,
+    FlexTagError,
+    FlexTagSettings,
+    SchemaValidationError,
+    Section,
+    Source,
+)
+
+logger = logging.getLogger(__name__)
+
+# LSP constants
+SYNC_INCREMENTAL = 2
+SEVERITY_ERROR = 1
+SYMBOL_KIND_HEAD = 2  # Module
+SYMBOL_KIND_SECTION = 23  # Struct
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+
+_WORD_RE = re.compile(r"[\w.\-]+")
+
+
+def _line_width(line: str) -> int:
+    """Length of `line` without its line break."""
+    return len(line.rstrip("\r\n"))
+
+
+def _splice(lines: List[str], start: tuple, end: tuple, text: str):
+    """Replace the text between two (line, column) positions in `lines`."""
+    (l1, c1), (l2, c2) = start, end
+    head = lines[l1][:c1] if l1 < len(lines) else ""
+    tail = lines[l2][c2:] if l2 < len(lines) else ""
+    lines[l1 : l2 + 1] = (head + text + tail).splitlines(keepends=True)
+
+
+def _header_key(sec: Section) -> tuple:
+    """What the schema's structure rules see of a section."""
+    return (
+        sec.raw_id,
+        sec.raw_type_name,
+        sec.raw_tags,
+        sec.raw_paths,
+        sec.raw_parameters,
+    )
+
+
+class Document:
+    """
+    An open text document and its parse.
+
+    `container` always holds the last text that parsed; while the current
+    text does not, `error` is set and `_pending` holds the current lines
+    with the number of leading (`lo`) and trailing (`tail`) lines they
+    still share with the container.
+    """
+
+    def __init__(self, uri: str, text: str, settings: Optional[FlexTagSettings] = None):
+        self.uri = uri
+        self.version = 0
+        self._flextag = FlexTag(settings)
+        self.container = self._parse("")
+        self.error: Optional[FlexTagError] = None
+        self.schema_error: Optional[SchemaValidationError] = None
+        self._content_errors: Dict[int, Tuple[Section, FlexTagError]] = {}
+        self._pending: Optional[Tuple[List[str], int, int]] = None
+        self._ids: Optional[Dict[str, List[Section]]] = None
+        self.symbol_cache: Optional[list] = None  # filled by the server
+        self.replace(text)
+
+    def _parse(self, text: str) -> Container:
+        return self._flextag._parse_source(Source.text(text, name=self.uri), self.uri)
+
+    @property
+    def lines(self) -> List[str]:
+        """The current text, split into lines with their line breaks."""
+        if self._pending is not None:
+            return self._pending[0]
+        return self.container._lines
+
+    def replace(self, text: str):
+        """Replace the whole text."""
+        try:
+            self.container = self._parse(text)
+            self._pending = None
+            self.error = None
+            self._content_errors.clear()
+            self._checked(self.container.raw_sections)
+        except FlexTagError as e:
+            # Keep the previous parse (empty on open) and retry against it
+            self.error = e
+            self._pending = (text.splitlines(keepends=True), 0, 0)
+
+    def edit(self, start: tuple, end: tuple, text: str):
+        """
+        Replace the text between two (line, column) positions, columns
+        counted in code points.
+        """
+        start, end = self._clamp(start), self._clamp(end)
+        if end < start:
+            start, end = end, start
+        if self._pending is None:
+            try:
+                self._apply_edit(start, end, text)
+                return
+            except FlexTagError as e:
+                self.error = e
+                lines = list(self.container._lines)
+                self._pending = (lines, start[0], len(lines) - end[0] - 1)
+        else:
+            lines, lo, tail = self._pending
+            self._pending = (
+                lines,
+                min(lo, start[0]),
+                min(tail, len(lines) - end[0] - 1),
+            )
+        lines, lo, tail = self._pending
+        _splice(lines, start, end, text)
+        self._pending = (lines, lo, max(tail, 0))
+        self._retry()
+
+    def _clamp(self, pos: tuple) -> tuple:
+        lines = self.lines
+        line, col = pos
+        if line >= len(lines):
+            if lines and not lines[-1].endswith(("\n", "\r")):
+                return len(lines) - 1, _line_width(lines[-1])
+            return len(lines), 0
+        return max(line, 0), max(0, min(col, _line_width(lines[line])))
+
+    def _retry(self):
+        """Re-parse the lines that differ from the last good parse."""
+        lines, lo, tail = self._pending
+        good = self.container._lines
+        if tail == 0 and good and not good[-1].endswith(("\n", "\r")):
+            lo = min(lo, len(good) - 1)
+            end = (len(good) - 1, len(good[-1]))
+        else:
+            end = (len(good) - tail, 0)
+        text = "".join(lines[lo : len(lines) - tail])
+        try:
+            self._apply_edit((lo, 0), end, text)
+        except FlexTagError as e:
+            self.error = e
+            return
+        self._pending = None
+        self.error = None
+
+    def _apply_edit(self, start: tuple, end: tuple, text: str):
+        container = self.container
+        before = list(container.raw_sections)
+        new_secs = container.apply_edit(start, end, text, validate=False)
+        raw = container.raw_sections
+        if any(s.type_name.lower() in HEAD_SECTION_TYPES for s in new_secs):
+            # Defaults or schema changed: every section may be affected
+            self._checked(raw, structure=True)
+            return
+        structure = len(raw) != len(before)
+        if new_secs and not structure:
+            i = container._section_index_at(new_secs[0].open_line)
+            structure = any(
+                _header_key(sec) != _header_key(before[i + j])
+                for j, sec in enumerate(new_secs)
+            )
+        self._checked(new_secs, structure)
+
+    def _checked(self, new_secs: List[Section], structure: bool = True):
+        """
+        Collect diagnostics for freshly parsed sections; with `structure`,
+        also re-check the schema's section order and metadata rules.
+        """
+        self._ids = None
+        self.symbol_cache = None
+        container = self.container
+        has_schema = container.schema is not None
+        for key, (sec, _) in list(self._content_errors.items()):
+            if container.section_at(sec.open_line) is not sec:
+                del self._content_errors[key]
+        for sec in new_secs:
+            if sec.type_name.lower() in HEAD_SECTION_TYPES:
+                continue
+            try:
+                sec.content
+                if has_schema:
+                    container.validate_schema(structure=False, sections=[sec])
+            except FlexTagError as e:
+                self._content_errors[id(sec)] = (sec, e)
+            else:
+                self._content_errors.pop(id(sec), None)
+        if structure:
+            self.schema_error = None
+            if has_schema:
+                try:
+                    container.validate_schema(sections=[])
+                except SchemaValidationError as e:
+                    self.schema_error = e
+
+    def diagnostics(self) -> List[Tuple[int, int, str]]:
+        """(line, column, message) for each problem, 0-based."""
+        out = []
+        e = self.error
+        if e is not None:
+            line = getattr(e, "line_num", 0) or 0
+            col = getattr(e, "column_num", 0) or 0
+            out.append(
+                (max(line - 1, 0), max(col - 1, 0), getattr(e, "message", str(e)))
+            )
+        if self._pending is None:
+            for sec, err in self._content_errors.values():
+                out.append((sec.open_line, 0, getattr(err, "message", str(err))))
+            e = self.schema_error
+            if e is not None:
+                if e.line_num and e.line_num > 0:
+                    pos = (e.line_num - 1, max((e.column_num or 0) - 1, 0))
+                else:
+                    pos = (self.container.schema.open_line, 0)
+                out.append(pos + (e.message,))
+        return sorted(out)
+
+    def symbols(self) -> List[Section]:
+        """The sections of the last good parse, in document order."""
+        return self.container.raw_sections
+
+    def definition(self, line: int, col: int) -> List[Section]:
+        """Sections whose ID is the word at (line, column)."""
+        lines = self.lines
+        if line >= len(lines):
+            return []
+        for m in _WORD_RE.finditer(lines[line]):
+            if m.start() <= col <= m.end():
+                word = m.group().strip(".")
+                break
+        else:
+            return []
+        if self._ids is None:
+            ids: Dict[str, List[Section]] = {}
+            for sec in self.container.raw_sections:
+                if sec.id:
+                    ids.setdefault(sec.id.lower(), []).append(sec)
+            self._ids = ids
+        return self._ids.get(word.lower(), [])
+
+
+def read_message(rfile: BinaryIO) -> Optional[Dict[str, Any]]:
+    """Read one Content-Length framed JSON-RPC message; None at EOF."""
+    length = None
+    while True:
+        line = rfile.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is None:
+                continue
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    body = rfile.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body)
+
+
+def write_message(wfile: BinaryIO, payload: Dict[str, Any]):
+    """Write one Content-Length framed JSON-RPC message."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    wfile.write(b"Content-Length: %d\r\n\r\n" % len(body))
+    wfile.write(body)
+    wfile.flush()
+
+
+class LanguageServer:
+    """
+    Serve FlexTag documents over LSP on a pair of binary streams.
+
+    Columns are exchanged in UTF-16 code units unless the client accepts
+    "utf-32" (code points, which is what the server uses internally).
+    """
+
+    def __init__(
+        self,
+        rfile: BinaryIO,
+        wfile: BinaryIO,
+        settings: Optional[FlexTagSettings] = None,
+    ):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.settings = settings
+        self.documents: Dict[str, Document] = {}
+        self.utf16 = True
+        self.initialized = False
+        self.shutdown_requested = False
+        self._handlers = {
+            "initialize": self._initialize,
+            "initialized": lambda params: None,
+            "shutdown": self._shutdown,
+            "textDocument/didOpen": self._did_open,
+            "textDocument/didChange": self._did_change,
+            "textDocument/didClose": self._did_close,
+            "textDocument/documentSymbol": self._document_symbol,
+            "textDocument/definition": self._definition,
+        }
+
+    def serve(self) -> int:
+        """Handle messages until `exit` or end of input; returns the exit code."""
+        while True:
+            message = read_message(self.rfile)
+            if message is None:
+                return 1
+            if message.get("method") == "exit":
+                return 0 if self.shutdown_requested else 1
+            self.handle(message)
+
+    def handle(self, message: Dict[str, Any]):
+        """Dispatch one request or notification."""
+        method = message.get("method")
+        msg_id = message.get("id")
+        if method is None:
+            return  # a response to a request we never send
+        handler = self._handlers.get(method)
+        if handler is None:
+            if msg_id is not None:
+                self._error(msg_id, METHOD_NOT_FOUND, f"Unknown method {method}")
+            return
+        if not self.initialized and method != "initialize":
+            if msg_id is not None:
+                self._error(msg_id, SERVER_NOT_INITIALIZED, "Server not initialized")
+            return
+        try:
+            result = handler(message.get("params") or {})
+        except Exception as e:
+            logger.exception("Error handling %s", method)
+            if msg_id is not None:
+                self._error(msg_id, INTERNAL_ERROR, str(e))
+            return
+        if msg_id is not None:
+            write_message(
+                self.wfile, {"jsonrpc": "2.0", "id": msg_id, "result": result}
+            )
+
+    def _error(self, msg_id, code: int, message: str):
+        write_message(
+            self.wfile,
+            {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "error": {"code": code, "message": message},
+            },
+        )
+
+    def _notify(self, method: str, params: Dict[str, Any]):
+        write_message(
+            self.wfile, {"jsonrpc": "2.0", "method": method, "params": params}
+        )
+
+    # Positions
+
+    def _to_col(self, line: str, character: int) -> int:
+        """Client column -> code point index into `line`."""
+        if not self.utf16 or line.isascii():
+            return character
+        units = 0
+        for i, ch in enumerate(line):
+            if units >= character:
+                return i
+            units += 2 if ord(ch) > 0xFFFF else 1
+        return len(line)
+
+    def _from_col(self, line: str, col: int) -> int:
+        """Code point index into `line` -> client column."""
+        if not self.utf16 or line.isascii():
+            return col
+        return col + sum(1 for ch in line[:col] if ord(ch) > 0xFFFF)
+
+    def _line_end(self, line: str) -> int:
+        """Client column of the end of `line`, before its line break."""
+        line = line.rstrip("\r\n")
+        if not self.utf16 or line.isascii():
+            return len(line)
+        return len(line.encode("utf-16-le")) // 2
+
+    def _position(self, doc: Document, pos: Dict[str, int]) -> tuple:
+        line = pos["line"]
+        lines = doc.lines
+        text = lines[line] if 0 <= line < len(lines) else ""
+        return line, self._to_col(text, pos["character"])
+
+    def _range(self, doc: Document, l1: int, c1: int, l2: int, c2: int):
+        lines = doc.lines
+
+        def pos(line, col):
+            text = lines[line] if line < len(lines) else ""
+            return {"line": line, "character": self._from_col(text, col)}
+
+        return {"start": pos(l1, c1), "end": pos(l2, c2)}
+
+    def _header_range(self, doc: Document, sec: Section):
+        lines = doc.lines
+        line = sec.open_line
+        end = self._line_end(lines[line]) if line < len(lines) else 0
+        return {
+            "start": {"line": line, "character": 0},
+            "end": {"line": line, "character": end},
+        }
+
+    # Handlers
+
+    def _initialize(self, params):
+        encodings = (
+            params.get("capabilities", {})
+            .get("general", {})
+            .get("positionEncodings", [])
+        )
+        self.utf16 = "utf-32" not in encodings
+        self.initialized = True
+        return {
+            "capabilities": {
+                "positionEncoding": "utf-16" if self.utf16 else "utf-32",
+                "textDocumentSync": {
+                    "openClose": True,
+                    "change": SYNC_INCREMENTAL,
+                },
+                "documentSymbolProvider": True,
+                "definitionProvider": True,
+            },
+            "serverInfo": {"name": "flextag"},
+        }
+
+    def _shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+    def _did_open(self, params):
+        item = params["textDocument"]
+        doc = Document(item["uri"], item["text"], self.settings)
+        doc.version = item.get("version", 0)
+        self.documents[doc.uri] = doc
+        self._publish(doc)
+
+    def _did_change(self, params):
+        ident = params["textDocument"]
+        doc = self.documents[ident["uri"]]
+        for change in params["contentChanges"]:
+            rng = change.get("range")
+            if rng is None:
+                doc.replace(change["text"])
+            else:
+                doc.edit(
+                    self._position(doc, rng["start"]),
+                    self._position(doc, rng["end"]),
+                    change["text"],
+                )
+        doc.version = ident.get("version", doc.version)
+        self._publish(doc)
+
+    def _did_close(self, params):
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        self._notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def _publish(self, doc: Document):
+        lines = doc.lines
+        diagnostics = []
+        for line, col, message in doc.diagnostics():
+            line = min(line, max(len(lines) - 1, 0))
+            width = _line_width(lines[line]) if lines else 0
+            col = min(col, width)
+            diagnostics.append(
+                {
+                    "range": self._range(
+                        doc, line, col, line, width if width > col else col
+                    ),
+                    "severity": SEVERITY_ERROR,
+                    "source": "flextag",
+                    "message": message,
+                }
+            )
+        self._notify(
+            "textDocument/publishDiagnostics",
+            {"uri": doc.uri, "version": doc.version, "diagnostics": diagnostics},
+        )
+
+    def _document_symbol(self, params):
+        doc = self.documents[params["textDocument"]["uri"]]
+        if doc.symbol_cache is not None:
+            return doc.symbol_cache
+        # Positions are those of the last text that parsed
+        lines = doc.container._lines or [""]
+        line_end = self._line_end
+        symbols = []
+        self._add_symbols(symbols, doc.symbols(), lines, line_end)
+        doc.symbol_cache = symbols
+        return symbols
+
+    @staticmethod
+    def _add_symbols(symbols, sections, lines, line_end):
+        last = len(lines) - 1
+        for sec in sections:
+            stype = sec.type_name.lower()
+            open_line = min(sec.open_line, last)
+            close = min(sec.close_line, last)
+            detail = " ".join(sec.tags + sec.paths)
+            header = {
+                "start": {"line": open_line, "character": 0},
+                "end": {"line": open_line, "character": line_end(lines[open_line])},
+            }
+            symbols.append(
+                {
+                    "name": sec.id or stype,
+                    "detail": f"{detail}: {stype}" if detail else stype,
+                    "kind": (
+                        SYMBOL_KIND_HEAD
+                        if stype in HEAD_SECTION_TYPES
+                        else SYMBOL_KIND_SECTION
+                    ),
+                    "range": {
+                        "start": header["start"],
+                        "end": {"line": close, "character": line_end(lines[close])},
+                    },
+                    "selectionRange": header,
+                }
+            )
+
+    def _definition(self, params):
+        doc = self.documents[params["textDocument"]["uri"]]
+        line, col = self._position(doc, params["position"])
+        return [
+            {"uri": doc.uri, "range": self._header_range(doc, sec)}
+            for sec in doc.definition(line, col)
+        ]
+
+
+def main() -> int:
+    """Run the language server on stdin/stdout."""
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+    server = LanguageServer(sys.stdin.buffer, sys.stdout.buffer)
+    return server.serve()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
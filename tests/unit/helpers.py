@@ -0,0 +1,31 @@
+"""Shared helpers for the unit tests."""
+
+import os
+import tempfile
+import unittest
+from typing import Union
+
+
+class TempDirTestCase(unittest.TestCase):
+    """
+    TestCase with a fresh temporary directory, `self.dir`, for each test.
+    The directory and everything written to it are removed afterwards.
+    """
+
+    def setUp(self):
+        super().setUp()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+
+    def temp_path(self, rel: str) -> str:
+        """The path of `rel` ("/"-separated) inside the temporary directory."""
+        return os.path.join(self.dir, *rel.split("/"))
+
+    def write_file(self, rel: str, data: Union[str, bytes]) -> str:
+        """Write text or bytes to `rel`, creating directories; returns its path."""
+        path = self.temp_path(rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
@@ -0,0 +1,73 @@
+import unittest
+
+from flextag.flextag import FlexTag, FlexTagError, FlexTagSyntaxError
+
+
+class TestFlexTagEdit(unittest.TestCase):
+    """Tests for incremental re-parsing with FlexView.apply_edit."""
+
+    SOURCE = """[[]]: defaults
+[#shared]
+[[/]]
+[[a]]: json
+{"n": 1}
+[[/a]]
+[[b]]: json
+{"n": 2}
+[[/b]]
+"""
+
+    def setUp(self):
+        self.view = FlexTag.load(string=self.SOURCE)
+        self.a, self.b = self.view.sections
+        self.a.content, self.b.content  # parse and cache
+
+    def assert_matches_reload(self):
+        text = "".join(self.view.containers[0]._lines)
+        expected = FlexTag.load(string=text)
+        self.assertEqual(
+            [(s.id, s.tags, s.open_line, s.close_line) for s in self.view.sections],
+            [(s.id, s.tags, s.open_line, s.close_line) for s in expected.sections],
+        )
+
+    def test_edit_inside_section(self):
+        """Test that only the edited section is re-parsed."""
+        (new,) = self.view.apply_edit("<string>", (4, 6), (4, 7), "5")
+        self.assertEqual(new.content, {"n": 5})
+        self.assertIs(self.view.sections[1], self.b)
+        self.assertIsNotNone(self.b._parsed_cache)
+        self.assertEqual(self.view.filter("#shared").sections[0].content, {"n": 5})
+
+    def test_insert_section_shifts_later(self):
+        """Test inserting lines and a new section before existing ones."""
+        new = self.view.apply_edit("<string>", (6, 0), (6, 0), "[[c /]]\n# note\n")
+        self.assertEqual([s.id for s in new], ["c"])
+        self.assertEqual([s.id for s in self.view.sections], ["a", "c", "b"])
+        self.assertEqual(new[0].tags, ["#shared"])
+        self.assertIs(self.view.sections[2], self.b)
+        self.assertEqual((self.b.open_line, self.b.content), (8, {"n": 2}))
+        self.assert_matches_reload()
+
+        self.view.apply_edit("<string>", (3, 0), (5, 6), "")
+        self.assertEqual([s.id for s in self.view.sections], ["c", "b"])
+        self.assert_matches_reload()
+
+    def test_head_edit_reapplies_defaults(self):
+        """Test that editing the defaults block updates every section."""
+        self.view.apply_edit("<string>", (1, 2), (1, 8), "other")
+        self.assertEqual([s.tags for s in self.view.sections], [["#other"]] * 2)
+        self.assertEqual(self.view.filter("#other").count(), 2)
+
+    def test_failed_edit_leaves_view_unchanged(self):
+        """Test that an edit producing invalid markup is rejected atomically."""
+        with self.assertRaises(FlexTagSyntaxError):
+            self.view.apply_edit("<string>", (5, 0), (5, 6), "[[/b]]")
+        with self.assertRaises(FlexTagSyntaxError):
+            self.view.apply_edit("<string>", (1, 8), (1, 9), "")
+        self.assertEqual("".join(self.view.containers[0]._lines), self.SOURCE)
+        self.assertEqual([s.tags for s in self.view.sections], [["#shared"]] * 2)
+        self.assert_matches_reload()
+        with self.assertRaises(FlexTagError):
+            self.view.apply_edit("<string>", (4, 0), (4, 99), "")
+        with self.assertRaises(FlexTagError):
+            self.view.filter("#shared").apply_edit("<string>", (4, 0), (4, 0), "")
@@ -1,10 +1,38 @@
 import unittest
 from unittest.mock import patch
+import bz2
+import datetime
+import fractions
+import gzip
+import io
 import json
+import lzma
 import os
+import pickle
 import tempfile
 
-from flextag import FlexTag, SchemaTypeError, SchemaSectionError
+import flextag
+from flextag import flextag as flextag_module
+from flextag import (
+    AppendWriter,
+    Catalog,
+    FlexTag,
+    IndexedFile,
+    SchemaTypeError,
+    SchemaSectionError,
+    Source,
+    bundle,
+)
+from flextag.flextag import (
+    FlexParser,
+    FlexTagError,
+    FlexTagSettings,
+    FlexTagSyntaxError,
+    FlexView,
+    Section,
+)
+
+from .helpers import TempDirTestCase
 
 
 class TestFlexTagBasics(unittest.TestCase):
@@ -288,6 +316,812 @@ class TestFlexTagFile(unittest.TestCase):
             for filepath in filepaths:
                 os.unlink(filepath)
 
+    def test_load_filter_query_skips_rejected_files(self):
+        """Test that files rejected by their container header are not parsed."""
+        files = {
+            "prod.ft": (
+                "[[]]: container\n[prod_cfg #prod]\n[[/]]\n\n[[a]]\nok\n[[/a]]\n"
+            ),
+            # Everything after the container header is malformed; it must
+            # never be parsed because the container does not match.
+            "dev.ft": "[[]]: container\n[dev_cfg #dev]\n[[/]]\n\nnot flextag\n[[b\n",
+            "plain.ft": "[[c]]\nno container section\n[[/c]]\n",
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, content in files.items():
+                with open(os.path.join(tmp, name), "w") as f:
+                    f.write(content)
+            view = FlexTag.load(dir=tmp, filter_query="#prod", validate=False)
+            self.assertEqual([c.id for c in view.containers], ["prod_cfg"])
+            self.assertEqual([s.id for s in view.sections], ["a"])
+
+    def test_container_filter_uses_index(self):
+        """Test container filters with boolean queries."""
+        sources = [
+            "[[]]: container\n[c1 #prod @eu region=1]\n[[/]]\n[[a /]]",
+            "[[]]: container\n[c2 #prod @us region=2]\n[[/]]\n[[b /]]",
+            "[[]]: container\n[c3 #dev @eu region=3]\n[[/]]\n[[c /]]",
+        ]
+        view = FlexTag.load(string=sources, validate=False)
+
+        def ids(query):
+            return sorted(c.id for c in view.filter(query, "containers").containers)
+
+        self.assertEqual(ids("#prod"), ["c1", "c2"])
+        self.assertEqual(ids("@eu NOT #dev"), ["c1"])
+        self.assertEqual(ids("region>=2 OR c1"), ["c1", "c2", "c3"])
+        self.assertEqual(ids("#prod region!=1"), ["c2"])
+        self.assertEqual(view.filter("#prod", "containers").count(), 2)
+
+
+class TestFlexTagSectionQuery(unittest.TestCase):
+    """Tests for load(section_query=...) predicate pushdown."""
+
+    DATA = """
+[[]]: defaults
+[#tenant_a]
+[[/]]
+
+[[one #x]]
+1
+[[/one]]
+
+[[two #y tenant=b]]: json
+{"size": 5}
+[[/two]]
+
+[[three #y]]: json
+{"size": 50}
+[[/three]]
+"""
+
+    def test_only_matching_sections_are_built(self):
+        """Test that non-matching sections never become Section objects."""
+        with patch(
+            "flextag.flextag.Section.__init__",
+            autospec=True,
+            side_effect=Section.__init__,
+        ) as init:
+            view = FlexTag.load(string=self.DATA, section_query="#y", validate=False)
+        self.assertEqual([s.id for s in view.sections], ["two", "three"])
+        built = [call.kwargs["section_id"] for call in init.call_args_list]
+        self.assertNotIn("one", built)
+
+    def test_query_sees_inherited_defaults(self):
+        """Test that defaults are applied before the predicate runs."""
+        view = FlexTag.load(
+            string=self.DATA, section_query="#tenant_a NOT tenant=b", validate=False
+        )
+        self.assertEqual([s.id for s in view.sections], ["one", "three"])
+        self.assertIn("#tenant_a", view.sections[0].tags)
+
+    def test_content_predicate_pushdown(self):
+        """Test content predicates in a section query."""
+        view = FlexTag.load(
+            string=self.DATA, section_query="#y content.size>10", validate=False
+        )
+        self.assertEqual([s.id for s in view.sections], ["three"])
+
+    def test_sources_without_matches_are_dropped(self):
+        """Test that containers with no matching sections are not returned."""
+        view = FlexTag.load(
+            string=[self.DATA, "[[other /]]"], section_query="#x", validate=False
+        )
+        self.assertEqual(len(view.containers), 1)
+
+
+class TestFlexTagScan(unittest.TestCase):
+    """Tests for headers-only scanning with FlexTag.scan."""
+
+    DATA = """[[]]: container
+[corpus #ctag]
+[[/]]
+
+[[]]: defaults
+[#base @root]
+[[/]]
+
+# comment with [[brackets]]
+[[cfg #x]]: yaml
+a:
+  b: 2
+[[/cfg]]
+
+[[flag k=1 /]]
+"""
+
+    def test_headers_match_loaded_sections(self):
+        """Test that scanned headers carry the same metadata as a load."""
+        headers = list(FlexTag.scan(string=self.DATA))
+        loaded = FlexTag.load(string=self.DATA).sections
+        self.assertEqual([h.id for h in headers], ["cfg", "flag"])
+        for h, s in zip(headers, loaded):
+            self.assertEqual(
+                (h.tags, h.paths, h.parameters, h.type_name, h.open_line),
+                (s.tags, s.paths, s.parameters, s.type_name, s.open_line),
+            )
+
+    def test_byte_offsets(self):
+        """Test that byte ranges cover the open line through the close line."""
+        data = self.DATA.encode("utf-8")
+        cfg, flag = FlexTag.scan(string=self.DATA)
+        self.assertTrue(data[cfg.byte_start :].startswith(b"[[cfg #x]]: yaml"))
+        self.assertEqual(data[: cfg.byte_end].splitlines()[-1], b"[[/cfg]]")
+        self.assertEqual(data[flag.byte_start : flag.byte_end], b"[[flag k=1 /]]\n")
+        self.assertEqual((cfg.open_line, cfg.close_line), (9, 12))
+
+    def test_to_section_reads_body_on_demand(self):
+        """Test that bodies are only read from the file by to_section()."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "corpus.ft")
+            with open(path, "wb") as f:
+                f.write(self.DATA.replace("\n", "\r\n").encode("utf-8"))
+            with patch.object(
+                FlexTag, "_read_file_span", wraps=FlexTag._read_file_span
+            ) as read:
+                cfg = next(FlexTag.scan(path=path))
+                calls = read.call_count
+                section = cfg.to_section()
+                self.assertEqual(read.call_count, calls + 1)
+        self.assertEqual(section.content, {"a": {"b": 2}})
+        self.assertIn("#base", section.tags)
+
+    def test_full_sections(self):
+        """Test that headers_only=False yields parsed Sections."""
+        sections = list(FlexTag.scan(string=self.DATA, headers_only=False))
+        self.assertIsInstance(sections[0], Section)
+        self.assertEqual(sections[0].content, {"a": {"b": 2}})
+
+    def test_syntax_errors(self):
+        """Test that stray text and unclosed sections are still rejected."""
+        with self.assertRaises(FlexTagSyntaxError):
+            list(FlexTag.scan(string="stray\n[[a]]\n[[/a]]\n"))
+        with self.assertRaises(FlexTagSyntaxError):
+            list(FlexTag.scan(string="[[a]]\nbody\n[[/b]]\n"))
+        with self.assertRaises(FlexTagSyntaxError):
+            list(FlexTag.scan(string="[[a]]\nbody\n"))
+
+
+class TestFlexTagCatalog(TempDirTestCase):
+    """Tests for the persistent Catalog."""
+
+    FILES = {
+        "a.ft": """[[]]: container
+[alpha #team_a]
+[[/]]
+
+[[db #config @svc.db]]: json
+{"port": 5432}
+[[/db]]
+
+[[notes #doc]]
+text
+[[/notes]]
+""",
+        "b.ft": """[[]]: container
+[beta #team_b]
+[[/]]
+
+[[cache #config @svc.cache]]: json
+{"port": 6379}
+[[/cache]]
+""",
+    }
+
+    def setUp(self):
+        super().setUp()
+        for name, text in self.FILES.items():
+            self.write_file(name, text)
+        self.db = self.temp_path("catalog.sqlite")
+
+    def test_find_across_files(self):
+        """Test section lookups with content read on demand."""
+        with Catalog(self.db, dir=self.dir) as catalog:
+            found = catalog.find("#config")
+            self.assertEqual([s.id for s in found], ["db", "cache"])
+            self.assertEqual(found[1].content, {"port": 6379})
+            self.assertTrue(found[1].source_name.endswith("b.ft"))
+            self.assertEqual([s.id for s in catalog.find("@svc NOT 'db'")], ["cache"])
+
+    def test_filter_query_uses_container_metadata(self):
+        """Test restricting a lookup by container metadata."""
+        with Catalog(self.db, dir=self.dir) as catalog:
+            found = catalog.find("#config", filter_query="#team_b")
+        self.assertEqual([s.id for s in found], ["cache"])
+
+    def test_headers_only_reads_no_bodies(self):
+        """Test that header lookups never open the source files."""
+        with Catalog(self.db, dir=self.dir) as catalog:
+            with patch.object(FlexTag, "_read_file_span") as read:
+                headers = catalog.find("@svc", headers_only=True)
+        self.assertEqual([h.id for h in headers], ["db", "cache"])
+        read.assert_not_called()
+
+    def test_incremental_refresh(self):
+        """Test that only new or changed files are re-indexed."""
+        with Catalog(self.db, dir=self.dir) as catalog:
+            self.assertEqual(catalog.refresh(), 0)
+            self.write_file("c.ft", "[[extra #config]]\nx\n[[/extra]]\n")
+            self.assertEqual(catalog.refresh(), 1)
+            self.assertEqual(len(catalog.find("#config")), 3)
+            os.remove(os.path.join(self.dir, "a.ft"))
+            self.assertEqual(catalog.refresh(), 0)
+            self.assertEqual(
+                [s.id for s in catalog.find("#config")], ["cache", "extra"]
+            )
+
+        # The catalog persists between sessions.
+        with Catalog(self.db, dir=self.dir) as catalog:
+            self.assertEqual(catalog.refresh(), 0)
+
+    def test_changed_file_is_reindexed_by_find(self):
+        """Test that find() does not read from files changed since refresh."""
+        with Catalog(self.db, dir=self.dir) as catalog:
+            self.write_file(
+                "b.ft",
+                "# moved\n\n[[cache #config]]: json\n" '{"port": 1}\n[[/cache]]\n',
+            )
+            found = catalog.find("'cache'")
+        self.assertEqual(found[0].content, {"port": 1})
+
+
+class TestFlexTagBundle(TempDirTestCase):
+    """Tests for bundle files."""
+
+    SOURCES = [
+        """[[]]: container
+[alpha #team_a]
+[[/]]
+
+[[]]: defaults
+[@svc]
+[[/]]
+
+[[db #config big=123456789012345678901234567890 ratio=0.5 name="a b" none=null]]: json
+{"port": 5432}
+
+[[/db]]
+
+[[flag on=true /]]
+""",
+        """[[]]: container
+[beta #team_b]
+[[/]]
+
+[[cache #config]]: json
+{"port": 6379}
+[[/cache]]
+""",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.temp_path("all.ftb")
+        self.view = FlexTag.load(string=self.SOURCES)
+
+    def test_round_trip(self):
+        """Test that a bundle loads back the same sections and containers."""
+        for compress in (False, True):
+            bundle.write(self.view, self.path, compress=compress)
+            loaded = FlexTag.load(bundle=self.path)
+            self.assertEqual([c.id for c in loaded.containers], ["alpha", "beta"])
+            self.assertEqual(loaded.containers[1].tags, ["#team_b"])
+            for a, b in zip(self.view.sections, loaded.sections):
+                self.assertEqual(
+                    (a.id, a.tags, a.paths, a.parameters, a.type_name, a.raw_content),
+                    (b.id, b.tags, b.paths, b.parameters, b.type_name, b.raw_content),
+                )
+            self.assertEqual(loaded.sections[2].content, {"port": 6379})
+
+    def test_get_by_id(self):
+        """Test random access to sections by ID."""
+        bundle.write(self.view, self.path)
+        with bundle.Bundle(self.path) as b:
+            self.assertEqual(b.get("cache")[0].content, {"port": 6379})
+            self.assertEqual(b.get("db")[0].paths, ["@svc"])
+            self.assertEqual(b.get("missing"), [])
+
+    def test_queries_skip_sources(self):
+        """Test that container filters and bloom filters skip whole sources."""
+        bundle.write(self.view, self.path)
+        with patch.object(
+            bundle.Bundle,
+            "container",
+            autospec=True,
+            side_effect=bundle.Bundle.container,
+        ) as built:
+            view = FlexTag.load(bundle=self.path, filter_query="#team_b")
+            self.assertEqual([s.id for s in view.sections], ["cache"])
+            view = FlexTag.load(bundle=self.path, section_query="'flag'")
+            self.assertEqual([s.id for s in view.sections], ["flag"])
+        self.assertEqual([call.args[1] for call in built.call_args_list], [1, 0])
+
+    def test_not_a_bundle(self):
+        """Test that other files are rejected."""
+        with open(self.path, "w") as f:
+            f.write("[[a]]\n[[/a]]\n")
+        with self.assertRaises(FlexTagError):
+            bundle.Bundle(self.path)
+
+
+class TestFlexTagSnapshot(TempDirTestCase):
+    """Tests for binary FlexView snapshots."""
+
+    SOURCE = """[[]]: container
+[alpha #team_a]
+[[/]]
+
+[[]]: defaults
+[#base @svc]
+[[/]]
+
+[[]]: schema
+[cfg #config]: yaml
+[note]*: raw
+[[/]]
+
+[[cfg #config n=3 ratio=0.5]]: yaml
+port: 5432
+when: 2024-01-02
+[[/cfg]]
+
+[[note]]
+first
+
+second
+[[/note]]
+"""
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.temp_path("view.snap")
+        self.view = FlexTag.load(string=self.SOURCE)
+
+    def test_round_trip(self):
+        """Test that a snapshot restores metadata, content and schema."""
+        for include_content in (False, True):
+            self.view.save_snapshot(self.path, include_content=include_content)
+            loaded = FlexView.load_snapshot(self.path)
+            self.assertEqual([c.id for c in loaded.containers], ["alpha"])
+            for a, b in zip(self.view.sections, loaded.sections):
+                self.assertEqual(
+                    (a.id, a.tags, a.paths, a.parameters, a.type_name, a.raw_content),
+                    (b.id, b.tags, b.paths, b.parameters, b.type_name, b.raw_content),
+                )
+            cfg = loaded.filter("cfg").sections[0]
+            self.assertEqual(cfg.content["when"], datetime.date(2024, 1, 2))
+            self.assertEqual(loaded.sections[1].content, "first\n\nsecond")
+            self.assertEqual(len(loaded.containers[0].schema_rules), 2)
+            loaded.containers[0].validate_schema()
+
+    def test_restored_index(self):
+        """Test that queries run against the restored index."""
+        self.view.save_snapshot(self.path)
+        loaded = FlexView.load_snapshot(self.path)
+        self.assertEqual(loaded.count("#base @svc"), 2)
+        self.assertEqual(loaded.filter("#config").filter("n>2").count(), 1)
+        self.assertEqual(loaded.filter("ratio<0.1").count(), 0)
+
+    def test_view_loaded_with_stats(self):
+        """Test that load statistics are left out of a snapshot."""
+        self.write_file("src/view.ft", self.SOURCE)
+        for lazy in (False, True):
+            view = FlexTag.load(dir=self.temp_path("src"), stats=True, lazy=lazy)
+            self.assertEqual(view.first("cfg").content["port"], 5432)
+            view.save_snapshot(self.path)
+            loaded = FlexView.load_snapshot(self.path)
+            self.assertIsNone(loaded.stats)
+            self.assertEqual(loaded.first("cfg").content["port"], 5432)
+            self.assertIsNone(loaded.first("cfg")._stats)
+
+    def test_rejects_foreign_files(self):
+        """Test that non-snapshots and disallowed types are refused."""
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        with self.assertRaises(FlexTagError):
+            FlexView.load_snapshot(self.path)
+
+        payload = pickle.dumps({"containers": [fractions.Fraction(1, 2)]})
+        with open(self.path, "wb") as f:
+            f.write(
+                flextag_module._SNAPSHOT_HEADER.pack(
+                    flextag_module.SNAPSHOT_MAGIC,
+                    flextag_module.SNAPSHOT_VERSION,
+                    len(payload),
+                    0,
+                )
+            )
+            f.write(payload)
+        with self.assertRaises(FlexTagError):
+            FlexView.load_snapshot(self.path)
+
+
+class TestFlexTagWriter(unittest.TestCase):
+    """Tests for writing views and sections back to FlexTag."""
+
+    SOURCE = """# Service configuration
+[[]]: container
+[alpha #team_a]
+[[/]]
+
+[[]]: defaults
+[#base @svc]
+[[/]]
+
+# Main database
+[[db #config port=5432 ratio=0.5 code:str="007" name="a b"]]: json
+{"port": 5432}
+[[/db]]
+
+[[notes]]
+first
+
+second
+[[/notes]]
+
+[[flag on=true /]]
+"""
+
+    def test_unchanged_view_is_copied(self):
+        """Test that an unchanged view is written exactly as it was read."""
+        view = FlexTag.load(string=self.SOURCE)
+        self.assertEqual(view.dumps(), self.SOURCE)
+        out = io.StringIO()
+        view.dump(out)
+        self.assertEqual(out.getvalue(), self.SOURCE)
+
+    def test_changed_section_round_trip(self):
+        """Test that assigned metadata and content are rendered and re-encoded."""
+        view = FlexTag.load(string=self.SOURCE)
+        db = view.filter("db").sections[0]
+        db.content = {"port": 6543, "hosts": ["a", "b"]}
+        db.tags = db.tags + ["#primary"]
+        db.parameters = dict(
+            db.parameters, when="2024", enabled=False, note='say "hi"', none=None
+        )
+        text = db.to_flextag()
+        self.assertTrue(text.startswith("[[db #config #primary "))
+        self.assertNotIn("#base", text)
+
+        loaded = FlexTag.load(string=view.dumps())
+        new_db = loaded.filter("db").sections[0]
+        self.assertEqual(new_db.content, db.content)
+        self.assertEqual(new_db.tags, ["#base", "#config", "#primary"])
+        self.assertEqual(new_db.parameters, db.parameters)
+        self.assertEqual(new_db.parameters["code"], "007")
+        self.assertEqual(new_db.parameters["when"], "2024")
+        self.assertEqual(loaded.sections[1].content, "first\n\nsecond")
+
+    def test_section_text_starts_at_open_tag(self):
+        """Test that one section is written without the lines before it."""
+        text = "# leading comment\n\n[[a #x]]\nbody\n[[/a]]\n"
+        view = FlexTag.load(string=text)
+        self.assertEqual(view.sections[0].to_flextag(), "[[a #x]]\nbody\n[[/a]]\n")
+        self.assertEqual(view.dumps(), text)
+
+    def test_filtered_view_keeps_head_sections(self):
+        """Test that a filtered view is written with its container and defaults."""
+        view = FlexTag.load(string=self.SOURCE).filter("notes")
+        loaded = FlexTag.load(string=view.dumps())
+        self.assertEqual(loaded.containers[0].id, "alpha")
+        self.assertEqual([s.id for s in loaded.sections], ["notes"])
+        self.assertEqual(loaded.sections[0].paths, ["@svc"])
+
+    def test_unwritable_values(self):
+        """Test that values which cannot be written raise FlexTagError."""
+        view = FlexTag.load(string=self.SOURCE)
+        notes = view.filter("notes").sections[0]
+        notes.content = "text\n[[/notes]]\nmore"
+        with self.assertRaises(FlexTagError):
+            notes.to_flextag()
+        db = view.filter("db").sections[0]
+        db.parameters = {"items": [1, 2]}
+        with self.assertRaises(FlexTagError):
+            db.to_flextag()
+
+
+class TestFlexTagAppendWriter(TempDirTestCase):
+    """Tests for appending to files with a sidecar offset index."""
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.temp_path("events.ft")
+
+    def write_events(self, count, start=0):
+        with AppendWriter(self.path, sync_every=2) as writer:
+            for i in range(start, start + count):
+                writer.add(
+                    f"e{i}", {"n": i}, "json", tags=["#event"], parameters={"seq": i}
+                )
+
+    def test_appended_file_loads(self):
+        """Test that appended sections form a valid, indexed file."""
+        self.write_events(3)
+        view = FlexTag.load(path=self.path)
+        self.assertEqual([s.content["n"] for s in view.sections], [0, 1, 2])
+        self.assertTrue(os.path.exists(self.path + ".ftidx"))
+
+        indexed = IndexedFile(self.path)
+        self.assertEqual([h.id for h in indexed.headers], ["e0", "e1", "e2"])
+        self.assertEqual(
+            [s.content for s in indexed.find("seq>=1")], [{"n": 1}, {"n": 2}]
+        )
+
+    def test_reopen_resumes_from_index(self):
+        """Test that reopening only scans data appended after the index."""
+        self.write_events(3)
+        size = os.path.getsize(self.path)
+        self.write_events(2, start=3)
+        with open(self.path, "a") as f:
+            f.write("[[tail #event]]\nlast\n[[/tail]]\n")
+
+        original = FlexParser.iter_section_headers
+        offsets = []
+
+        def spy(parser, data, source_name, encoding="utf-8", offset=0, **kwargs):
+            offsets.append(offset)
+            return original(parser, data, source_name, encoding, offset, **kwargs)
+
+        with patch.object(FlexParser, "iter_section_headers", spy):
+            indexed = IndexedFile(self.path)
+        self.assertGreater(offsets[0], size)
+        self.assertEqual(len(indexed.headers), 6)
+        self.assertEqual(indexed.headers[-1].to_section().content, "last")
+
+    def test_append_section_from_commented_source(self):
+        """Test that appended offsets cover only the section's own block."""
+        section = FlexTag.load(
+            string="# leading comment\n\n[[a #x]]\nbody\n[[/a]]\n"
+        ).sections[0]
+        rendered = section.to_flextag()
+        with AppendWriter(self.path) as writer:
+            writer.add("first", "1")
+            writer.append(section)
+            # Text around the block does not shift its offsets
+            with patch.object(
+                Section, "to_flextag", lambda sec: "# note\n" + rendered + "\n"
+            ):
+                writer.append(section)
+        headers = IndexedFile(self.path).headers
+        self.assertEqual(
+            [(h.id, h.open_line, h.close_line) for h in headers],
+            [("first", 0, 2), ("a", 3, 5), ("a", 7, 9)],
+        )
+        self.assertEqual(
+            [h.to_section().raw_content for h in headers], ["1", "body", "body"]
+        )
+
+    def test_tail_growing_file(self):
+        """Test that a section is picked up once its close tag is written."""
+        self.write_events(1)
+        indexed = IndexedFile(self.path)
+        with open(self.path, "a") as f:
+            f.write("[[late #event]]\npart")
+        self.assertEqual(indexed.refresh(), [])
+        with open(self.path, "a") as f:
+            f.write("ial\n[[/late]]\n")
+        new = indexed.refresh()
+        self.assertEqual([h.id for h in new], ["late"])
+        self.assertEqual(new[0].to_section().content, "partial")
+
+    def test_stale_index_is_rebuilt(self):
+        """Test that a rewritten file is re-indexed from the start."""
+        self.write_events(3)
+        with open(self.path, "w") as f:
+            f.write("[[other]]\nx\n[[/other]]\n")
+        self.assertEqual([h.id for h in IndexedFile(self.path).headers], ["other"])
+
+    def test_incomplete_tail(self):
+        """Test that an incomplete last section is refused unless repaired."""
+        self.write_events(2)
+        with open(self.path, "a") as f:
+            f.write("[[broken]]\nno close")
+        with self.assertRaises(FlexTagError):
+            AppendWriter(self.path)
+        with AppendWriter(self.path, repair=True) as writer:
+            writer.add("fixed", "ok")
+        view = FlexTag.load(path=self.path)
+        self.assertEqual([s.id for s in view.sections], ["e0", "e1", "fixed"])
+
+
+class TestFlexTagOpenIndexed(TempDirTestCase):
+    """Tests for random access through a sidecar offset index."""
+
+    SOURCE = """[[]]: defaults
+[#archive]
+[[/]]
+
+[[a #red @docs.api]]
+alpha
+[[/a]]
+
+[[b #blue @docs.guide]]
+beta
+[[/b]]
+
+[[c #red @src]]: json
+{"n": 3}
+[[/c]]
+"""
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.write_file("archive.ft", self.SOURCE)
+
+    def test_get_reads_one_section(self):
+        """Test that get() returns a section with defaults applied."""
+        indexed = flextag.open_indexed(self.path)
+        self.assertTrue(os.path.exists(self.path + ".ftidx"))
+        with patch.object(
+            FlexTag, "_read_file_span", wraps=FlexTag._read_file_span
+        ) as reads:
+            reopened = flextag.open_indexed(self.path)
+            (section,) = reopened.get("c")
+            # The defaults block and the section itself
+            self.assertEqual(reads.call_count, 2)
+        self.assertEqual(section.content, {"n": 3})
+        self.assertEqual(section.tags, ["#archive", "#red"])
+        self.assertEqual(indexed.get("missing"), [])
+
+    def test_find_by_tag_and_path(self):
+        """Test queries answered through the tag and path lookup."""
+        indexed = flextag.open_indexed(self.path)
+        self.assertEqual([s.id for s in indexed.find("#red")], ["a", "c"])
+        self.assertEqual(
+            [h.id for h in indexed.find("@docs", headers_only=True)], ["a", "b"]
+        )
+        self.assertEqual([s.id for s in indexed.find("#archive @docs.guide")], ["b"])
+
+    def test_stale_index_same_size(self):
+        """Test that an in-place edit of the same size is detected."""
+        flextag.open_indexed(self.path)
+        with open(self.path, "w") as f:
+            f.write(
+                self.SOURCE.replace("[[b #blue", "[[d #blue").replace(
+                    "[[/b]]", "[[/d]]"
+                )
+            )
+        os.utime(self.path, ns=(0, 0))
+        indexed = flextag.open_indexed(self.path)
+        self.assertEqual(indexed.get("b"), [])
+        self.assertEqual(indexed.get("d")[0].content, "beta")
+
+    def test_scan_builds_index(self):
+        """Test that scan(indexed=True) reads headers through the sidecar."""
+        headers = list(flextag.scan(path=self.path, indexed=True))
+        self.assertEqual([h.id for h in headers], ["a", "b", "c"])
+        self.assertTrue(os.path.exists(self.path + ".ftidx"))
+        sections = list(flextag.scan(path=self.path, indexed=True, headers_only=False))
+        self.assertEqual(sections[0].content, "alpha")
+
+
+class TestFlexTagSource(unittest.TestCase):
+    """Tests for explicitly typed sources."""
+
+    SOURCE = """[[]]: defaults
+[#shared]
+[[/]]\r
+[[cfg #config]]: json\r
+{"name": "caf\u00e9"}\r
+[[/cfg]]\r
+[[flag /]]
+"""
+
+    def check_view(self, view):
+        self.assertEqual([s.id for s in view.sections], ["cfg", "flag"])
+        self.assertEqual(view.sections[0].content, {"name": "caf\u00e9"})
+        self.assertEqual(view.sections[1].tags, ["#shared"])
+
+    def test_bytes_and_streams(self):
+        """Test that byte buffers and text or binary streams load like text."""
+        data = self.SOURCE.encode("utf-8")
+        for source in (
+            Source.text(self.SOURCE),
+            Source.bytes(data),
+            Source.stream(io.BytesIO(data)),
+            Source.stream(io.StringIO(self.SOURCE)),
+        ):
+            self.check_view(FlexTag.load(source=source))
+
+    def test_chunk_boundaries(self):
+        """Test decoding when characters and CRLF pairs straddle chunks."""
+        data = self.SOURCE.encode("utf-8")
+        with patch.object(flextag_module, "DECODE_CHUNK_SIZE", 3):
+            self.check_view(FlexTag.load(source=Source.bytes(data)))
+            self.check_view(FlexTag.load(source=Source.stream(io.BytesIO(data))))
+
+    def test_no_path_guessing(self):
+        """Test that typed sources never probe the filesystem for content."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "cfg.ft")
+            with open(path, "w") as f:
+                f.write(self.SOURCE)
+            self.check_view(FlexTag.load(source=Source.file(path)))
+            with self.assertRaises(FlexTagSyntaxError):
+                FlexTag.load(source=Source.text(path))
+        with patch("os.path.isfile", side_effect=AssertionError("stat")):
+            self.check_view(FlexTag.load(string=self.SOURCE))
+
+    def test_scan_stream(self):
+        """Test that a stream is parsed while read, one section at a time."""
+        stream = io.BytesIO(self.SOURCE.encode("utf-8"))
+        sections = list(FlexTag.scan(source=Source.stream(stream, name="pipe")))
+        self.assertEqual([s.id for s in sections], ["cfg", "flag"])
+        self.assertEqual(sections[0].source_name, "pipe")
+        self.assertEqual(sections[0].content, {"name": "caf\u00e9"})
+        self.assertEqual(sections[1].tags, ["#shared"])
+        self.assertEqual(len(sections[0]._all_lines.lines), 3)
+
+
+class TestFlexTagCompressed(TempDirTestCase):
+    """Tests for gzip, bz2 and xz compressed sources."""
+
+    SOURCE = """[[]]: defaults
+[#shared]
+[[/]]
+[[cfg #config]]: json
+{"name": "caf\u00e9"}
+[[/cfg]]
+[[notes]]
+line one
+[[/notes]]
+"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = self.SOURCE.encode("utf-8")
+
+    def check_view(self, view):
+        self.assertEqual([s.id for s in view.sections], ["cfg", "notes"])
+        self.assertEqual(view.sections[0].content, {"name": "caf\u00e9"})
+        self.assertEqual(view.sections[1].tags, ["#shared"])
+
+    def test_load_and_scan_compressed_files(self):
+        """Test loading, scanning and directory discovery of compressed files."""
+        for name, compress in (
+            ("a.ft.gz", gzip.compress),
+            ("b.ft.bz2", bz2.compress),
+            ("c.flextag.xz", lzma.compress),
+        ):
+            path = self.write_file(name, compress(self.data))
+            self.check_view(FlexTag.load(path=path))
+            headers = list(FlexTag.scan(path=path, indexed=True))
+            self.assertEqual(headers[1].to_section().content, "line one")
+        self.write_file("skip.txt.gz", gzip.compress(self.data))
+        view = FlexTag.load(dir=self.dir)
+        self.assertEqual(len(view.containers), 3)
+
+    def test_magic_detection(self):
+        """Test that compression is recognised without a telling suffix."""
+        packed = gzip.compress(self.data)
+        self.check_view(FlexTag.load(path=self.write_file("plain.ft", packed)))
+        self.check_view(FlexTag.load(source=Source.bytes(packed)))
+        self.check_view(FlexTag.load(source=Source.stream(io.BytesIO(packed))))
+        with patch.object(flextag_module, "DECODE_CHUNK_SIZE", 5):
+            stream = Source.stream(io.BytesIO(lzma.compress(self.data)))
+            self.assertEqual(
+                [s.id for s in FlexTag.scan(source=stream)], ["cfg", "notes"]
+            )
+
+    def test_concatenated_members(self):
+        """Test that multi-member gzip files are read to the end."""
+        head, tail = self.SOURCE.split("[[notes]]")
+        packed = gzip.compress(head.encode()) + gzip.compress(
+            ("[[notes]]" + tail).encode()
+        )
+        self.check_view(FlexTag.load(path=self.write_file("multi.ft.gz", packed)))
+
+    def test_corrupt_and_unindexable(self):
+        """Test truncated data errors and refusing a sidecar index."""
+        packed = gzip.compress(self.data)
+        path = self.write_file("cut.ft.gz", packed[: len(packed) // 2])
+        with self.assertRaises(FlexTagError):
+            FlexTag.load(path=path)
+        path = self.write_file("whole.ft.gz", packed)
+        with self.assertRaises(FlexTagError):
+            IndexedFile(path)
+        self.assertFalse(os.path.exists(path + ".ftidx"))
+
 
 class TestFlexTagFilter(unittest.TestCase):
     """Tests for filtering."""
@@ -356,6 +1190,274 @@ This is a note
         self.assertIn("two", ids)
         self.assertIn("three", ids)
 
+    def test_chained_filters(self):
+        """Test that chained filters combine like a single AND query."""
+        data = """
+        [[one #prod @svc.api ver=1]]
+        a
+        [[/one]]
+
+        [[two #prod @svc.api ver=2]]
+        b
+        [[/two]]
+
+        [[three #dev @svc.api ver=2]]
+        c
+        [[/three]]
+        """
+        view = FlexTag.load(string=data, validate=False)
+        chained = view.filter("#prod").filter("@svc").filter("ver>=2")
+        self.assertEqual([s.id for s in chained.sections], ["two"])
+        self.assertEqual(
+            [s.id for s in chained.sections],
+            [s.id for s in view.filter("#prod @svc ver>=2").sections],
+        )
+
+    def test_filter_is_lazy(self):
+        """Test that filters are only evaluated when the view is accessed."""
+        data = """
+        [[one #draft]]
+        a
+        [[/one]]
+        """
+        view = FlexTag.load(string=data, validate=False)
+        with patch.object(
+            FlexView, "_resolve", autospec=True, side_effect=FlexView._resolve
+        ) as spy:
+            filtered = view.filter("#draft").filter("one")
+            self.assertEqual(spy.call_count, 0)
+            self.assertEqual(len(filtered.sections), 1)
+            self.assertEqual(len(filtered.containers), 1)
+            self.assertEqual(spy.call_count, 1)
+
+    def test_boolean_grammar(self):
+        """Test parentheses, NOT groups and explicit AND."""
+        data = """
+        [[one #a #b]]
+        1
+        [[/one]]
+
+        [[two #a #c]]
+        2
+        [[/two]]
+
+        [[three #b #c]]
+        3
+        [[/three]]
+
+        [[four #d]]
+        4
+        [[/four]]
+        """
+        view = FlexTag.load(string=data, validate=False)
+
+        def ids(query):
+            return [s.id for s in view.filter(query).sections]
+
+        self.assertEqual(ids("#a AND (#b OR #c)"), ["one", "two"])
+        self.assertEqual(ids("NOT (#a OR #b)"), ["four"])
+        self.assertEqual(ids("!(#a #b) #c"), ["two", "three"])
+        self.assertEqual(ids("(#d OR one) OR (three)"), ["one", "three", "four"])
+        self.assertEqual(ids("#a not #b"), ["two"])
+
+    def test_quoted_values_with_spaces(self):
+        """Test quoted parameter values containing spaces and parentheses."""
+        data = """
+        [[one title="hello world (draft)"]]
+        1
+        [[/one]]
+
+        [[two title="hello"]]
+        2
+        [[/two]]
+        """
+        view = FlexTag.load(string=data, validate=False)
+        filtered = view.filter('title="hello world (draft)" OR title=nope')
+        self.assertEqual([s.id for s in filtered.sections], ["one"])
+
+    def test_invalid_query(self):
+        """Test that malformed queries raise a syntax error."""
+        view = FlexTag.load(string="[[one /]]", validate=False)
+        for query in ("(#a OR #b", "#a )", 'title="open', "#a OR"):
+            with self.assertRaises(FlexTagSyntaxError):
+                view.filter(query).sections
+
+
+class TestFlexTagContentFilter(unittest.TestCase):
+    """Tests for content.<key> predicates in filter queries."""
+
+    DATA = """
+[[db #prod]]: yaml
+database:
+  host: prod-db
+  port: 5432
+[[/db]]
+
+[[db #dev]]: json
+{"database": {"host": "localhost", "port": 5433}}
+[[/db]]
+
+[[notes #prod]]
+plain text
+[[/notes]]
+"""
+
+    def test_content_comparison(self):
+        """Test comparing a nested content field."""
+        view = FlexTag.load(string=self.DATA, validate=False)
+        filtered = view.filter("content.database.port>=5433")
+        self.assertEqual([s.tags for s in filtered.sections], [["#dev"]])
+        filtered = view.filter('content.database.host="prod-db"')
+        self.assertEqual([s.tags for s in filtered.sections], [["#prod"]])
+
+    def test_content_predicate_runs_after_metadata(self):
+        """Test that only metadata-selected sections are parsed."""
+        view = FlexTag.load(string=self.DATA, validate=False)
+        with patch("flextag.flextag.parse_json") as parse_json:
+            filtered = view.filter("content.database.port=5432 #prod")
+            self.assertEqual(len(filtered.sections), 1)
+            parse_json.assert_not_called()
+
+    def test_full_decode_is_reused(self):
+        """Test that non-YAML content is decoded once for all key paths."""
+        view = FlexTag.load(string='[[a]]: json\n{"x": 1, "y": 2, "z": 3}\n[[/a]]\n')
+        with patch("flextag.flextag.parse_json", side_effect=json.loads) as parse_json:
+            query = "content.x=1 AND content.y=2 AND content.z=3"
+            self.assertEqual(len(view.filter(query).sections), 1)
+            self.assertEqual(view.sections[0].content, {"x": 1, "y": 2, "z": 3})
+            parse_json.assert_called_once()
+
+    def test_yaml_projection_is_cached(self):
+        """Test YAML projection avoids a full parse and caches the value."""
+        view = FlexTag.load(string=self.DATA, validate=False)
+        section = view.sections[0]
+        with patch("flextag.flextag.parse_yaml") as parse_yaml:
+            self.assertEqual(section.content_value("database.port"), 5432)
+            self.assertIsNone(section.content_value("database.missing"))
+            parse_yaml.assert_not_called()
+        with patch("flextag.flextag.project_yaml") as project_yaml:
+            self.assertEqual(section.content_value("database.port"), 5432)
+            project_yaml.assert_not_called()
+
+
+class TestFlexTagIndex(unittest.TestCase):
+    """Tests for bitmap index backends and FlexView.count()."""
+
+    DATA = """
+[[one #a @app.api v=1]]
+1
+[[/one]]
+
+[[two #a #b @app.web v=2]]
+2
+[[/two]]
+
+[[three #b @db v=3]]
+3
+[[/three]]
+"""
+
+    QUERIES = ["#a", "#a #b", "@app", "NOT #a", "v>=2 OR @db", "#a NOT @app.web"]
+
+    def test_count(self):
+        """Test counting matches without materializing a view."""
+        view = FlexTag.load(string=self.DATA, validate=False)
+        self.assertEqual(view.count(), 3)
+        self.assertEqual(view.count("#a"), 2)
+        self.assertEqual(view.filter("#a").count("#b"), 1)
+        self.assertEqual(view.filter("#a").count(), 2)
+        with patch.object(FlexView, "_resolve") as resolve:
+            view.filter("@app").count("v=2")
+            resolve.assert_not_called()
+
+    def test_unknown_backend_rejected(self):
+        """Test that an unknown index backend is refused when set."""
+        settings = FlexTagSettings()
+        with self.assertRaisesRegex(FlexTagError, "bogus"):
+            settings.index_backend = "bogus"
+        self.assertEqual(settings.index_backend, "int")
+
+    def test_numpy_backend_matches_int_backend(self):
+        """Test that the NumPy bitmap backend gives identical results."""
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy not installed")
+        settings = FlexTagSettings()
+        settings.index_backend = "numpy"
+        int_view = FlexTag.load(string=self.DATA, validate=False)
+        np_view = FlexTag.load(string=self.DATA, validate=False, settings=settings)
+        for query in self.QUERIES:
+            self.assertEqual(
+                [s.id for s in np_view.filter(query).sections],
+                [s.id for s in int_view.filter(query).sections],
+            )
+            self.assertEqual(np_view.count(query), int_view.count(query))
+
+
+class TestFlexTagEarlyExit(unittest.TestCase):
+    """Tests for first(), exists() and filter(limit=, offset=)."""
+
+    DATA = """
+[[flag #feature name="a"]]: json
+{"on": true}
+[[/flag]]
+
+[[flag #feature name="b"]]: json
+{"on": false}
+[[/flag]]
+
+[[flag #feature name="c"]]: json
+{"on": true}
+[[/flag]]
+
+[[other]]
+x
+[[/other]]
+"""
+
+    def setUp(self):
+        self.view = FlexTag.load(string=self.DATA, validate=False)
+
+    def test_first_and_exists(self):
+        """Test first() and exists() with and without a query."""
+        self.assertEqual(self.view.first("#feature").parameters["name"], "a")
+        self.assertEqual(self.view.first("name=b").parameters["name"], "b")
+        self.assertIsNone(self.view.first("#missing"))
+        self.assertEqual(self.view.first().id, "flag")
+        self.assertTrue(self.view.exists("#feature name=c"))
+        self.assertFalse(self.view.exists("#feature other"))
+        self.assertTrue(self.view.filter("#feature").exists("name=c"))
+
+    def test_first_stops_parsing_at_first_match(self):
+        """Test that content predicates are not evaluated past the match."""
+        with patch("flextag.flextag.parse_json", wraps=json.loads) as parse_json:
+            section = self.view.first("#feature content.on=true")
+            self.assertEqual(section.parameters["name"], "a")
+            self.assertEqual(parse_json.call_count, 1)
+
+    def test_limit_and_offset(self):
+        """Test windowing filter results."""
+        names = lambda v: [s.parameters.get("name") for s in v.sections]  # noqa
+        self.assertEqual(names(self.view.filter("#feature", limit=2)), ["a", "b"])
+        self.assertEqual(names(self.view.filter("#feature", offset=1)), ["b", "c"])
+        self.assertEqual(names(self.view.filter("#feature", offset=1, limit=1)), ["b"])
+        # Filters after a window apply to the windowed result.
+        windowed = self.view.filter("#feature", limit=2)
+        self.assertEqual(names(windowed.filter("name=c")), [])
+        self.assertEqual(windowed.count(), 2)
+        self.assertEqual(windowed.first("name=b").parameters["name"], "b")
+        with self.assertRaisesRegex(FlexTagError, "limit"):
+            self.view.filter("#feature", limit=-1)
+        with self.assertRaisesRegex(FlexTagError, "offset"):
+            self.view.filter("#feature", offset=-2)
+
+    def test_container_limit(self):
+        """Test windowing container filter results."""
+        view = FlexTag.load(string=["[[a /]]", "[[b /]]", "[[c /]]"], validate=False)
+        limited = view.filter("", target="containers", offset=1, limit=1)
+        self.assertEqual([s.id for s in limited.sections], ["b"])
+
 
 class TestFlexMapAndPoint(unittest.TestCase):
     """Tests for FlexMap and FlexPoint."""
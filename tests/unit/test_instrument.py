@@ -0,0 +1,92 @@
+import unittest
+
+import flextag
+from flextag.flextag import FlexTagSyntaxError
+
+
+class TestFlexTagInstrument(unittest.TestCase):
+    """Tests for the flextag.instrument tracing hooks."""
+
+    class Recorder:
+        def __init__(self):
+            self.events = []
+
+        def begin(self, name, attributes):
+            self.events.append(("begin", name))
+            return name
+
+        def end(self, token, attributes, error):
+            self.events.append(("end", token, dict(attributes), error))
+
+    def setUp(self):
+        self.tracer = self.Recorder()
+        flextag.instrument.set_tracer(self.tracer)
+
+    def tearDown(self):
+        flextag.instrument.set_tracer(None)
+
+    def ended(self, name):
+        return [e[2] for e in self.tracer.events if e[0] == "end" and e[1] == name]
+
+    def test_spans_and_attributes(self):
+        """Test the spans of a load, a filter and a content parse."""
+        self.assertIs(flextag.instrument.get_tracer(), self.tracer)
+        view = flextag.load(
+            string="[[]]: schema\n[a]: json\n[[/]]\n[[a #t]]: json\n[1]\n[[/a]]\n"
+        )
+        self.assertEqual(
+            [e[:2] for e in self.tracer.events],
+            [
+                ("begin", "flextag.load_source"),
+                ("begin", "flextag.scan"),
+                ("end", "flextag.scan"),
+                ("begin", "flextag.build_container"),
+                ("end", "flextag.build_container"),
+                ("end", "flextag.load_source"),
+                ("begin", "flextag.validate_schema"),
+                ("end", "flextag.validate_schema"),
+            ],
+        )
+        self.assertEqual(
+            self.ended("flextag.load_source"),
+            [
+                {
+                    "flextag.source": "<string>",
+                    "flextag.source.kind": "text",
+                    "flextag.sections": 1,
+                }
+            ],
+        )
+        self.assertEqual(view.filter("#t").count("a"), 1)
+        self.assertEqual(
+            self.ended("flextag.filter")[-1],
+            {
+                "flextag.query": "(#t) AND (a)",
+                "flextag.operation": "count",
+                "flextag.matches": 1,
+            },
+        )
+        self.assertEqual(view.first("a").content, [1])
+        self.assertEqual(
+            self.ended("flextag.parse_content"),
+            [
+                {
+                    "flextag.source": "<string>",
+                    "flextag.section_id": "a",
+                    "flextag.content_type": "json",
+                }
+            ],
+        )
+
+    def test_errors_reported(self):
+        """Test that a failing operation ends its span with the error."""
+        view = flextag.load(string="[[a]]: json\n{bad\n[[/a]]\n")
+        with self.assertRaises(FlexTagSyntaxError):
+            view.first("a").content
+        error = self.tracer.events[-1][3]
+        self.assertEqual(self.tracer.events[-1][1], "flextag.parse_content")
+        self.assertIsInstance(error, FlexTagSyntaxError)
+        recorded = len(self.tracer.events)
+        flextag.instrument.set_tracer(None)
+        flextag.load(string="[[a]]\n[[/a]]\n").count("a")
+        self.assertEqual(len(self.tracer.events), recorded)
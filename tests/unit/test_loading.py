@@ -0,0 +1,313 @@
+import os
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+import flextag
+import flextag.flextag as flextag_module
+from flextag import SchemaValidationError, Source
+from flextag.flextag import FlexTag, FlexTagError, FlexTagSettings, FlexTagSyntaxError
+
+from .helpers import TempDirTestCase
+
+
+class TestFlexTagDirectory(TempDirTestCase):
+    """Tests for recursive, glob-filtered directory loading."""
+
+    FILES = [
+        "b.ft",
+        "a.flextag",
+        "notes.txt",
+        "sub/c.ft",
+        "sub/deep/d.ft",
+        "sub/skip/e.ft",
+        "build/f.ft",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.root = self.temp_path("root")
+        for rel in self.FILES:
+            name = os.path.basename(rel).split(".")[0]
+            self.write_file(f"root/{rel}", f"[[{name}]]\n{rel}\n[[/{name}]]\n")
+
+    def ids(self, **kwargs):
+        return [s.id for s in FlexTag.load(dir=self.root, **kwargs).sections]
+
+    def test_recursive_order(self):
+        """Test that files load in name order, one level unless recursive."""
+        self.assertEqual(self.ids(), ["a", "b"])
+        self.assertEqual(self.ids(recursive=True), ["a", "b", "f", "c", "d", "e"])
+
+    def test_include_exclude(self):
+        """Test name and relative-path glob patterns."""
+        self.assertEqual(
+            self.ids(recursive=True, exclude=["build", "sub/skip"]),
+            ["a", "b", "c", "d"],
+        )
+        self.assertEqual(self.ids(recursive=True, include="sub/*.ft"), ["c", "d", "e"])
+        self.assertEqual(self.ids(include=["*.txt", "b.*"]), ["b", "notes"])
+        headers = FlexTag.scan(dir=self.root, recursive=True, exclude="sub")
+        self.assertEqual([h.id for h in headers], ["a", "b", "f"])
+
+    def test_no_per_file_checks(self):
+        """Test that listing relies on directory entries, not path probes."""
+        probe = AssertionError("stat")
+        with patch("os.path.isfile", side_effect=probe), patch(
+            "os.path.exists", side_effect=probe
+        ), patch("os.path.isdir", side_effect=probe):
+            self.assertEqual(len(self.ids(recursive=True)), 6)
+        missing = os.path.join(self.root, "none")
+        self.assertEqual(len(FlexTag.load(dir=missing).sections), 0)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "symlinks unavailable")
+    def test_symlink_policy(self):
+        """Test that links leaving the tree are followed only when allowed."""
+        outside = os.path.dirname(self.write_file("outside/x.ft", "[[x]]\n[[/x]]\n"))
+        try:
+            os.symlink(outside, os.path.join(self.root, "linked"))
+            os.symlink(os.path.join(outside, "x.ft"), os.path.join(self.root, "x.ft"))
+            os.symlink(os.path.join(self.root, "b.ft"), os.path.join(self.root, "y.ft"))
+            os.symlink(self.root, os.path.join(self.root, "sub", "loop"))
+        except OSError:
+            self.skipTest("cannot create symlinks")
+        self.assertEqual(self.ids(), ["a", "b", "b"])
+        self.assertEqual(self.ids(recursive=True).count("x"), 0)
+
+        settings = FlexTagSettings()
+        settings.allow_directory_traversal = True
+        ids = self.ids(recursive=True, settings=settings)
+        self.assertEqual(ids.count("x"), 2)
+        self.assertEqual(ids.count("c"), 1)
+
+
+class TestFlexTagParallel(TempDirTestCase):
+    """Tests for parsing one file in parallel parts."""
+
+    def setUp(self):
+        super().setUp()
+        parts = ["[[]]: container\nname=big\n[[/]]\n[[]]: defaults\n[#all]\n[[/]]\n"]
+        for i in range(300):
+            parts.append(
+                f"# item {i}\n[[s{i} #t{i % 3} n={i}]]: json\n"
+                f'{{"k": {i}}}\n[[/s{i}]]\n[[e{i} /]]\n'
+            )
+        self.path = self.write_file("big.ft", "".join(parts))
+        patcher = patch.object(flextag_module, "PARALLEL_MIN_CHUNK", 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def summary(view):
+        return [
+            (s.id, s.tags, s.parameters, s.open_line, s.close_line, s.raw_content)
+            for s in view.sections
+        ]
+
+    def test_split_points_follow_close_tags(self):
+        """Test that every part starts right after a close tag line."""
+        points = flextag_module._section_split_points(self.path, 4)
+        self.assertEqual(len(points), 5)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.assertEqual(points[-1], len(data))
+        for point in points[1:-1]:
+            line = data[data.rfind(b"\n", 0, point - 1) + 1 : point]
+            self.assertTrue(line.startswith(b"[[/"), line)
+
+    def test_parallel_load_matches_serial(self):
+        """Test that a parallel load gives the same sections and metadata."""
+        serial = FlexTag.load(path=self.path)
+        parallel = FlexTag.load(path=self.path, workers=3)
+        self.assertEqual(self.summary(parallel), self.summary(serial))
+        self.assertEqual(len(parallel.sections), 600)
+        self.assertEqual(parallel.sections[-1].tags, ["#all"])
+        self.assertEqual(parallel.containers[0].parameters, {"name": "big"})
+        self.assertEqual(
+            FlexTag.load(path=self.path, workers=3, section_query="#t1").count(), 100
+        )
+        view = FlexTag.load(path=self.path, workers=3, filter_query="name=other")
+        self.assertEqual(len(view.containers), 0)
+        container = FlexTag()._parse_parallel(
+            Source.file(self.path), self.path, 3, None
+        )
+        self.assertIsNotNone(container)  # not the serial fallback
+        self.assertEqual(len(container.sections), 600)
+
+    def test_parallel_error_reports_exact_line(self):
+        """Test that a syntax error is reported as in a serial parse."""
+        with open(self.path, "a") as f:
+            f.write("[[bad]]\n[[/other]]\n")
+        with self.assertRaises(FlexTagSyntaxError) as serial:
+            FlexTag.load(path=self.path)
+        with self.assertRaises(FlexTagSyntaxError) as parallel:
+            FlexTag.load(path=self.path, workers=3)
+        self.assertEqual(str(parallel.exception), str(serial.exception))
+
+    def test_broken_pool_falls_back_to_serial(self):
+        """Test that a load parses serially when no workers can start."""
+        serial = FlexTag.load(path=self.path)
+        with patch.object(
+            flextag_module,
+            "ProcessPoolExecutor",
+            side_effect=BrokenProcessPool("no workers"),
+        ):
+            self.assertIsNone(
+                FlexTag()._parse_parallel(Source.file(self.path), self.path, 3, None)
+            )
+            parallel = FlexTag.load(path=self.path, workers=3)
+        self.assertEqual(self.summary(parallel), self.summary(serial))
+
+
+class TestFlexTagLazy(TempDirTestCase):
+    """Tests for lazily loaded directories."""
+
+    def setUp(self):
+        super().setUp()
+        self.root = self.dir
+        for i in range(6):
+            parts = [
+                f"[[]]: container\nteam=t{i % 2}\n[[/]]\n",
+                "[[]]: defaults\n[#all]\n[[/]]\n",
+            ]
+            for j in range(3):
+                parts.append(f'[[s{i}_{j} #k{j}]]: json\n{{"f": {i}}}\n[[/s{i}_{j}]]\n')
+            self.write_file(f"f{i}.ft", "".join(parts))
+
+    def loaded(self, view):
+        return [c.source_name[-5:] for c in view._source if c.is_loaded]
+
+    def test_sources_parsed_on_demand(self):
+        """Test that only the sources holding results are parsed."""
+        view = flextag.load(dir=self.root, lazy=True, cache_size=2)
+        self.assertEqual(self.loaded(view), [])
+        self.assertEqual(view.count("#k1"), 6)
+        self.assertEqual(view.count(), 18)
+        self.assertEqual(len(view.filter("team=t1", target="containers").containers), 3)
+        self.assertEqual(self.loaded(view), [])
+
+        section = view.first("s4_2")
+        self.assertEqual((section.tags, section.content), (["#all", "#k2"], {"f": 4}))
+        self.assertEqual(self.loaded(view), ["f4.ft"])
+        hits = view.filter("#k0 AND content.f>=2").sections
+        self.assertEqual([s.id for s in hits], ["s2_0", "s3_0", "s4_0", "s5_0"])
+        self.assertEqual(self.loaded(view), ["f4.ft", "f5.ft"])  # LRU of 2
+
+        eager = flextag.load(dir=self.root)
+        self.assertEqual(
+            [(s.id, s.tags) for s in view.sections],
+            [(s.id, s.tags) for s in eager.sections],
+        )
+        lazy_query = flextag.load(dir=self.root, lazy=True, section_query="#k1")
+        self.assertEqual(len(lazy_query.containers), 6)
+        self.assertEqual(len(lazy_query.containers[0].sections), 1)
+        with self.assertRaises(FlexTagError):
+            view.apply_edit(view.containers[0].source_name, (0, 0), (0, 0), "")
+
+    def test_catalog_headers(self):
+        """Test that a catalog supplies headers without scanning files."""
+        db = os.path.join(self.root, "headers.db")
+        flextag.load(dir=self.root, lazy=True, catalog=db)
+        with patch.object(
+            FlexTag, "_scan_source", side_effect=AssertionError("scanned")
+        ):
+            view = flextag.load(dir=self.root, lazy=True, catalog=db)
+            self.assertEqual(view.count("#all"), 18)
+            self.assertEqual(view.first("s3_1").content, {"f": 3})
+            self.assertEqual(
+                len(view.filter("team=t0", target="containers").containers), 3
+            )
+
+
+class TestFlexTagCollectErrors(TempDirTestCase):
+    """Tests for load(on_error="collect")."""
+
+    def test_sections_skipped_and_reported(self):
+        """Test that bad sections are skipped and parsing resumes."""
+        text = (
+            "[[a]]\nx\n[[/a]]\n"
+            "stray text\n"
+            "[[b #t]]\ny\n[[/c]]\n"
+            "[[c]]\nz\n[[/c]]\n"
+            "[[d]]\nnever closed\n"
+            "[[e /]]\n"
+        )
+        view = flextag.load(string=text, on_error="collect")
+        self.assertEqual([s.id for s in view.sections], ["a", "c", "e"])
+        self.assertEqual(
+            [(d.line, d.column) for d in view.diagnostics],
+            [(4, 1), (7, -1), (13, -1)],
+        )
+        self.assertIn("Mismatched close", view.diagnostics[1].message)
+        self.assertIsInstance(view.diagnostics[2].error, FlexTagSyntaxError)
+        self.assertIs(view.filter("#t").diagnostics, view.diagnostics)
+        with self.assertRaises(FlexTagSyntaxError):
+            flextag.load(string=text)
+
+    def test_sources_skipped_and_reported(self):
+        """Test that unreadable and invalid sources are dropped."""
+        self.write_file("a.ft", "[[ok]]\n1\n[[/ok]]\n")
+        self.write_file("b.ft", b"\xff[[x]]\n[[/x]]\n")
+        self.write_file(
+            "c.ft",
+            "[[]]: schema\n[notes #draft]+: raw\n[[/]]\n"
+            "[[notes]]\nno tag\n[[/notes]]\n",
+        )
+        view = flextag.load(dir=self.dir, on_error="collect")
+        self.assertEqual([s.id for s in view.sections], ["ok"])
+        self.assertEqual(
+            [os.path.basename(d.source) for d in view.diagnostics],
+            ["b.ft", "c.ft"],
+        )
+        self.assertIsInstance(view.diagnostics[1].error, SchemaValidationError)
+        with self.assertRaises(FlexTagError):
+            flextag.load(string="[[a]]", on_error="skip")
+
+
+class TestFlexTagLoadStats(TempDirTestCase):
+    """Tests for load(stats=True)."""
+
+    TEXT = (
+        "[[]]: defaults\n[#d]\n[[/]]\n"
+        "[[]]: schema\n[a]: json\n[b]: raw\n[[/]]\n"
+        '[[a]]: json\n{"v": 1}\n[[/a]]\n'
+        "[[b]]\ntext\n[[/b]]\n"
+    )
+
+    def test_phases_and_counts(self):
+        """Test sizes, phase timings and content parse counts."""
+        self.assertIsNone(flextag.load(string=self.TEXT).stats)
+        view = flextag.load(string=self.TEXT, stats=True)
+        stats = view.stats
+        self.assertIs(view.filter("#d").stats, stats)
+        self.assertEqual(len(stats.sources), 1)
+        self.assertEqual(
+            (stats.bytes, stats.lines, stats.sections), (len(self.TEXT), 13, 2)
+        )
+        self.assertEqual(
+            set(stats.phase_wall),
+            {"read", "scan", "tokenize", "defaults", "schema", "validate"},
+        )
+        self.assertNotIn("tokenize", stats.phase_cpu)
+        self.assertGreaterEqual(stats.wall, stats.phase_wall["scan"])
+
+        self.assertEqual(stats.content_parses, {})
+        self.assertEqual([s.content for s in view.sections], [{"v": 1}, "text"])
+        self.assertEqual(view.first("a").content, {"v": 1})  # cached
+        self.assertEqual(stats.content_parses, {"json": 1, "raw": 1})
+        self.assertIn("content", stats.to_dict()["phase_cpu"])
+        self.assertIsNone(stats.container_cache_hit_rate)
+
+    def test_lazy_cache_counters(self):
+        """Test header and container cache hit rates of lazy sources."""
+        for name in ("a", "b"):
+            self.write_file(f"{name}.ft", f"[[{name} #t]]\nbody\n[[/{name}]]\n")
+        view = flextag.load(dir=self.dir, lazy=True, stats=True, cache_size=1)
+        self.assertEqual(view.count("#t"), 2)
+        self.assertEqual(view.count(), 2)
+        self.assertEqual(view.stats.header_cache_hit_rate, 0.5)
+        for sid in ("a", "a", "b", "a"):
+            view.first(sid).raw_content
+        self.assertEqual(view.stats.container_cache_hit_rate, 0.25)
+        a = view.stats.sources[0]
+        self.assertEqual((a.container_cache_misses, a.sections), (2, 1))
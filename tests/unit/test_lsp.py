@@ -0,0 +1,127 @@
+import io
+import unittest
+
+from flextag.lsp import Document, LanguageServer, read_message, write_message
+
+
+class TestFlexTagLanguageServer(unittest.TestCase):
+    """Tests for the flextag.lsp language server."""
+
+    TEXT = """[[a #x]]
+hello
+[[/a]]
+[[b]]: json
+{"k": 1}
+[[/b]]
+"""
+
+    def test_document_edits_and_diagnostics(self):
+        """Test incremental edits, error recovery and content diagnostics."""
+        doc = Document("file:///a.ft", self.TEXT)
+        self.assertEqual(doc.diagnostics(), [])
+        self.assertEqual([s.id for s in doc.symbols()], ["a", "b"])
+
+        doc.edit((4, 0), (4, 1), "")
+        ((line, col, message),) = doc.diagnostics()
+        self.assertEqual((line, col), (3, 0))
+        self.assertIn("JSON parsing error", message)
+        doc.edit((4, 0), (4, 0), "{")
+        self.assertEqual(doc.diagnostics(), [])
+
+        # Removing a close tag breaks the document until it is typed back
+        doc.edit((2, 0), (2, 6), "")
+        ((line, _, message),) = doc.diagnostics()
+        self.assertEqual(line, 5)
+        self.assertIn("Mismatched close", message)
+        self.assertEqual(doc.lines[2], "\n")
+        doc.edit((2, 0), (2, 0), "[[/a")
+        doc.edit((2, 4), (2, 4), "]]")
+        self.assertEqual(doc.diagnostics(), [])
+        self.assertEqual("".join(doc.container._lines), self.TEXT)
+        self.assertEqual([s.id for s in doc.definition(2, 3)], ["a"])
+
+    def test_schema_diagnostics(self):
+        """Test that schema rule violations are reported at the schema."""
+        doc = Document("u", "[[]]: schema\n[s #t]*: raw\n[[/]]\n[[s #t /]]\n")
+        self.assertEqual(doc.diagnostics(), [])
+        doc.edit((3, 4), (3, 7), "")
+        ((line, _, message),) = doc.diagnostics()
+        self.assertEqual(line, 0)
+        self.assertIn("#t", message)
+
+    def test_server_protocol(self):
+        """Test a session over Content-Length framed JSON-RPC."""
+        uri = "file:///a.ft"
+        messages = [
+            {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+            {"method": "initialized", "params": {}},
+            {
+                "method": "textDocument/didOpen",
+                "params": {
+                    "textDocument": {"uri": uri, "version": 1, "text": self.TEXT}
+                },
+            },
+            {
+                "method": "textDocument/didChange",
+                "params": {
+                    "textDocument": {"uri": uri, "version": 2},
+                    "contentChanges": [
+                        {
+                            "range": {
+                                "start": {"line": 0, "character": 3},
+                                "end": {"line": 0, "character": 3},
+                            },
+                            "text": " \U0001f600",
+                        }
+                    ],
+                },
+            },
+            {
+                "id": 2,
+                "method": "textDocument/documentSymbol",
+                "params": {"textDocument": {"uri": uri}},
+            },
+            {
+                "id": 3,
+                "method": "textDocument/definition",
+                "params": {
+                    "textDocument": {"uri": uri},
+                    "position": {"line": 2, "character": 3},
+                },
+            },
+            {"id": 4, "method": "unknown/method"},
+            {"id": 5, "method": "shutdown"},
+            {"method": "exit"},
+        ]
+        rfile, wfile = io.BytesIO(), io.BytesIO()
+        for message in messages:
+            write_message(rfile, dict(jsonrpc="2.0", **message))
+        rfile.seek(0)
+        server = LanguageServer(rfile, wfile)
+        self.assertEqual(server.serve(), 0)
+
+        wfile.seek(0)
+        replies = {}
+        published = []
+        while True:
+            message = read_message(wfile)
+            if message is None:
+                break
+            if "id" in message:
+                replies[message["id"]] = message
+            else:
+                published.append(message["params"])
+        caps = replies[1]["result"]["capabilities"]
+        self.assertEqual(caps["textDocumentSync"]["change"], 2)
+        self.assertEqual([p["version"] for p in published], [1, 2])
+        # "[[a #x]]" became "[[a \U0001f600 #x]]", an invalid token
+        self.assertEqual(published[0]["diagnostics"], [])
+        (diag,) = published[1]["diagnostics"]
+        self.assertEqual(diag["range"]["start"]["line"], 0)
+        # Symbols and definitions come from the last text that parsed
+        (symbol, _) = replies[2]["result"]
+        self.assertEqual(symbol["name"], "a")
+        self.assertEqual(symbol["selectionRange"]["end"]["character"], 8)
+        (location,) = replies[3]["result"]
+        self.assertEqual(location["range"]["start"], {"line": 0, "character": 0})
+        self.assertEqual(replies[4]["error"]["code"], -32601)
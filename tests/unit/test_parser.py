@@ -354,3 +354,32 @@ content
         # Also check that the location information is present
         assert "<string> L1" in error_msg  # Check line number
         assert "^" in error_msg  # Check visual pointer is present
+
+    def test_iter_sections_from_start_line(self, parser):
+        """Test that parsing can begin at a line between sections"""
+        lines = "[[a]]\nx\n[[/a]]\n# note\n[[b #t]]\ny\n[[/b]]\n".splitlines()
+
+        sections = list(parser.iter_bracket_sections(lines, "<string>", start=3))
+        assert [s["section_id"] for s in sections] == ["b"]
+        assert (sections[0]["open_line"], sections[0]["close_line"]) == (4, 6)
+        assert sections[0]["tags"] == ["#t"]
+
+    def test_collected_errors_resume_at_next_section(self, parser):
+        """Test that with an errors list, bad sections are skipped"""
+        content = (
+            "[[a]]\nx\n[[/a]]\n"
+            "stray text\n"
+            "[[b]]\ny\n[[/c]]\n"
+            "[[c]]\nz\n[[/c]]\n"
+            "[[d]]\nnever closed"
+        )
+        errors = []
+
+        sections = parser.iter_bracket_sections(
+            content.splitlines(), "<string>", errors=errors
+        )
+        assert [s["section_id"] for s in sections] == ["a", "c"]
+        assert [e.line_num for e in errors] == [4, 7, 12]
+        assert "Lines between sections" in str(errors[0])
+        assert str(errors[1]) == "[<string> L7] Mismatched close ID='c', expected='b'"
+        assert str(errors[2]) == "[<string> L12] No matching close for ID='d'"
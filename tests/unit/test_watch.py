@@ -0,0 +1,123 @@
+import os
+import time
+from unittest.mock import patch
+
+import flextag
+from flextag.flextag import FlexTag
+
+from .helpers import TempDirTestCase
+
+
+class TestFlexTagWatch(TempDirTestCase):
+    """Tests for the hot-reload watcher."""
+
+    def setUp(self):
+        super().setUp()
+        self.stamp = 1_000_000_000_000_000_000
+        self.write("a.ft", "[[a]]\none\n[[/a]]\n")
+        self.write("b.ft", "[[b]]\ntwo\n[[/b]]\n")
+
+    def write(self, name, text):
+        path = self.write_file(name, text)
+        # Distinct mtimes regardless of the filesystem's timestamp resolution.
+        self.stamp += 10**9
+        os.utime(path, ns=(self.stamp, self.stamp))
+        return path
+
+    def test_incremental_reload(self):
+        """Test that only changed files are re-parsed into a new generation."""
+        events = []
+        watcher = flextag.watch(
+            dir=self.dir, on_change=lambda v, c: events.append(c), start=False
+        )
+        first = watcher.view
+        self.assertEqual([s.id for s in first.sections], ["a", "b"])
+        self.assertFalse(watcher.check())
+
+        with patch.object(
+            FlexTag, "_parse_source", autospec=True, side_effect=FlexTag._parse_source
+        ) as parse:
+            self.write("b.ft", "[[b2]]\nthree\n[[/b2]]\n")
+            self.write("c.ft", "[[c]]\n[[/c]]\n")
+            os.unlink(os.path.join(self.dir, "a.ft"))
+            self.assertTrue(watcher.check())
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual(
+            events[-1],
+            {
+                "added": [os.path.join(self.dir, "c.ft")],
+                "changed": [os.path.join(self.dir, "b.ft")],
+                "removed": [os.path.join(self.dir, "a.ft")],
+                "errors": [],
+            },
+        )
+        self.assertEqual([s.id for s in watcher.view.sections], ["b2", "c"])
+        self.assertEqual([s.id for s in first.sections], ["a", "b"])
+        self.assertEqual(watcher.generation, 2)
+
+    def test_hash_and_errors(self):
+        """Test content hashing and keeping the last good version on errors."""
+        watcher = flextag.watch(
+            dir=self.dir, backend=flextag.PollingBackend(hash=True), start=False
+        )
+        self.write("a.ft", "[[a]]\none\n[[/a]]\n")
+        self.assertFalse(watcher.check())
+
+        path = self.write("a.ft", "[[a]]\nbroken\n")
+        self.assertFalse(watcher.check())
+        self.assertIn(path, watcher.errors)
+        self.assertEqual(watcher.view.sections[0].content, "one")
+
+        self.write("a.ft", "[[a]]\nfixed\n[[/a]]\n")
+        self.assertTrue(watcher.check())
+        self.assertEqual(watcher.errors, {})
+        self.assertEqual(watcher.view.sections[0].content, "fixed")
+
+    def test_file_that_fails_to_parse(self):
+        """Test that failed files are reported apart and publish nothing."""
+        events = []
+        watcher = flextag.watch(
+            dir=self.dir, on_change=lambda v, c: events.append(c), start=False
+        )
+        first = watcher.view
+        bad = self.write("c.ft", "[[c]]\nnever closed\n")
+        self.assertFalse(watcher.check())
+        self.assertIs(watcher.view, first)
+        self.assertEqual((watcher.generation, len(events)), (1, 1))
+        self.assertIn(bad, watcher.errors)
+
+        self.write("b.ft", "[[b]]\nthree\n[[/b]]\n")
+        self.write("c.ft", "[[c]]\nstill broken\n")
+        self.assertTrue(watcher.check())
+        self.assertEqual(
+            events[-1],
+            {
+                "added": [],
+                "changed": [os.path.join(self.dir, "b.ft")],
+                "removed": [],
+                "errors": [bad],
+            },
+        )
+        self.assertEqual([s.id for s in watcher.view.sections], ["a", "b"])
+
+        os.unlink(bad)
+        self.assertFalse(watcher.check())
+        self.assertEqual(watcher.errors, {})
+        self.write("c.ft", "[[c]]\n[[/c]]\n")
+        self.assertTrue(watcher.check())
+        self.assertEqual(events[-1]["added"], [bad])
+        self.assertEqual(watcher.generation, 3)
+
+    def test_background_thread(self):
+        """Test that start() polls until stop()."""
+        seen = []
+        with flextag.watch(
+            dir=self.dir, interval=0.01, on_change=lambda v, c: seen.append(v)
+        ) as watcher:
+            self.write("c.ft", "[[c]]\n[[/c]]\n")
+            for _ in range(500):
+                if len(seen) > 1:
+                    break
+                time.sleep(0.01)
+        self.assertIsNone(watcher._thread)
+        self.assertEqual(len(seen[-1].sections), 3)